@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark re-pricing many carts against the number of carts
+
+Usage
+-----
+    python ./scripts/benchmark_batch_pricing.py --carts 1000 10000 100000
+
+Compares pricing each cart with the single-pass pricing engine in a python
+loop with price_batch, which prices a carts x products quantity matrix
+with array operations, and checks both give the same prices.
+"""
+import argparse
+import random
+import time
+
+from shopping_cart.shopping.batch import price_batch
+from shopping_cart.shopping.pricing import price
+
+TAX_RATE = 12.5
+REQUIRED_PURCHASE_TOTAL = 500
+GLOBAL_RATE = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--carts", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--products", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    unit_prices = [round(rng.uniform(0.5, 300), 2) for _ in range(args.products)]
+    required_quantities = [rng.choice([0, 2, 3]) for _ in range(args.products)]
+    percentages = [rng.choice([0, 25, 50, 100]) for _ in range(args.products)]
+
+    print(f"{'carts':>8} {'loop (ms)':>10} {'batch (ms)':>11}")
+    for n_carts in args.carts:
+        quantities = [
+            [rng.choice([0, 0, 0, 1, 2, 3, 5]) for _ in range(args.products)]
+            for _ in range(n_carts)
+        ]
+
+        start = time.perf_counter()
+        looped = [
+            price(
+                [
+                    (
+                        unit_prices[j],
+                        quantity,
+                        required_quantities[j] or None,
+                        percentages[j] if required_quantities[j] else None
+                    )
+                    for j, quantity in enumerate(row) if quantity
+                ],
+                TAX_RATE,
+                REQUIRED_PURCHASE_TOTAL,
+                GLOBAL_RATE
+            ).total_price
+            for row in quantities
+        ]
+        loop = 1000 * (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batch = price_batch(
+            quantities,
+            unit_prices,
+            required_quantities,
+            percentages,
+            TAX_RATE,
+            REQUIRED_PURCHASE_TOTAL,
+            GLOBAL_RATE
+        )
+        vectorized = 1000 * (time.perf_counter() - start)
+
+        assert batch.total_price.tolist() == looped
+        print(f"{n_carts:>8} {loop:>10.1f} {vectorized:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Benchmark encoding and restoring a shopping cart against its number of products
+
+Usage
+-----
+    python ./scripts/benchmark_cart_serialization.py --products 10 100 1000
+
+Compares the size of a cart encoded with encode_cart with the same content
+pickled and in JSON, and times encoding, decoding and restoring the cart in
+a store with restore_cart.
+"""
+import argparse
+import json
+import pickle
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.serialization import decode_cart, encode_cart, restore_cart
+from shopping_cart.store.operations import populate
+
+TAX_RATE = 12.5
+
+
+def time_call(
+        call,
+        repeat: int
+) -> float:
+    """
+    Mean time of a call in milliseconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--products", type=int, nargs="+", default=[10, 100, 1_000]
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    m.Base.metadata.create_all(engine)
+    store = sessionmaker(bind=engine, class_=m.StoreSession)()
+    populate(
+        {
+            "products": [
+                {
+                    "name": f"product_{i}",
+                    "unit_price": 1.99 + i,
+                    "number_in_store": 1_000,
+                    "serial_tracked": False,
+                    "promotion": {"required_quantity": 3, "percentage": 50}
+                }
+                for i in range(max(args.products))
+            ]
+        },
+        store,
+        bulk=True
+    )
+
+    print(
+        f"{'products':>8} {'bytes':>7} {'pickle':>7} {'json':>7} "
+        f"{'encode (ms)':>12} {'decode (ms)':>12} {'restore (ms)':>13}"
+    )
+    for products in args.products:
+        cart = ShoppingCart(store=store)
+        cart.add_order({f"product_{i}": 1 + i % 7 for i in range(products)})
+
+        data = encode_cart(cart)
+        content = [cart.cart_id, cart.catalog_version, cart.quantities, cart.reserved]
+        restored = restore_cart(store, data)
+        assert restored.price_breakdown(TAX_RATE) == cart.price_breakdown(TAX_RATE)
+
+        encode = time_call(lambda: encode_cart(cart), args.repeat)
+        decode = time_call(lambda: decode_cart(data), args.repeat)
+        restore = time_call(lambda: restore_cart(store, data), args.repeat)
+        print(
+            f"{products:>8} {len(data):>7} {len(pickle.dumps(content)):>7} "
+            f"{len(json.dumps(content)):>7} {encode:>12.3f} {decode:>12.3f} {restore:>13.3f}"
+        )
+
+        cart.empty()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Benchmark the startup of a pricing worker against the size of the catalog
+
+Usage
+-----
+    python ./scripts/benchmark_catalog_startup.py --products 1000 10000 100000
+
+Times loading a CatalogSnapshot from a store database and opening a
+MappedCatalog from a binary catalog file, with and without checking its
+checksum, each followed by pricing a cart of 10 products.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.shopping.catalog import CatalogSnapshot
+from shopping_cart.shopping.catalog_file import MappedCatalog, build_catalog_file
+from shopping_cart.store.operations import populate
+
+TAX_RATE = 12.5
+
+
+def time_startup(
+        open_catalog,
+        quantities,
+        repeat: int
+) -> float:
+    """
+    Mean time in milliseconds of opening a catalog and pricing a cart
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        catalog = open_catalog()
+        catalog.price(quantities, TAX_RATE)
+        if isinstance(catalog, MappedCatalog):
+            catalog.close()
+
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--products", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'products':>8} {'file (KB)':>10} {'snapshot (ms)':>14} "
+        f"{'mapped (ms)':>12} {'unverified (ms)':>16}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for products in args.products:
+            engine = create_engine('sqlite://')
+            m.Base.metadata.create_all(engine)
+            store = sessionmaker(bind=engine, class_=m.StoreSession)()
+            populate(
+                {
+                    "products": [
+                        {
+                            "name": f"product_{i}",
+                            "unit_price": 1.99 + i,
+                            "number_in_store": 1_000,
+                            "serial_tracked": False,
+                            "promotion": {"required_quantity": 3, "percentage": 50}
+                        }
+                        for i in range(products)
+                    ]
+                },
+                store,
+                bulk=True
+            )
+
+            path = os.path.join(directory, f"catalog_{products}.bin")
+            build_catalog_file(store, path)
+
+            with MappedCatalog(path) as catalog:
+                quantities = {
+                    catalog.product_id(f"product_{i}"): 4
+                    for i in range(0, products, max(products // 10, 1))
+                }
+
+            snapshot = time_startup(lambda: CatalogSnapshot.load(store), quantities, args.repeat)
+            mapped = time_startup(lambda: MappedCatalog(path), quantities, args.repeat)
+            unverified = time_startup(
+                lambda: MappedCatalog(path, verify=False), quantities, args.repeat
+            )
+            print(
+                f"{products:>8} {os.path.getsize(path) / 1024:>10.1f} {snapshot:>14.2f} "
+                f"{mapped:>12.2f} {unverified:>16.2f}"
+            )
+
+            store.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Benchmark populating many file-backed stores one after the other and in parallel
+
+Usage
+-----
+    python ./scripts/benchmark_make_stores.py --stores 50 --items 100000 --processes 1 4 8
+
+Writes --stores product configuration files of --items items each, then
+makes a store database of each with make_stores for each number of
+processes, giving the total time and the time per store.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import yaml
+
+from shopping_cart.make_store import make_stores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument(
+        "--processes", type=int, nargs="+", default=[1, os.cpu_count()]
+    )
+    args = parser.parse_args()
+
+    per_product = args.items // args.products
+
+    with tempfile.TemporaryDirectory() as directory:
+        configs = []
+        for store in range(args.stores):
+            path = os.path.join(directory, f"store_{store}.yaml")
+            with open(path, "w") as f:
+                yaml.safe_dump(
+                    {
+                        "products": [
+                            {
+                                "name": f"product_{i}",
+                                "unit_price": 1 + (store + i) % 100,
+                                "number_in_store": per_product
+                            }
+                            for i in range(args.products)
+                        ]
+                    },
+                    f
+                )
+            configs.append(path)
+
+        print(
+            f"{'processes':>9} {'total (s)':>10} {'stores/s':>9} "
+            f"{'mean store (s)':>15} {'max store (s)':>14}"
+        )
+        for processes in args.processes:
+            output = os.path.join(directory, f"stores_{processes}")
+            os.mkdir(output)
+
+            start = time.perf_counter()
+            builds = make_stores(configs, output, processes=processes)
+            total = time.perf_counter() - start
+
+            seconds = [build.seconds for build in builds]
+            print(
+                f"{processes:>9} {total:>10.2f} {len(builds) / total:>9.1f} "
+                f"{sum(seconds) / len(seconds):>15.3f} {max(seconds):>14.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark picking items of a product against its stock size
+
+Usage
+-----
+    python ./scripts/benchmark_pick.py --stock 1000 100000 1000000
+
+Compares Product.pick, which filters, orders and limits the available
+items in SQL, with loading every item of the product and filtering
+them in python, for both ordered and random picks.
+"""
+import argparse
+import operator
+import random
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.store.operations import populate
+
+
+def pick_in_python(
+        session,
+        name: str,
+        quantity: int,
+        is_random: bool = False
+):
+    """
+    Pick items by loading every item of the product
+    """
+    product = m.Product.with_name(session, name)
+    items_available = sorted(
+        [item for item in product.items if item.is_available],
+        key=operator.attrgetter('id')
+    )
+    if is_random:
+        return random.sample(items_available, quantity)
+
+    return items_available[:quantity]
+
+
+def time_pick(
+        session,
+        pick,
+        quantity: int,
+        repeat: int,
+        is_random: bool = False
+) -> float:
+    """
+    Mean time of a pick on a fresh session in milliseconds
+    """
+    elapsed = 0
+    for _ in range(repeat):
+        session.expunge_all()
+        start = time.perf_counter()
+        pick(session, "product", quantity, is_random)
+        elapsed += time.perf_counter() - start
+
+    return 1000 * elapsed / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--stock", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--quantity", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'stock':>10} {'python (ms)':>12} {'sql (ms)':>10} "
+        f"{'random python (ms)':>19} {'random sql (ms)':>16}"
+    )
+    for stock in args.stock:
+        engine = create_engine('sqlite://')
+        m.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine, class_=m.StoreSession)()
+        populate(
+            {
+                "products": [
+                    {"name": "product", "unit_price": 1, "number_in_store": stock}
+                ]
+            },
+            session,
+            bulk=True
+        )
+
+        timings = [
+            time_pick(session, pick, args.quantity, args.repeat, is_random)
+            for is_random in (False, True)
+            for pick in (pick_in_python, m.Product.pick)
+        ]
+        print(
+            f"{stock:>10} {timings[0]:>12.2f} {timings[1]:>10.2f} "
+            f"{timings[2]:>19.2f} {timings[3]:>16.2f}"
+        )
+
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark the ORM and the bulk populate modes
+
+Usage
+-----
+    python ./scripts/benchmark_populate.py --items 10000 1000000 10000000
+
+The ORM mode is skipped above --orm-limit items since it needs one
+ORM object per item and becomes impractically slow.
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.store.operations import populate
+
+
+def make_catalog(
+        number_of_items: int,
+        number_of_products: int
+) -> dict:
+    """
+    Make a synthetic store products configuration with the
+    items spread evenly over the products
+
+    """
+    per_product, remainder = divmod(number_of_items, number_of_products)
+
+    products = []
+    for i in range(number_of_products):
+        product = {
+            "name": f"product_{i}",
+            "unit_price": 1 + i % 100,
+            "number_in_store": per_product + (i < remainder)
+        }
+        if i % 2:
+            product["promotion"] = {
+                "required_quantity": 2,
+                "percentage": 50
+            }
+        products.append(product)
+
+    return {"products": products}
+
+
+def time_populate(
+        catalog: dict,
+        bulk: bool
+) -> float:
+    """
+    Time populating a new in-memory store in seconds
+    """
+    engine = create_engine('sqlite://')
+    m.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, class_=m.StoreSession)()
+
+    start = time.perf_counter()
+    populate(catalog, session, bulk=bulk)
+    elapsed = time.perf_counter() - start
+
+    session.close()
+    engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--items", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000]
+    )
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orm-limit", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'items':>12} {'orm (s)':>10} {'bulk (s)':>10} {'speed-up':>10}")
+    for number_of_items in args.items:
+        catalog = make_catalog(number_of_items, args.products)
+
+        bulk = time_populate(catalog, bulk=True)
+        if number_of_items <= args.orm_limit:
+            orm = time_populate(catalog, bulk=False)
+            print(f"{number_of_items:>12} {orm:>10.2f} {bulk:>10.2f} {orm / bulk:>9.1f}x")
+        else:
+            print(f"{number_of_items:>12} {'-':>10} {bulk:>10.2f} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
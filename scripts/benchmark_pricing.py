@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+Benchmark the price breakdown of a shopping cart against its size
+
+Usage
+-----
+    python ./scripts/benchmark_pricing.py --units 10 100 1000 10000
+
+Compares ShoppingCart.price_breakdown, a single pass over the aggregated
+cart, with the previous breakdown where the total discount, tax and price
+each recomputed the product list and the total marked price, and with
+the pricing engine alone on the lines of the cart in floats and in
+integer cents (CENTS_PRICING).
+"""
+import argparse
+from collections import defaultdict
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.pricing import price, price_cents
+from shopping_cart.store.operations import populate
+
+TAX_RATE = 12.5
+REQUIRED_PURCHASE_TOTAL = 500
+GLOBAL_RATE = 20
+
+
+def legacy_price_breakdown(
+        cart: ShoppingCart
+) -> dict:
+    """
+    Price breakdown as computed before the pricing engine,
+    walking every item for each total
+    """
+
+    def product_list():
+        products = defaultdict(int)
+        for item in cart.items:
+            products[item.product] += 1
+        return products
+
+    def total_marked_price():
+        total = 0
+        for item in cart.items:
+            total += item.product.unit_price
+        return total
+
+    def total_discount():
+        amount = 0
+        for product, quantity in product_list().items():
+            offer = product.discount_offer
+            if offer is not None:
+                amount += product.unit_price * (quantity // offer.required_quantity) \
+                    * offer.percentage / 100
+
+        price_after_product_discount = total_marked_price() - amount
+        if price_after_product_discount >= REQUIRED_PURCHASE_TOTAL:
+            amount += price_after_product_discount * GLOBAL_RATE / 100
+
+        return round(amount, 2)
+
+    def total_price_before_tax():
+        return total_marked_price() - total_discount()
+
+    def total_tax_amount():
+        return round(total_price_before_tax() * TAX_RATE / 100, 1)
+
+    def total_price():
+        return round(total_price_before_tax() + total_tax_amount(), 2)
+
+    return {
+        "total_discount": total_discount(),
+        "total_tax": total_tax_amount(),
+        "total_price": total_price()
+    }
+
+
+def time_breakdown(
+        breakdown,
+        repeat: int
+) -> float:
+    """
+    Mean time of a breakdown in milliseconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        breakdown()
+
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--units", type=int, nargs="+", default=[10, 100, 1_000, 10_000]
+    )
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    m.Base.metadata.create_all(engine)
+    store = sessionmaker(bind=engine, class_=m.StoreSession)()
+    populate(
+        {
+            "products": [
+                {
+                    "name": f"product_{i}",
+                    "unit_price": 1.99 + i,
+                    "number_in_store": sum(args.units) // args.products + 1,
+                    "promotion": {"required_quantity": 3, "percentage": 50}
+                }
+                for i in range(args.products)
+            ]
+        },
+        store,
+        bulk=True
+    )
+
+    print(
+        f"{'units':>8} {'legacy (ms)':>12} {'engine (ms)':>12} "
+        f"{'float lines (ms)':>17} {'cents lines (ms)':>17}"
+    )
+    for units in args.units:
+        cart = ShoppingCart(store=store)
+        per_product, remainder = divmod(units, args.products)
+        cart.add_order(
+            {
+                f"product_{i}": per_product + (i < remainder)
+                for i in range(args.products)
+                if per_product + (i < remainder)
+            }
+        )
+
+        breakdown = cart.price_breakdown(TAX_RATE, REQUIRED_PURCHASE_TOTAL, GLOBAL_RATE)
+        assert breakdown == legacy_price_breakdown(cart)
+
+        legacy = time_breakdown(lambda: legacy_price_breakdown(cart), args.repeat)
+        new = time_breakdown(
+            lambda: cart.price_breakdown(TAX_RATE, REQUIRED_PURCHASE_TOTAL, GLOBAL_RATE),
+            args.repeat
+        )
+        products = sorted(cart.product_list.items(), key=lambda line: line[0].id)
+        lines = [
+            (
+                product.unit_price,
+                quantity,
+                product.discount_offer.required_quantity,
+                product.discount_offer.percentage
+            )
+            for product, quantity in products
+        ]
+        lines_in_cents = [
+            (
+                product.unit_price_cents,
+                quantity,
+                product.discount_offer.required_quantity,
+                product.discount_offer.basis_points
+            )
+            for product, quantity in products
+        ]
+        assert price_cents(
+            lines_in_cents, TAX_RATE, REQUIRED_PURCHASE_TOTAL, GLOBAL_RATE
+        ).in_units().as_dict() == breakdown
+
+        in_floats = time_breakdown(
+            lambda: price(lines, TAX_RATE, REQUIRED_PURCHASE_TOTAL, GLOBAL_RATE),
+            args.repeat
+        )
+        in_cents = time_breakdown(
+            lambda: price_cents(lines_in_cents, TAX_RATE, REQUIRED_PURCHASE_TOTAL, GLOBAL_RATE),
+            args.repeat
+        )
+        print(
+            f"{units:>8} {legacy:>12.3f} {new:>12.3f} "
+            f"{in_floats:>17.4f} {in_cents:>17.4f}"
+        )
+
+        cart.empty()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Benchmark the requests per second of the cart service against its number of workers
+
+Usage
+-----
+    python ./scripts/benchmark_service.py --workers 1 2 4 8 --carts 200
+
+Runs many concurrent shoppers against one file-backed store through the
+asyncio CartService, each one creating a cart, adding items of a few
+products one request at a time, pricing the cart and checking it out.
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.shopping.service import CartService
+from shopping_cart.store.operations import populate
+
+TAX_RATE = 12.5
+PRODUCTS = 10
+ADDS_PER_CART = 5
+
+
+async def shop(
+        service: CartService,
+        shopper: int
+) -> int:
+    """
+    One shopper's requests, returning the number of requests
+    """
+    cart_id = await service.create_cart()
+    for i in range(ADDS_PER_CART):
+        await service.add_product_items(cart_id, f"product_{(shopper + i) % PRODUCTS}", 1)
+    await service.price_breakdown(cart_id, TAX_RATE)
+    await service.checkout(cart_id)
+
+    return ADDS_PER_CART + 3
+
+
+async def run(
+        session_factory,
+        workers: int,
+        carts: int
+) -> float:
+    """
+    Requests per second of concurrent shoppers
+    """
+    async with CartService(session_factory, workers=workers) as service:
+        start = time.perf_counter()
+        requests = await asyncio.gather(*(shop(service, i) for i in range(carts)))
+        return sum(requests) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--carts", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{Path(directory) / 'store.db'}",
+            connect_args={"timeout": 30}
+        )
+        m.Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine, class_=m.StoreSession)
+
+        session = session_factory()
+        populate(
+            {
+                "products": [
+                    {
+                        "name": f"product_{i}",
+                        "unit_price": 1.99 + i,
+                        "number_in_store": args.carts * ADDS_PER_CART * len(args.workers),
+                        "serial_tracked": False,
+                        "promotion": {"required_quantity": 3, "percentage": 50}
+                    }
+                    for i in range(PRODUCTS)
+                ]
+            },
+            session,
+            bulk=True
+        )
+        session.close()
+
+        print(f"{'workers':>8} {'carts':>7} {'requests/s':>11}")
+        for workers in args.workers:
+            throughput = asyncio.run(run(session_factory, workers, args.carts))
+            print(f"{workers:>8} {args.carts:>7} {throughput:>11.0f}")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
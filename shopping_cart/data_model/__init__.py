@@ -1,2 +1,7 @@
 from .base import *
+from .cart import *
+from .catalog import *
 from .product import *
+from .promotion import *
+from .reservation import *
+from .setting import *
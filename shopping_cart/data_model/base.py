@@ -10,7 +10,22 @@ from shopping_cart.exc import InstanceNotFound
 
 Base = declarative_base()
 
-_schema_version = 1
+_schema_version = 7
+
+
+class StoreSession(Session):
+    """
+    A session of a store database
+
+    The session events bumping the catalog version of a store, see
+    data_model.catalog, and keeping its compiled pricing plans up to
+    date, see shopping.rules, are registered on this class rather
+    than on every Session of the process, so they never run for the
+    sessions of other databases. The sessions of a store are
+    therefore made of this class, e.g. by a StoreHandle or by
+    sessionmaker(bind=engine, class_=StoreSession), as the changes
+    of other sessions do not bump the catalog version.
+    """
 
 
 class QueryMixin:
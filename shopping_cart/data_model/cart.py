@@ -0,0 +1,84 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import (
+    Column, Integer, String, ForeignKey, DateTime
+)
+from sqlalchemy.orm import relationship
+
+from shopping_cart.data_model.base import Base, QueryMixin
+
+if TYPE_CHECKING:
+    from shopping_cart.data_model.product import Product
+
+
+class Cart(Base, QueryMixin):
+    """
+    A persisted shopping cart, written behind the cart in
+    memory, see shopping_cart.store.write_behind
+
+    Attributes
+    ----------
+    id
+        identifier of the shopping cart
+    created_at
+        (UTC) time the cart was first persisted
+    updated_at
+        (UTC) time the cart was last persisted
+    lines
+        quantity of each product in the cart
+
+    """
+    __tablename__ = "cart"
+
+    id = Column(String, primary_key=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+    lines = relationship(
+        "CartLine",
+        back_populates="cart",
+        cascade="all, delete-orphan",
+        order_by="CartLine.product_id"
+    )
+
+
+class CartLine(Base, QueryMixin):
+    """
+    The quantity of a product in a persisted shopping cart
+
+    Attributes
+    ----------
+    quantity
+        number of units of the product in the cart
+    cart
+        the cart
+    product
+        the product
+
+    """
+    __tablename__ = "cart_line"
+
+    cart_id = Column(
+        String,
+        ForeignKey(
+            "cart.id"
+        ),
+        primary_key=True
+    )
+    product_id = Column(
+        Integer,
+        ForeignKey(
+            "product.id"
+        ),
+        primary_key=True
+    )
+    quantity = Column(Integer)
+
+    cart = relationship(
+        "Cart",
+        back_populates="lines"
+    )
+    product: "Product" = relationship(
+        "Product",
+        uselist=False
+    )
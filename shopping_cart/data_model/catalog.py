@@ -0,0 +1,120 @@
+from itertools import chain
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from shopping_cart.data_model.base import StoreSession
+from shopping_cart.data_model.product import DiscountOffer, Product
+from shopping_cart.data_model.promotion import Promotion
+from shopping_cart.data_model.setting import StoreSetting
+
+# key of the catalog version in the store settings, bumped
+# whenever a product price, an offer or a promotion changes
+CATALOG_VERSION_KEY = "catalog_version"
+
+# classes of the rows making up the priced catalog of a store
+CATALOG_CLASSES = (Product, DiscountOffer, Promotion)
+
+
+def catalog_version(
+        session: Session
+) -> int:
+    """
+    Version of the catalog of a store, i.e. the product prices,
+    offers and promotions
+
+    Parameters
+    ----------
+    session
+        a store database
+
+    Returns
+    -------
+        the catalog version, 0 if the catalog has never changed
+
+    """
+    return int(StoreSetting.get(session, CATALOG_VERSION_KEY, "0"))
+
+
+def catalog_version_column():
+    """
+    The catalog version as a scalar subquery column, to read
+    the version along with the rows of the catalog
+    """
+    return StoreSetting.__table__.select().with_only_columns(
+        [StoreSetting.__table__.c.value]
+    ).where(
+        StoreSetting.__table__.c.key == CATALOG_VERSION_KEY
+    ).as_scalar().label("catalog_version")
+
+
+def bump_catalog_version(
+        session: Session
+):
+    """
+    Record a change of the catalog of a store, e.g. after
+    adding products in bulk, which bypasses the session events
+
+    Parameters
+    ----------
+    session
+        a store database
+
+    """
+    with session.no_autoflush:
+        setting = session.query(StoreSetting).get(CATALOG_VERSION_KEY)
+
+    if setting is None:
+        session.add(StoreSetting(key=CATALOG_VERSION_KEY, value="1"))
+    else:
+        setting.value = str(int(setting.value) + 1)
+
+
+def changes_catalog(
+        session: Session
+) -> bool:
+    """
+    Whether the pending changes of a session change the
+    catalog of the store, i.e. add or remove products or
+    change a price, an offer or a promotion
+    """
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, (DiscountOffer, Promotion)):
+            return True
+
+        if isinstance(instance, Product) and (
+                instance in session.new
+                or instance in session.deleted
+                or inspect(instance).attrs.unit_price.history.has_changes()
+        ):
+            return True
+
+    return False
+
+
+@event.listens_for(StoreSession, "before_flush")
+def _bump_on_change(
+        session: Session,
+        flush_context,
+        instances
+):
+    """
+    Bump the catalog version in the same flush as the change
+    """
+    if changes_catalog(session):
+        bump_catalog_version(session)
+
+
+@event.listens_for(StoreSession, "after_bulk_update")
+@event.listens_for(StoreSession, "after_bulk_delete")
+def _bump_on_bulk_change(
+        context
+):
+    """
+    Bump the catalog version when products, offers or promotions
+    are updated or deleted by a query
+    """
+    if issubclass(context.mapper.class_, CATALOG_CLASSES):
+        session = context.session
+        bump_catalog_version(session)
+        session.flush()
@@ -0,0 +1,303 @@
+import logging
+from typing import Callable, Dict, List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+
+from shopping_cart.data_model import base
+from shopping_cart.data_model.setting import StoreSetting
+from shopping_cart.exc import InvalidValue
+from shopping_cart.money import to_basis_points, to_cents
+
+logger = logging.getLogger(__name__)
+
+# key of the schema version in the store settings
+SCHEMA_VERSION_KEY = "schema_version"
+
+# Migrations by the schema version they upgrade to, each one
+# upgrades a store from the previous version
+MIGRATIONS: Dict[int, Callable[[Connection], None]] = {}
+
+
+def migration(
+        version: int
+):
+    """
+    Register a migration upgrading a store to the given
+    schema version from the previous one
+
+    Parameters
+    ----------
+    version
+        the schema version after the migration
+
+    """
+
+    def _register(function):
+        MIGRATIONS[version] = function
+        return function
+
+    return _register
+
+
+def schema_version(
+        connection: Connection
+) -> int:
+    """
+    Schema version of a store database
+
+    Stores made before the version was recorded are
+    recognised by their tables and columns.
+
+    Parameters
+    ----------
+    connection
+        connection to the store database
+
+    Returns
+    -------
+        the schema version, 0 if the database is empty
+
+    """
+
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    if StoreSetting.__tablename__ in tables:
+        version = connection.execute(
+            StoreSetting.__table__.select().where(
+                StoreSetting.__table__.c.key == SCHEMA_VERSION_KEY
+            )
+        ).first()
+        if version is not None:
+            return int(version.value)
+
+    if "product" not in tables:
+        return 0
+    if "reservation" not in tables:
+        columns = {
+            column["name"] for column in inspector.get_columns("product")
+        }
+        return 2 if "number_available" in columns else 1
+
+    return 3
+
+
+def migrate(
+        engine: Engine
+) -> int:
+    """
+    Bring a store database up to the current schema version,
+    creating the schema if the database is empty
+
+    Parameters
+    ----------
+    engine
+        engine of the store database
+
+    Returns
+    -------
+        the schema version of the store before migrating
+
+    Raises
+    ------
+    InvalidValue
+        If the store has a newer schema version than supported
+
+    """
+
+    with engine.begin() as connection:
+        if engine.dialect.name == "sqlite":
+            # take the write lock before reading the schema, so
+            # processes opening a store at once migrate it once
+            connection.execute("BEGIN IMMEDIATE")
+        version = schema_version(connection)
+        if version > base._schema_version:
+            raise InvalidValue(
+                f"Store schema version {version} is newer than the "
+                f"supported version {base._schema_version}."
+            )
+
+        if version == 0:
+            base.Base.metadata.create_all(connection)
+        else:
+            StoreSetting.__table__.create(connection, checkfirst=True)
+            for target in range(version + 1, base._schema_version + 1):
+                logger.info(f"Migrating store schema to version {target}")
+                MIGRATIONS[target](connection)
+
+        _set_schema_version(connection, base._schema_version)
+
+    return version
+
+
+def _set_schema_version(
+        connection: Connection,
+        version: int
+):
+    """
+    Record the schema version of a store
+    """
+    table = StoreSetting.__table__
+    connection.execute(
+        table.delete().where(table.c.key == SCHEMA_VERSION_KEY)
+    )
+    connection.execute(
+        table.insert(), key=SCHEMA_VERSION_KEY, value=str(version)
+    )
+
+
+@migration(2)
+def _add_stock_counters(
+        connection: Connection
+):
+    """
+    Stock counters of products which are not serial-tracked
+    """
+    connection.execute(
+        "ALTER TABLE product ADD COLUMN is_serial_tracked BOOLEAN DEFAULT 1"
+    )
+    connection.execute(
+        "ALTER TABLE product ADD COLUMN number_available INTEGER DEFAULT 0"
+    )
+    connection.execute(
+        "ALTER TABLE product ADD COLUMN number_reserved INTEGER DEFAULT 0"
+    )
+
+
+@migration(3)
+def _add_reservations(
+        connection: Connection
+):
+    """
+    Reservations of units for shopping carts
+    """
+    connection.execute(
+        "CREATE TABLE reservation ("
+        "id INTEGER NOT NULL PRIMARY KEY, "
+        "cart_id VARCHAR, "
+        "quantity INTEGER, "
+        "expires_at DATETIME, "
+        "product_id INTEGER REFERENCES product (id))"
+    )
+    connection.execute(
+        "ALTER TABLE item ADD COLUMN reservation_id INTEGER REFERENCES reservation (id)"
+    )
+
+
+@migration(4)
+def _add_indexes(
+        connection: Connection
+):
+    """
+    Indexes of the pick, pricing and reservation queries
+    """
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_item_product_available "
+        "ON item (product_id, is_available, id)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_item_reservation_id "
+        "ON item (reservation_id)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_discount_offer_product_id "
+        "ON discount_offer (product_id)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_reservation_expires_at "
+        "ON reservation (expires_at)"
+    )
+
+
+@migration(5)
+def _add_integer_prices(
+        connection: Connection
+):
+    """
+    Unit prices in cents and offer percentages in basis
+    points for the cents pricing mode
+
+    The new columns are filled in python with the rounding of the
+    model validators, i.e. half to even, rather than by SQLite's
+    ROUND, which rounds half away from zero
+    """
+    connection.execute(
+        "ALTER TABLE product ADD COLUMN unit_price_cents INTEGER"
+    )
+    _fill(
+        connection,
+        "UPDATE product SET unit_price_cents = ? WHERE id = ?",
+        [
+            (to_cents(unit_price), product_id)
+            for product_id, unit_price in connection.execute(
+                "SELECT id, unit_price FROM product WHERE unit_price IS NOT NULL"
+            )
+        ]
+    )
+    connection.execute(
+        "ALTER TABLE discount_offer ADD COLUMN basis_points INTEGER"
+    )
+    _fill(
+        connection,
+        "UPDATE discount_offer SET basis_points = ? WHERE id = ?",
+        [
+            (to_basis_points(percentage), offer_id)
+            for offer_id, percentage in connection.execute(
+                "SELECT id, percentage FROM discount_offer WHERE percentage IS NOT NULL"
+            )
+        ]
+    )
+
+
+def _fill(
+        connection: Connection,
+        statement: str,
+        rows: List[tuple]
+):
+    """
+    Execute an UPDATE statement once per row, in one executemany call
+    """
+    if rows:
+        connection.execute(statement, rows)
+
+
+@migration(6)
+def _add_promotions(
+        connection: Connection
+):
+    """
+    Promotion rules of the store
+    """
+    connection.execute(
+        "CREATE TABLE promotion ("
+        "id INTEGER NOT NULL PRIMARY KEY, "
+        "kind VARCHAR, "
+        "parameters VARCHAR, "
+        "product_id INTEGER REFERENCES product (id))"
+    )
+    connection.execute(
+        "CREATE INDEX ix_promotion_product_id ON promotion (product_id)"
+    )
+
+
+@migration(7)
+def _add_carts(
+        connection: Connection
+):
+    """
+    Persisted shopping carts and their lines
+    """
+    connection.execute(
+        "CREATE TABLE cart ("
+        "id VARCHAR NOT NULL PRIMARY KEY, "
+        "created_at DATETIME, "
+        "updated_at DATETIME)"
+    )
+    connection.execute(
+        "CREATE TABLE cart_line ("
+        "cart_id VARCHAR NOT NULL REFERENCES cart (id), "
+        "product_id INTEGER NOT NULL REFERENCES product (id), "
+        "quantity INTEGER, "
+        "PRIMARY KEY (cart_id, product_id))"
+    )
@@ -1,15 +1,21 @@
-import operator
 import random
-from typing import List
+from typing import List, TYPE_CHECKING
 
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, Float, Boolean
+    Column, Integer, String, ForeignKey, Float, Boolean, Index
 )
-from sqlalchemy.orm import relationship, Session, validates
+from sqlalchemy.orm import joinedload, relationship, Session, validates
 from sqlalchemy.orm.exc import NoResultFound
 
 from shopping_cart.data_model.base import Base, ModelMixin
 from shopping_cart.exc import InvalidValue, OverDemand, InstanceNotFound
+from shopping_cart.money import to_basis_points, to_cents
+
+if TYPE_CHECKING:
+    from shopping_cart.data_model.reservation import Reservation
+
+# maximum number of item ids probed per query when sampling items
+_PROBE_BATCH_SIZE = 500
 
 
 class Product(Base, ModelMixin):
@@ -22,6 +28,18 @@ class Product(Base, ModelMixin):
         name of the product
     unit_price
         marked price of a single item
+    unit_price_cents
+        marked price of a single item in integer minor units
+        (cents), kept in step with unit_price
+    is_serial_tracked
+        If True, every unit in store is an individual item,
+        otherwise the stock is only kept as counters
+    number_available
+        number of units available, for a product which is
+        not serial-tracked
+    number_reserved
+        number of units reserved, for a product which is
+        not serial-tracked
     items
         List of corresponding items in store
     discount_offer
@@ -32,6 +50,11 @@ class Product(Base, ModelMixin):
 
     name = Column(String, unique=True)
     unit_price = Column(Float)
+    unit_price_cents = Column(Integer)
+
+    is_serial_tracked = Column(Boolean, default=True)
+    number_available = Column(Integer, default=0)
+    number_reserved = Column(Integer, default=0)
 
     @validates('unit_price')
     def validate_unit_price(self, key, value):
@@ -40,6 +63,16 @@ class Product(Base, ModelMixin):
                 "Unit price of a product must be positive."
             )
 
+        self.unit_price_cents = to_cents(value)
+        return value
+
+    @validates('number_available', 'number_reserved')
+    def validate_stock(self, key, value):
+        if value is not None and value < 0:
+            raise InvalidValue(
+                "Stock of a product must be non-negative."
+            )
+
         return value
 
     items = relationship(
@@ -67,8 +100,8 @@ class Product(Base, ModelMixin):
             name: str
     ) -> "Product":
         """
-        Query a product with the given name from
-        a store database
+        Query a product with the given name, together
+        with its discount offer, from a store database
 
         Parameters
         ----------
@@ -91,6 +124,8 @@ class Product(Base, ModelMixin):
         try:
             return session.query(
                 cls
+            ).options(
+                joinedload(cls.discount_offer)
             ).filter(
                 cls.name == name
             ).one()
@@ -105,7 +140,8 @@ class Product(Base, ModelMixin):
             session: Session,
             name: str,
             quantity: int,
-            is_random: bool = False
+            is_random: bool = False,
+            rng: random.Random = None
     ) -> List["Item"]:
         """
         Pick N available items from the store database
@@ -122,6 +158,9 @@ class Product(Base, ModelMixin):
             If True, randomly pick the N
             available items from the database.
             Default = False
+        rng
+            random number generator of the random picks, e.g.
+            random.Random(seed). Default = the `random` module
 
         Returns
         -------
@@ -130,7 +169,8 @@ class Product(Base, ModelMixin):
         Raises
         ------
         InvalidValue
-            If the request quantity is non-positive
+            If the request quantity is non-positive, or
+            the product is not serial-tracked
         OverDemand
             If request to pick more items than what is available
             in the database
@@ -143,25 +183,152 @@ class Product(Base, ModelMixin):
             )
 
         product = cls.with_name(session, name)
-        items_available = [
-            item for item in product.items
-            if item.is_available
-        ]
-        items_available = sorted(
-            items_available,
-            key=operator.attrgetter('id')
-        )
+        if not product.is_serial_tracked:
+            raise InvalidValue(
+                f"Product {name} is not serial-tracked, "
+                f"its items cannot be picked individually."
+            )
+
+        return product._pick_items(session, quantity, is_random, rng)
 
+    @classmethod
+    def pick_stock(
+            cls,
+            session: Session,
+            name: str,
+            quantity: int,
+            is_random: bool = False,
+            rng: random.Random = None
+    ) -> "PickedStock":
+        """
+        Pick N available units of a product from the store database,
+        whether the product is serial-tracked or not
+
+        Parameters
+        ----------
+        session
+            A store database session
+        name
+            name of the product
+        quantity
+            number of quantity to pick
+        is_random
+            If True, randomly pick the N available items of a
+            serial-tracked product. Default = False
+        rng
+            random number generator of the random picks, e.g.
+            random.Random(seed). Default = the `random` module
+
+        Returns
+        -------
+            picked stock, with the picked items if the product
+            is serial-tracked
+
+        Raises
+        ------
+        InvalidValue
+            If the request quantity is non-positive
+        OverDemand
+            If request to pick more units than what is available
+            in the database
+
+        """
+
+        if quantity <= 0:
+            raise InvalidValue(
+                "Quantity request must be positive."
+            )
+
+        product = cls.with_name(session, name)
+        if product.is_serial_tracked:
+            return PickedStock(
+                product,
+                quantity,
+                product._pick_items(session, quantity, is_random, rng)
+            )
+
+        if product.number_available < quantity:
+            raise OverDemand(
+                f"Excess demand request. Only "
+                f"{product.number_available} is available, but {quantity} is requested."
+            )
+
+        return PickedStock(product, quantity)
+
+    def _pick_items(
+            self,
+            session: Session,
+            quantity: int,
+            is_random: bool = False,
+            rng: random.Random = None
+    ) -> List["Item"]:
+        """
+        Pick N available items of a serial-tracked product
+
+        Available items are filtered, ordered and limited in SQL,
+        so only the picked items are loaded
+        """
+
+        if is_random:
+            item_ids = Item.sample_available_ids(session, self.id, quantity, rng)
+            if len(item_ids) < quantity:
+                raise OverDemand(
+                    f"Excess demand request. Only "
+                    f"{len(item_ids)} is available, but {quantity} is requested."
+                )
+
+            items = {
+                item.id: item
+                for item in session.query(Item).filter(Item.id.in_(item_ids))
+            }
+            return [items[item_id] for item_id in item_ids]
+
+        items_available = session.query(
+            Item
+        ).filter(
+            Item.product_id == self.id,
+            Item.is_available
+        ).order_by(
+            Item.id
+        ).limit(
+            quantity
+        ).all()
+
+        # fewer items than the limit are all the available items
         if len(items_available) < quantity:
             raise OverDemand(
                 f"Excess demand request. Only "
                 f"{len(items_available)} is available, but {quantity} is requested."
             )
 
-        if is_random:
-            return random.sample(items_available, quantity)
+        return items_available
+
+
+class PickedStock:
+    """
+    Units of a product picked from the store
 
-        return items_available[:quantity]
+    Attributes
+    ----------
+    product
+        the picked product
+    quantity
+        number of units picked
+    items
+        the picked items if the product is serial-tracked,
+        otherwise an empty list
+
+    """
+
+    def __init__(
+            self,
+            product: Product,
+            quantity: int,
+            items: List["Item"] = None
+    ):
+        self.product = product
+        self.quantity = quantity
+        self.items = items or []
 
 
 class DiscountOffer(Base, ModelMixin):
@@ -177,12 +344,20 @@ class DiscountOffer(Base, ModelMixin):
     discount
         discount offer in the promotion, i.e. the percent Y in \
         "Buy N, Get Y % off for the next one"
+    basis_points
+        discount percentage in integer basis points, i.e.
+        hundredths of a percent, kept in step with percentage
 
     """
     __tablename__ = "discount_offer"
+    __table_args__ = (
+        # offer of a product when pricing a cart
+        Index("ix_discount_offer_product_id", "product_id"),
+    )
 
     required_quantity = Column(Integer)
     percentage = Column(Float)
+    basis_points = Column(Integer)
 
     @validates('required_quantity')
     def validate_required_quantity(self, key, value):
@@ -200,6 +375,7 @@ class DiscountOffer(Base, ModelMixin):
                 "Discount percentage must be between 0 and 100, including 100 but not 0."
             )
 
+        self.basis_points = to_basis_points(value)
         return value
 
     product_id = Column(
@@ -225,12 +401,121 @@ class Item(Base, ModelMixin):
         Whether the item is available
     product
         what product the item is
+    reservation
+        the reservation holding the item, if any
 
     """
     __tablename__ = "item"
+    __table_args__ = (
+        # available items of a product in id order when picking items
+        Index("ix_item_product_available", "product_id", "is_available", "id"),
+        # items held by a reservation when releasing or checking out
+        Index("ix_item_reservation_id", "reservation_id"),
+    )
 
     is_available = Column(Boolean, default=True)
 
+    reservation_id = Column(
+        Integer,
+        ForeignKey(
+            "reservation.id"
+        )
+    )
+    reservation: "Reservation" = relationship(
+        "Reservation",
+        uselist=False,
+        back_populates="items"
+    )
+
+    @classmethod
+    def sample_available_ids(
+            cls,
+            session: Session,
+            product_id: int,
+            quantity: int,
+            rng: random.Random = None,
+            max_rounds: int = 4
+    ) -> List[int]:
+        """
+        Randomly choose N available items of a product, uniformly
+        and without loading the available items
+
+        Random ids between the smallest and the largest available
+        ids are probed in batches, and a probe is accepted if the item
+        is available and not chosen yet. Since items of a product are
+        stocked with consecutive ids, nearly every probe hits and the
+        cost depends on N rather than the stock. If the available ids
+        are too sparse, i.e. `max_rounds` probe batches mostly miss,
+        the available ids are selected in one query and sampled in
+        memory, which costs O(stock) rather than O(N).
+
+        Parameters
+        ----------
+        session
+            A store database session
+        product_id
+            ID of the product
+        quantity
+            number of items to choose
+        rng
+            random number generator, e.g. random.Random(seed) for
+            reproducible choices. Default = the `random` module
+        max_rounds
+            number of mostly missed probe batches before
+            sampling by rank
+
+        Returns
+        -------
+            ids of the chosen items in the order they were chosen,
+            fewer than N if fewer items are available
+
+        """
+
+        rng = rng or random
+        available = session.query(
+            cls.id
+        ).filter(
+            cls.product_id == product_id,
+            cls.is_available
+        )
+
+        # separate queries so that both are a single index lookup
+        lowest = available.order_by(cls.id).limit(1).scalar()
+        if lowest is None:
+            return []
+        highest = available.order_by(cls.id.desc()).limit(1).scalar()
+
+        chosen = []
+        chosen_ids = set()
+        misses = 0
+        while misses < max_rounds:
+            remaining = quantity - len(chosen)
+            candidates = [
+                rng.randint(lowest, highest)
+                for _ in range(min(2 * remaining, _PROBE_BATCH_SIZE))
+            ]
+            hits = {
+                item_id for item_id, in available.filter(
+                    cls.id.in_(set(candidates))
+                )
+            }
+
+            accepted = 0
+            for item_id in candidates:
+                if item_id in hits and item_id not in chosen_ids:
+                    chosen.append(item_id)
+                    chosen_ids.add(item_id)
+                    accepted += 1
+                    if len(chosen) == quantity:
+                        return chosen
+
+            # a batch where most probes miss means the ids are sparse
+            if 4 * accepted < len(candidates):
+                misses += 1
+
+        item_ids = [item_id for item_id, in available.order_by(cls.id)]
+        return rng.sample(item_ids, min(quantity, len(item_ids)))
+
     product_id = Column(
         Integer,
         ForeignKey(
@@ -0,0 +1,58 @@
+import json
+from typing import TYPE_CHECKING
+
+from sqlalchemy import (
+    Column, Integer, String, ForeignKey, Index
+)
+from sqlalchemy.orm import relationship
+
+from shopping_cart.data_model.base import Base, ModelMixin
+
+if TYPE_CHECKING:
+    from shopping_cart.data_model.product import Product
+
+
+class Promotion(Base, ModelMixin):
+    """
+    A promotion rule of the store, as data
+
+    The kind names a registered rule type which interprets
+    the parameters, see shopping_cart.shopping.rules
+
+    Attributes
+    ----------
+    kind
+        registered name of the rule type
+    parameters
+        parameters of the rule, a JSON object
+    product
+        the product the rule applies to, None if the rule
+        applies to the whole cart
+
+    """
+    __tablename__ = "promotion"
+    __table_args__ = (
+        # promotions of a product when compiling the pricing plan
+        Index("ix_promotion_product_id", "product_id"),
+    )
+
+    kind = Column(String)
+    parameters = Column(String, default="{}")
+
+    product_id = Column(
+        Integer,
+        ForeignKey(
+            "product.id"
+        )
+    )
+    product: "Product" = relationship(
+        "Product",
+        uselist=False
+    )
+
+    @property
+    def arguments(self) -> dict:
+        """
+        The parameters of the rule as a dictionary
+        """
+        return json.loads(self.parameters or "{}")
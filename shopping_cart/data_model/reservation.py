@@ -0,0 +1,58 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import (
+    Column, Integer, String, ForeignKey, DateTime, Index
+)
+from sqlalchemy.orm import relationship
+
+from shopping_cart.data_model.base import Base, ModelMixin
+
+if TYPE_CHECKING:
+    from shopping_cart.data_model.product import Product
+
+
+class Reservation(Base, ModelMixin):
+    """
+    Units of a product held for a shopping cart until they
+    are checked out, released or the reservation expires
+
+    Attributes
+    ----------
+    cart_id
+        identifier of the shopping cart holding the units
+    quantity
+        number of units reserved
+    expires_at
+        (UTC) time after which the units can be released
+    product
+        the reserved product
+    items
+        the reserved items if the product is serial-tracked
+
+    """
+    __tablename__ = "reservation"
+    __table_args__ = (
+        # expired reservations when releasing them in bulk
+        Index("ix_reservation_expires_at", "expires_at"),
+    )
+
+    cart_id = Column(String)
+    quantity = Column(Integer)
+    expires_at = Column(DateTime)
+
+    product_id = Column(
+        Integer,
+        ForeignKey(
+            "product.id"
+        )
+    )
+    product: "Product" = relationship(
+        "Product",
+        uselist=False
+    )
+
+    items = relationship(
+        "Item",
+        back_populates="reservation",
+        order_by="Item.id"
+    )
@@ -0,0 +1,77 @@
+from typing import Optional
+
+from sqlalchemy import Column, String
+from sqlalchemy.orm import Session
+
+from shopping_cart.data_model.base import Base, QueryMixin
+
+
+class StoreSetting(Base, QueryMixin):
+    """
+    A key-value setting of the store database,
+    e.g. the schema version
+
+    Attributes
+    ----------
+    key
+        name of the setting
+    value
+        value of the setting
+
+    """
+    __tablename__ = "store_setting"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+    @classmethod
+    def get(
+            cls,
+            session: Session,
+            key: str,
+            default: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Value of a setting
+
+        Parameters
+        ----------
+        session
+            a store database
+        key
+            name of the setting
+        default
+            value if the setting is absent. Default = None
+
+        Returns
+        -------
+            value of the setting
+
+        """
+        setting = session.query(cls).get(key)
+        if setting is None:
+            return default
+
+        return setting.value
+
+    @classmethod
+    def set(
+            cls,
+            session: Session,
+            key: str,
+            value: str
+    ):
+        """
+        Add or update a setting
+
+        Parameters
+        ----------
+        session
+            a store database
+        key
+            name of the setting
+        value
+            value of the setting
+
+        """
+        session.merge(cls(key=key, value=value))
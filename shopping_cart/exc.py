@@ -23,4 +23,18 @@ class InvalidAmount(Exception):
     """
     Raise if an invalid total/tax/discount amount
     is assigned to a shopping cart
-    """
\ No newline at end of file
+    """
+
+
+class ReservationExpired(Exception):
+    """
+    Raise if the reserved units of a shopping cart
+    have already been released
+    """
+
+
+class ServiceBusy(Exception):
+    """
+    Raise if a request to the cart service waits longer
+    than its timeout for the service to take it
+    """
@@ -1,41 +1,460 @@
+import hashlib
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
 
 import yaml
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session
 
 from shopping_cart import data_model as m
-from shopping_cart.store.operations import populate
+from shopping_cart.data_model import base
+from shopping_cart.data_model.migration import migrate
+from shopping_cart.exc import InvalidValue
+from shopping_cart.shopping.catalog_file import build_catalog_file
+from shopping_cart.shopping.pricing import FLOAT_PRICING, set_pricing_mode
+from shopping_cart.store.handle import IN_MEMORY_URL, StoreHandle
+from shopping_cart.store.loader import iter_products
+from shopping_cart.store.operations import populate, populate_products
+
+logger = logging.getLogger(__name__)
 
 directory = Path(__file__).parent.parent
 
+# number of products per transaction when streaming a configuration
+DEFAULT_BATCH_SIZE = 100
+
+# keys of the checksum of the product configuration a store was
+# populated from, and of the schema version it was populated with
+CATALOG_CHECKSUM_KEY = "catalog_checksum"
+CATALOG_SCHEMA_VERSION_KEY = "catalog_schema_version"
+
 
 def make_new_store(
-        product_config_path
-):
+        product_config_path,
+        bulk: bool = False,
+        stream: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pricing_mode: str = FLOAT_PRICING,
+        url: str = IN_MEMORY_URL,
+        as_handle: bool = False
+) -> Union[Session, StoreHandle]:
     """
     Make a new store backend database and
     populate products from configuration yaml
 
+    Parameters
+    ----------
+    product_config_path
+        filepath of the product configuration file
+    bulk
+        If True, populate with set-based inserts. Default = False
+    stream
+        If True, parse and commit the products in batches of
+        `batch_size` instead of loading the whole configuration
+        at once, so memory stays bounded for huge catalogs.
+        Default = False
+    batch_size
+        number of products per transaction when streaming
+    progress
+        Called after each committed batch with the total number
+        of products and items added so far when streaming
+    pricing_mode
+        pricing mode of the store, i.e. FLOAT_PRICING or
+        CENTS_PRICING. Default = FLOAT_PRICING
+    url
+        URL of the store database. Default = "sqlite://", i.e. in memory
+    as_handle
+        If True, return a handle of the store, owning its engine and
+        its connection pool, to share the store between threads.
+        Default = False
+
     Returns
     -------
+    store
+        store product database, the session of the calling thread
+        unless a handle is asked for
+
+    """
+    handle = StoreHandle(url)
+
+    migrate(handle.engine)
+    store = handle.session()
+    set_pricing_mode(store, pricing_mode)
+    _populate(store, product_config_path, bulk, stream, batch_size, progress)
+
+    return handle if as_handle else store
+
+
+def open_store(
+        path,
+        product_config_path,
+        bulk: bool = True,
+        stream: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pricing_mode: str = FLOAT_PRICING,
+        pragmas: Optional[Dict[str, Union[str, int]]] = None
+) -> StoreHandle:
+    """
+    Open a file-backed store, creating and populating it from the
+    product configuration yaml unless it was already populated from
+    the same configuration with the current schema version
+
+    The store file is opened in WAL mode by default, so several
+    processes can serve from it at once. The checksum is checked, and
+    the store cleared and populated again, in one write transaction,
+    so processes opening the store at once wait for the first one to
+    populate it rather than populating it again. When streaming, the
+    batches are committed one by one, so the store should be refreshed
+    by one process before others open it.
+
+    Populating the store again deletes its carts and reservations
+    together with its products, as the products and items they refer
+    to are replaced.
+
+    Parameters
+    ----------
+    path
+        filepath of the store database
     product_config_path
         filepath of the product configuration file
-    store
-        store product database
+    bulk
+        If True, populate with set-based inserts. Default = True
+    stream
+        If True, parse and commit the products in batches of
+        `batch_size`. Default = False
+    batch_size
+        number of products per transaction when streaming
+    progress
+        Called after each committed batch with the total number
+        of products and items added so far when streaming
+    pricing_mode
+        pricing mode of the store, i.e. FLOAT_PRICING or
+        CENTS_PRICING. Default = FLOAT_PRICING
+    pragmas
+        pragmas set on each connection to the store. Default = None,
+        i.e. shopping_cart.store.handle.DEFAULT_PRAGMAS
+
+    Returns
+    -------
+        a handle of the store
 
     """
-    engine = create_engine('sqlite://')
 
-    m.Base.metadata.create_all(engine)
-    store = sessionmaker(bind=engine)()
+    handle = StoreHandle(f"sqlite:///{path}", pragmas=pragmas)
+    migrate(handle.engine)
+    store = handle.session()
 
-    with open(product_config_path) as f:
-        product_dict = yaml.safe_load(f)
+    checksum = catalog_checksum(product_config_path, pricing_mode)
+    # take the write lock before reading the checksum, other processes
+    # opening the store wait until the transaction is committed
+    store.execute("BEGIN IMMEDIATE")
+    if (
+            m.StoreSetting.get(store, CATALOG_CHECKSUM_KEY) == checksum
+            and m.StoreSetting.get(store, CATALOG_SCHEMA_VERSION_KEY) == str(base._schema_version)
+    ):
+        logger.info(f"Store {path} is up to date")
+        store.commit()
+        return handle
+
+    logger.info(f"Populating store {path} from {product_config_path}")
+    _clear(store)
+    set_pricing_mode(store, pricing_mode, commit=False)
+    if not stream:
+        # committed together with the products by populate
+        _set_checksum(store, checksum)
+    _populate(store, product_config_path, bulk, stream, batch_size, progress)
+    if stream:
+        # recorded once the last batch is in, so an interrupted
+        # store is populated again when next opened
+        _set_checksum(store, checksum)
+        store.commit()
 
-    populate(
-        product_dict,
-        store
+    return handle
+
+
+def _set_checksum(
+        store: Session,
+        checksum: str
+):
+    """
+    Record the checksum of the configuration a store is populated
+    from, with the current schema version
+    """
+    store.merge(m.StoreSetting(key=CATALOG_CHECKSUM_KEY, value=checksum))
+    store.merge(
+        m.StoreSetting(key=CATALOG_SCHEMA_VERSION_KEY, value=str(base._schema_version))
+    )
+
+
+class StoreBuild:
+    """
+    The outcome of opening, and populating if needed, one of
+    the stores of make_stores
+
+    Attributes
+    ----------
+    product_config_path
+        filepath of the product configuration file
+    path
+        filepath of the store database
+    seconds
+        time taken by the store, in seconds
+    number_of_products
+        number of products in the store
+    number_of_items
+        number of items in the store
+
+    """
+    __slots__ = (
+        "product_config_path", "path", "seconds", "number_of_products", "number_of_items"
     )
 
-    return store
+    def __init__(
+            self,
+            product_config_path,
+            path,
+            seconds: float,
+            number_of_products: int,
+            number_of_items: int
+    ):
+        self.product_config_path = product_config_path
+        self.path = path
+        self.seconds = seconds
+        self.number_of_products = number_of_products
+        self.number_of_items = number_of_items
+
+
+def make_stores(
+        product_config_paths: List,
+        directory,
+        processes: Optional[int] = None,
+        bulk: bool = True,
+        stream: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        pricing_mode: str = FLOAT_PRICING
+) -> List[StoreBuild]:
+    """
+    Open a file-backed store for each of several product configuration
+    yaml files, populating the stores concurrently in a pool of processes
+
+    Each store is written to `<directory>/<name of its configuration>.db`
+    and numbers its products, offers and items on its own. As with
+    open_store, a store already populated from the same configuration
+    is opened as it is.
+
+    Parameters
+    ----------
+    product_config_paths
+        filepaths of the product configuration files
+    directory
+        directory of the store databases
+    processes
+        number of worker processes. Default = None, i.e. the number of
+        processors; 1 populates the stores one after the other in
+        this process
+    bulk
+        If True, populate with set-based inserts. Default = True
+    stream
+        If True, parse and commit the products in batches of
+        `batch_size`. Default = False
+    batch_size
+        number of products per transaction when streaming
+    pricing_mode
+        pricing mode of the stores, i.e. FLOAT_PRICING or
+        CENTS_PRICING. Default = FLOAT_PRICING
+
+    Returns
+    -------
+        the build of each store, in the order of the configurations
+
+    Raises
+    ------
+    InvalidValue
+        If the number of processes is not positive, or two
+        configurations have the same file name
+
+    """
+
+    if processes is not None and processes <= 0:
+        raise InvalidValue(f"Number of processes must be positive. {processes} is given.")
+
+    paths = {}
+    for product_config_path in product_config_paths:
+        path = Path(directory) / f"{Path(product_config_path).stem}.db"
+        if path in paths.values():
+            raise InvalidValue(
+                f"Product configuration files must have distinct names. "
+                f"{Path(product_config_path).name} is given twice."
+            )
+        paths[product_config_path] = path
+
+    arguments = [
+        (product_config_path, path, bulk, stream, batch_size, pricing_mode)
+        for product_config_path, path in paths.items()
+    ]
+    if processes == 1:
+        builds = [_build_store(*args) for args in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_build_store, *args) for args in arguments]
+            builds = [future.result() for future in futures]
+
+    for build in builds:
+        logger.info(
+            f"Store {build.path}: {build.number_of_products} products and "
+            f"{build.number_of_items} items in {build.seconds:.3f}s"
+        )
+
+    return builds
+
+
+def _build_store(
+        product_config_path,
+        path,
+        bulk: bool,
+        stream: bool,
+        batch_size: int,
+        pricing_mode: str
+) -> StoreBuild:
+    """
+    Open a store of make_stores, in a worker process
+    """
+    start = time.perf_counter()
+    with open_store(
+            path,
+            product_config_path,
+            bulk=bulk,
+            stream=stream,
+            batch_size=batch_size,
+            pricing_mode=pricing_mode
+    ) as handle:
+        store = handle.session()
+        number_of_products = m.Product.count(store)
+        number_of_items = m.Item.count(store)
+
+    return StoreBuild(
+        product_config_path,
+        path,
+        time.perf_counter() - start,
+        number_of_products,
+        number_of_items
+    )
+
+
+def make_catalog_file(
+        product_config_path,
+        path,
+        stream: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE
+):
+    """
+    Compile a product configuration yaml into a binary catalog file,
+    see shopping_cart.shopping.catalog_file.MappedCatalog
+
+    The products get the same ids as in a new store made from the
+    same configuration
+
+    Parameters
+    ----------
+    product_config_path
+        filepath of the product configuration file
+    path
+        filepath of the catalog file
+    stream
+        If True, parse the configuration in batches of `batch_size`
+        products. Default = False
+    batch_size
+        number of products per transaction when streaming
+
+    """
+    with make_new_store(
+            product_config_path,
+            bulk=True,
+            stream=stream,
+            batch_size=batch_size,
+            as_handle=True
+    ) as handle:
+        build_catalog_file(handle.session(), path)
+
+    logger.info(f"Compiled {product_config_path} into catalog file {path}")
+
+
+def catalog_checksum(
+        product_config_path,
+        pricing_mode: str = FLOAT_PRICING
+) -> str:
+    """
+    Checksum of a product configuration file and a pricing mode
+
+    Parameters
+    ----------
+    product_config_path
+        filepath of the product configuration file
+    pricing_mode
+        pricing mode of the store. Default = FLOAT_PRICING
+
+    Returns
+    -------
+        the hex digest
+
+    """
+    digest = hashlib.sha256(pricing_mode.encode())
+    with open(product_config_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _clear(
+        store: Session
+):
+    """
+    Delete the rows of every table but the store settings, e.g.
+    before populating a store again from a changed configuration,
+    without committing. The carts and reservations are deleted too,
+    as the products and items they refer to are replaced
+    """
+    carts = m.Cart.count(store)
+    reservations = m.Reservation.count(store)
+    if carts or reservations:
+        logger.warning(
+            f"Deleting {carts} carts and {reservations} reservations "
+            f"of the store, as its products are replaced"
+        )
+
+    for table in reversed(base.Base.metadata.sorted_tables):
+        if table.name != m.StoreSetting.__tablename__:
+            store.execute(table.delete())
+
+
+def _populate(
+        store: Session,
+        product_config_path,
+        bulk: bool,
+        stream: bool,
+        batch_size: int,
+        progress: Optional[Callable[[int, int], None]]
+):
+    """
+    Populate a store from a product configuration file
+    """
+    with open(product_config_path) as f:
+        if stream:
+            populate_products(
+                iter_products(f),
+                store,
+                bulk=bulk,
+                batch_size=batch_size,
+                progress=progress
+            )
+        else:
+            populate(
+                yaml.safe_load(f),
+                store,
+                bulk=bulk
+            )
@@ -0,0 +1,16 @@
+def to_cents(
+        amount: float
+) -> int:
+    """
+    Amount in integer minor units (cents)
+    """
+    return round(amount * 100)
+
+
+def to_basis_points(
+        rate: float
+) -> int:
+    """
+    Percentage in integer basis points
+    """
+    return round(rate * 100)
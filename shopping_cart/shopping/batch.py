@@ -0,0 +1,444 @@
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from shopping_cart.exc import InvalidValue
+from shopping_cart.money import to_basis_points
+from shopping_cart.shopping.cart import BaseCart
+from shopping_cart.shopping.pricing import (
+    BASIS_POINTS, TAX_ROUNDING_CENTS, PriceBreakdown, validate_rates
+)
+from shopping_cart.shopping.rules import CartRule, PricingPlan, Threshold
+
+# Relative distance from a tie below which numpy's rounding is checked
+# against python's, i.e. where round-half-even on the scaled value may
+# differ from python's correctly rounded decimal rounding
+_TIE_TOLERANCE = 1e-9
+
+
+class BatchPriceBreakdown:
+    """
+    Price breakdowns of many carts, each attribute is an array
+    with one price per cart
+
+    Attributes
+    ----------
+    total_marked_price
+        total marked price before discount
+    product_discount
+        total discount of the individual product offers
+    global_discount
+        discount on the total purchase
+    total_discount
+        total discount, rounded off to 2 decimal places
+    total_price_before_tax
+        total price after discount before tax
+    total_tax
+        total tax amount, rounded off to 1 decimal place
+    total_price
+        total price with discount subtracted and tax added,
+        rounded off to 2 decimal places
+
+    """
+
+    def __init__(
+            self,
+            total_marked_price: np.ndarray,
+            product_discount: np.ndarray,
+            global_discount: np.ndarray,
+            total_discount: np.ndarray,
+            total_price_before_tax: np.ndarray,
+            total_tax: np.ndarray,
+            total_price: np.ndarray
+    ):
+        self.total_marked_price = total_marked_price
+        self.product_discount = product_discount
+        self.global_discount = global_discount
+        self.total_discount = total_discount
+        self.total_price_before_tax = total_price_before_tax
+        self.total_tax = total_tax
+        self.total_price = total_price
+
+    def __len__(self) -> int:
+        return len(self.total_price)
+
+    def __getitem__(
+            self,
+            index: int
+    ) -> PriceBreakdown:
+        """
+        Price breakdown of a single cart
+        """
+        return PriceBreakdown(
+            total_marked_price=float(self.total_marked_price[index]),
+            product_discount=float(self.product_discount[index]),
+            global_discount=float(self.global_discount[index]),
+            total_discount=float(self.total_discount[index]),
+            total_price_before_tax=float(self.total_price_before_tax[index]),
+            total_tax=float(self.total_tax[index]),
+            total_price=float(self.total_price[index])
+        )
+
+    def as_dicts(self) -> List[dict]:
+        """
+        Breakdown price of each cart in a dict including total
+        discount, total tax amount and total price
+        """
+        return [self[i].as_dict() for i in range(len(self))]
+
+
+def price_batch(
+        quantities,
+        unit_prices,
+        required_quantities,
+        percentages,
+        tax_rate: float = 0,
+        required_purchase_total: Optional[float] = None,
+        global_rate: Optional[float] = None
+) -> BatchPriceBreakdown:
+    """
+    Price many carts at once with array operations
+
+    The prices are exactly the same floats as pricing each cart
+    on its own, provided the products (columns) are in product id
+    order like the lines of a cart.
+
+    Parameters
+    ----------
+    quantities
+        quantity of each product in each cart, carts x products
+    unit_prices
+        marked price of a single item of each product
+    required_quantities
+        required quantity of the offer of each product, 0 if
+        the product has no offer
+    percentages
+        discount percentage of the offer of each product
+    tax_rate
+        tax rate (in percentage) of the carts
+    required_purchase_total
+        required total cost of the purchase to get the global discount
+    global_rate
+        global discount rate
+
+    Returns
+    -------
+        the price breakdowns of the carts
+
+    Raises
+    ------
+    InvalidValue
+        If the arrays do not match in shape, any quantity is
+        negative, or the tax rate or the global discount
+        parameters are invalid
+
+    """
+
+    validate_rates(tax_rate, required_purchase_total, global_rate)
+
+    quantities = np.asarray(quantities, dtype=np.int64)
+    unit_prices = np.asarray(unit_prices, dtype=np.float64)
+    required_quantities = np.asarray(required_quantities, dtype=np.int64)
+    percentages = np.asarray(percentages, dtype=np.float64)
+
+    if quantities.ndim != 2:
+        raise InvalidValue(
+            f"Quantities must be a carts x products matrix. "
+            f"An array of {quantities.ndim} dimensions is given."
+        )
+
+    n_carts, n_products = quantities.shape
+    for name, array in (
+            ("unit prices", unit_prices),
+            ("required quantities", required_quantities),
+            ("percentages", percentages)
+    ):
+        if array.shape != (n_products,):
+            raise InvalidValue(
+                f"Expected {n_products} {name}, one per product. "
+                f"An array of shape {array.shape} is given."
+            )
+
+    if (quantities < 0).any():
+        raise InvalidValue(
+            "Quantities of products in a cart must be non-negative."
+        )
+
+    # Accumulate product by product, in the same order and with
+    # the same operations as the scalar pricing engine
+    total_marked_price = np.zeros(n_carts)
+    product_discount = np.zeros(n_carts)
+    for j in range(n_products):
+        total_marked_price += unit_prices[j] * quantities[:, j]
+
+        if required_quantities[j] > 0:
+            number_of_discounted_items = quantities[:, j] // required_quantities[j]
+            product_discount += unit_prices[j] * number_of_discounted_items \
+                * percentages[j] / 100
+
+    global_discount = np.zeros(n_carts)
+    if required_purchase_total is not None:
+        price_after_product_discount = total_marked_price - product_discount
+        global_discount = np.where(
+            price_after_product_discount >= required_purchase_total,
+            price_after_product_discount * global_rate / 100,
+            0
+        )
+
+    total_discount = _round(product_discount + global_discount, 2)
+    total_price_before_tax = total_marked_price - total_discount
+    total_tax = _round(total_price_before_tax * tax_rate / 100, 1)
+
+    return BatchPriceBreakdown(
+        total_marked_price=total_marked_price,
+        product_discount=product_discount,
+        global_discount=global_discount,
+        total_discount=total_discount,
+        total_price_before_tax=total_price_before_tax,
+        total_tax=total_tax,
+        total_price=_round(total_price_before_tax + total_tax, 2)
+    )
+
+
+def price_carts(
+        carts: Iterable[BaseCart],
+        tax_rate: float = 0,
+        required_purchase_total: Optional[float] = None,
+        global_rate: Optional[float] = None
+) -> BatchPriceBreakdown:
+    """
+    Price many shopping carts of a store at once, e.g. to re-price
+    the carts when a promotion or the tax rate changes, with the
+    pricing plan and the pricing mode of the store, i.e. exactly
+    as each cart prices itself
+
+    Parameters
+    ----------
+    carts
+        the shopping carts
+    tax_rate
+        tax rate (in percentage) of the carts
+    required_purchase_total
+        required total cost of the purchase to get the global discount
+    global_rate
+        global discount rate
+
+    Returns
+    -------
+        the price breakdowns of the carts, in the given order
+
+    Raises
+    ------
+    InvalidValue
+        If the carts do not have the same pricing mode, or the tax
+        rate or the global discount parameters are invalid
+
+    """
+
+    validate_rates(tax_rate, required_purchase_total, global_rate)
+
+    carts = list(carts)
+    pricing_modes = {cart.pricing_mode for cart in carts}
+    if len(pricing_modes) > 1:
+        raise InvalidValue(
+            f"Carts priced in a batch must have the same pricing mode. "
+            f"{', '.join(sorted(pricing_modes))} are given."
+        )
+
+    quantities, product_ids = quantity_matrix([cart.quantities for cart in carts])
+    if not carts:
+        return price_plan(PricingPlan({}, []), quantities, product_ids, tax_rate)
+
+    with carts[0]._borrow():
+        plan = carts[0]._plan(product_ids)
+
+    cart_rules = []
+    if required_purchase_total is not None:
+        cart_rules.append(
+            Threshold(required_purchase_total, global_rate).compile_cart(plan.in_cents)
+        )
+
+    return price_plan(plan, quantities, product_ids, tax_rate, cart_rules)
+
+
+def price_plan(
+        plan: PricingPlan,
+        quantities: np.ndarray,
+        product_ids: List[int],
+        tax_rate: float = 0,
+        cart_rules: Iterable[CartRule] = ()
+) -> BatchPriceBreakdown:
+    """
+    Price many carts at once by evaluating a pricing plan on a
+    quantity matrix, giving exactly the prices of PricingPlan.price
+
+    The products (columns) must be in product id order. Each line
+    rule of a product is evaluated once per distinct quantity of the
+    product, and the rules of the whole cart once per cart. In the
+    cents pricing mode the amounts are integers, rounded as in
+    breakdown_cents.
+
+    Parameters
+    ----------
+    plan
+        the pricing plan
+    quantities
+        quantity of each product in each cart, carts x products
+    product_ids
+        id of the product of each column
+    tax_rate
+        tax rate (in percentage) of the carts
+    cart_rules
+        extra compiled rules of the whole cart, e.g. a global
+        discount given for this pricing only
+
+    Returns
+    -------
+        the price breakdowns of the carts, in major units
+
+    """
+
+    dtype = np.int64 if plan.in_cents else np.float64
+    n_carts = len(quantities)
+
+    total_marked_price = np.zeros(n_carts, dtype=dtype)
+    product_discount = np.zeros(n_carts, dtype=dtype)
+    for j, product_id in enumerate(product_ids):
+        column = quantities[:, j]
+        product_plan = plan.products[product_id]
+        total_marked_price += product_plan.unit_price * column
+
+        if product_plan.rules:
+            distinct, inverse = np.unique(column, return_inverse=True)
+            for rule in product_plan.rules:
+                discounts = np.array(
+                    [rule(int(quantity)) if quantity else 0 for quantity in distinct],
+                    dtype=dtype
+                )
+                product_discount += discounts[inverse]
+
+    global_discount = np.zeros(n_carts, dtype=dtype)
+    for rule in chain(plan.cart_rules, cart_rules):
+        global_discount += np.array(
+            [
+                rule(total, discount) for total, discount in zip(
+                    total_marked_price.tolist(), product_discount.tolist()
+                )
+            ],
+            dtype=dtype
+        )
+
+    if plan.in_cents:
+        return _breakdown_cents(
+            total_marked_price, product_discount, global_discount, tax_rate
+        )
+
+    total_discount = _round(product_discount + global_discount, 2)
+    total_price_before_tax = total_marked_price - total_discount
+    total_tax = _round(total_price_before_tax * tax_rate / 100, 1)
+
+    return BatchPriceBreakdown(
+        total_marked_price=total_marked_price,
+        product_discount=product_discount,
+        global_discount=global_discount,
+        total_discount=total_discount,
+        total_price_before_tax=total_price_before_tax,
+        total_tax=total_tax,
+        total_price=_round(total_price_before_tax + total_tax, 2)
+    )
+
+
+def quantity_matrix(
+        quantities: List[Dict[int, int]]
+) -> Tuple[np.ndarray, List[int]]:
+    """
+    Quantity matrix of carts, with the products of all the
+    carts in product id order
+
+    Parameters
+    ----------
+    quantities
+        quantity by product id of each cart
+
+    Returns
+    -------
+        the quantities (carts x products) and the product id
+        of each column
+
+    """
+
+    product_ids = sorted(
+        {product_id for cart_quantities in quantities for product_id in cart_quantities}
+    )
+    columns = {product_id: j for j, product_id in enumerate(product_ids)}
+
+    matrix = np.zeros((len(quantities), len(product_ids)), dtype=np.int64)
+    for i, cart_quantities in enumerate(quantities):
+        for product_id, quantity in cart_quantities.items():
+            matrix[i, columns[product_id]] = quantity
+
+    return matrix, product_ids
+
+
+def _breakdown_cents(
+        total_marked_price: np.ndarray,
+        product_discount: np.ndarray,
+        global_discount: np.ndarray,
+        tax_rate: float
+) -> BatchPriceBreakdown:
+    """
+    Price breakdowns in major units of carts from their amounts in
+    cents, with the rounding policy of breakdown_cents
+    """
+
+    total_discount = _round_half_up(
+        product_discount * BASIS_POINTS + global_discount, BASIS_POINTS ** 2
+    )
+    total_price_before_tax = total_marked_price - total_discount
+    total_tax = TAX_ROUNDING_CENTS * _round_half_up(
+        total_price_before_tax * to_basis_points(tax_rate),
+        BASIS_POINTS * TAX_ROUNDING_CENTS
+    )
+
+    return BatchPriceBreakdown(
+        total_marked_price=total_marked_price / 100,
+        product_discount=_round_half_up(product_discount, BASIS_POINTS) / 100,
+        global_discount=_round_half_up(global_discount, BASIS_POINTS ** 2) / 100,
+        total_discount=total_discount / 100,
+        total_price_before_tax=total_price_before_tax / 100,
+        total_tax=total_tax / 100,
+        total_price=(total_price_before_tax + total_tax) / 100
+    )
+
+
+def _round_half_up(
+        numerator: np.ndarray,
+        denominator: int
+) -> np.ndarray:
+    """
+    Non-negative integer ratios rounded off half up
+    """
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def _round(
+        values: np.ndarray,
+        decimals: int
+) -> np.ndarray:
+    """
+    Round off to the given decimal places exactly as python's round
+
+    numpy rounds the scaled values, which only differs from python's
+    correctly rounded result close to a tie, so those few values are
+    rounded with python.
+    """
+    scale = 10 ** decimals
+    scaled = values * scale
+    rounded = np.round(scaled) / scale
+
+    distance_to_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5)
+    for i in np.flatnonzero(distance_to_tie <= _TIE_TOLERANCE * np.maximum(np.abs(scaled), 1)):
+        rounded[i] = round(float(values[i]), decimals)
+
+    return rounded
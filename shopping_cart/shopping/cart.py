@@ -1,41 +1,146 @@
-from collections import defaultdict
-from typing import Optional, List
+from abc import ABC, abstractmethod
+import sys
+from contextlib import nullcontext
+from datetime import timedelta
+from functools import wraps
+from typing import Dict, Iterable, Optional, List, Tuple, Union
 from uuid import uuid4
 
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, joinedload
 
 from shopping_cart.data_model.product import Item, Product
-from shopping_cart.exc import InvalidValue
+from shopping_cart.data_model.reservation import Reservation
+from shopping_cart.exc import InvalidValue, ReservationExpired
+from shopping_cart.shopping.catalog import CatalogSnapshot
+from shopping_cart.shopping.catalog_file import MappedCatalog
+from shopping_cart.shopping.pricing import (
+    BASIS_POINTS, CENTS_PRICING, PriceBreakdown, get_pricing_mode, validate_rates
+)
+from shopping_cart.shopping.quote_cache import QuoteCache, quote_key
+from shopping_cart.shopping.rules import PricingPlan, Threshold, pricing_plan
+from shopping_cart.store.handle import StoreHandle
+from shopping_cart.store.reservation import (
+    DEFAULT_TTL, confirm, release, reserve, reserve_order
+)
+from shopping_cart.store.write_behind import CartWriter
 
 
-class ShoppingCart:
+def _borrowing(method):
     """
-    A shopping cart
+    Run a method of a cart on a borrowed session of
+    its store handle, if the cart has one
     """
 
+    @wraps(method)
+    def borrowing(self, *args, **kwargs):
+        with self._borrow():
+            return method(self, *args, **kwargs)
+
+    return borrowing
+
+
+def _size(
+        value
+) -> int:
+    """
+    Size in bytes of a value, with the keys and values of a
+    dictionary, but only the references held by a list
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += _size(key) + _size(item)
+
+    return size
+
+
+class BaseCart(ABC):
+    """
+    A shopping cart, independently of where its units are reserved
+
+    The cart keeps the quantity of each product rather than the
+    items themselves, together with running totals which are
+    updated as items are added and removed, and prices them with
+    the pricing plan of its catalog. A subclass reserves the units
+    and gives the pricing plan and the pricing mode
+    """
+
+    # containers of the cart measured by footprint, with their content
+    _measured: Tuple[str, ...] = ("quantities", "_line_discounts")
+
     def __init__(
             self,
-            store: Session,
-            cart_id: Optional[int] = str(uuid4()),
-            items: List[Item] = None
+            cart_id: Optional[str] = None,
+            reservation_ttl: timedelta = DEFAULT_TTL,
+            quote_cache: Optional[QuoteCache] = None,
+            writer: Optional[CartWriter] = None
     ):
         """
 
         Parameters
         ----------
-        store
-            the store database
         cart_id
-            identifier of the shopping cart. Default = str(uuid4())
-        items
-            items in the cart. Default = None
+            identifier of the shopping cart. Default = None, i.e.
+            a new str(uuid4()) for each cart
+        reservation_ttl
+            how long the units added to the cart are reserved for.
+            Default = 15 minutes
+        quote_cache
+            cache of the price breakdowns, which may be shared by
+            the carts of the store. Default = None
+        writer
+            writer persisting the changes of the cart in the
+            background. Default = None
+
+        """
+
+        self.cart_id = str(uuid4()) if cart_id is None else cart_id
+        self.reservation_ttl = reservation_ttl
+        self.quote_cache = quote_cache
+        self.writer = writer
+
+        # Pricing mode of the store, the running totals are in
+        # cents in the cents pricing mode
+        self.pricing_mode = self._read_pricing_mode()
+        self._in_cents = self.pricing_mode == CENTS_PRICING
+
+        # Quantity of each product in the cart by product id
+        self.quantities: Dict[int, int] = {}
+        self._products: Dict[int, Product] = {}
+
+        # Running totals, i.e. the total marked price and the
+        # total discount of the product offers
+        self._number_of_items = 0
+        self._marked_subtotal = 0
+        self._product_discount = 0
+        self._line_discounts: Dict[int, float] = {}
+        # catalog version the running totals are computed with
+        self._totals_version: Optional[int] = None
+
+    def _borrow(self):
+        """
+        Borrow the session the cart works in, if any
+        """
+        return nullcontext()
 
+    @abstractmethod
+    def _read_pricing_mode(self) -> str:
+        """
+        Pricing mode of the store of the cart
         """
 
-        self.store = store
-        self.cart_id = cart_id
-        self.items = items or []
+    @abstractmethod
+    def _plan(
+            self,
+            product_ids
+    ) -> PricingPlan:
+        """
+        Pricing plan of the store in the pricing mode of the cart,
+        covering the given products
+        """
 
+    @abstractmethod
     def add_product_items(
             self,
             product_name: str,
@@ -43,31 +148,173 @@ class ShoppingCart:
             is_random: bool = False
     ):
         """
-        Add N items of a given product to the cart
+        Add N items of a given product to the cart, reserved
+        until they are checked out or removed
+        """
 
-        Parameters
-        ----------
-        product_name
-            the name of the product to be added
-        quantity
-            number of the product items to be added
-        is_random
-            If True, randomly pick the N
-            available items from the store.
-            Default = False
+    @abstractmethod
+    def add_order(
+            self,
+            order: Dict[str, int],
+            is_random: bool = False
+    ):
+        """
+        Add the items of several products to the cart at once,
+        all or nothing
+        """
 
+    @abstractmethod
+    def remove_product_items(
+            self,
+            product_name: str,
+            quantity: int
+    ):
+        """
+        Remove N items of a given product from the cart and
+        return them to the store
         """
 
-        self.items.extend(
-            Product.pick(
-                self.store,
-                product_name,
-                quantity,
-                is_random
-            )
+    @abstractmethod
+    def empty(self):
+        """
+        Remove all the items from the cart and return
+        them to the store
+        """
+
+    @abstractmethod
+    def checkout(self):
+        """
+        Check out all the items in the cart and empty the cart
+        """
+
+    def _update(
+            self,
+            product: Product,
+            quantity: int
+    ):
+        """
+        Add (or remove, if negative) N items of a product to the
+        quantities and the running totals of the cart
+        """
+
+        new_quantity = self.quantities.get(product.id, 0) + quantity
+        if new_quantity:
+            self.quantities[product.id] = new_quantity
+            self._products[product.id] = product
+        else:
+            del self.quantities[product.id]
+            del self._products[product.id]
+
+        store_plan = self._plan([product.id])
+        if store_plan.version != self._totals_version:
+            store_plan = self._plan([product.id, *self.quantities])
+            self._rebase(store_plan, product.id, new_quantity - quantity)
+
+        plan = store_plan.products[product.id]
+        new_line_discount = plan.line_discount(new_quantity)
+
+        self._number_of_items += quantity
+        self._product_discount += new_line_discount - self._line_discounts.pop(product.id, 0)
+        if new_line_discount:
+            self._line_discounts[product.id] = new_line_discount
+
+        if self._number_of_items == 0:
+            # nothing left to accumulate rounding errors on
+            self._marked_subtotal = 0
+            self._product_discount = 0
+        else:
+            self._marked_subtotal += plan.unit_price * quantity
+
+    def _rebase(
+            self,
+            plan: PricingPlan,
+            changed_id: int,
+            changed_quantity: int
+    ):
+        """
+        Compute the running totals again with a plan of a new
+        catalog version, e.g. a price changed by another session,
+        counting the product being changed at its previous quantity
+        """
+        quantities = dict(self.quantities)
+        quantities[changed_id] = changed_quantity
+
+        self._totals_version = plan.version
+        self._marked_subtotal = 0
+        self._product_discount = 0
+        self._line_discounts = {}
+        for product_id, quantity in quantities.items():
+            product_plan = plan.products.get(product_id)
+            if product_plan is None or quantity == 0:
+                continue
+
+            self._marked_subtotal += product_plan.unit_price * quantity
+            line_discount = product_plan.line_discount(quantity)
+            self._product_discount += line_discount
+            if line_discount:
+                self._line_discounts[product_id] = line_discount
+
+    def _clear(self):
+        """
+        Forget all the items in the cart
+        """
+        self.quantities = {}
+        self._products = {}
+
+        self._number_of_items = 0
+        self._marked_subtotal = 0
+        self._product_discount = 0
+        self._line_discounts = {}
+        self._totals_version = None
+        self._persist()
+
+    def _persist(self):
+        """
+        Record the quantities of the cart with its writer, if any
+        """
+        if self.writer is not None:
+            self.writer.record(self.cart_id, self.quantities)
+
+    @property
+    @_borrowing
+    def catalog_version(self) -> int:
+        """
+        Catalog version the cart is priced with, checked against
+        the store once per transaction, see pricing_plan
+
+        """
+
+        return self._plan(self.quantities).version
+
+    def footprint(self) -> int:
+        """
+        Approximate memory footprint of the cart in bytes, i.e. the
+        sizes of the cart, of its containers and of the ids and
+        amounts they hold. The products and items of the cart are
+        shared with the session of the store, so only the references
+        to them are counted. It takes one pass over the lines of the
+        cart, cheap enough to measure on every lookup
+
+        """
+
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.__dict__)
+            + sys.getsizeof(self._products)
+            + sum(_size(getattr(self, name)) for name in self._measured)
         )
 
     @property
+    def number_of_items(self) -> int:
+        """
+        Number of items in the cart
+
+        """
+
+        return self._number_of_items
+
+    @property
+    @_borrowing
     def product_list(self) -> dict:
         """
         A dictionary of the products and their corresponding quantity
@@ -75,25 +322,101 @@ class ShoppingCart:
 
         """
 
-        products = defaultdict(int)
-        for item in self.items:
-            products[item.product] += 1
+        self._load_products()
+        return {
+            self._products[product_id]: quantity
+            for product_id, quantity in self.quantities.items()
+        }
 
-        return products
+    def _load_products(self):
+        """
+        Load the products of the cart which are out of date, if any
+        """
 
     @property
     def total_marked_price(self) -> float:
         """
         Total marked price before discount of all the items
-        in the cart
+        in the cart, a running total
+
+        """
+
+        if self._in_cents:
+            return self._marked_subtotal / 100
+
+        return self._marked_subtotal
+
+    @property
+    def discounted_subtotal(self) -> float:
+        """
+        Total price after the product offers, before the global
+        discount and tax, a running total
+
+        """
+
+        if self._in_cents:
+            return (
+                self._marked_subtotal * BASIS_POINTS - self._product_discount
+            ) / (100 * BASIS_POINTS)
+
+        return self._marked_subtotal - self._product_discount
+
+    @_borrowing
+    def price(
+            self,
+            tax_rate: float = 0,
+            required_purchase_total: Optional[float] = None,
+            global_rate: Optional[float] = None,
+            catalog: Optional[Union[CatalogSnapshot, MappedCatalog]] = None
+    ) -> PriceBreakdown:
+        """
+        Full price breakdown of the cart, evaluating the pricing plan
+        of the store in a single pass over the products in the cart.
+        In the cents pricing mode the amounts are computed in integer
+        cents and given in major units
+
+        The global discount given here applies on top of the
+        promotions of the store
+
+        Parameters
+        ----------
+        tax_rate
+            tax rate (in percentage) of the shopping cart. Default = 0
+        required_purchase_total
+            required total cost of the purchase to get the global discount
+        global_rate
+            global discount rate
+        catalog
+            If given, price with this catalog snapshot or mapped
+            catalog file instead of the store, without touching the
+            store database. Default = None
+
+        Returns
+        -------
+            the price breakdown
 
         """
 
-        total = 0
-        for item in self.items:
-            total += item.product.unit_price
+        if catalog is not None:
+            return catalog.price(
+                self.quantities,
+                tax_rate,
+                required_purchase_total,
+                global_rate,
+                in_cents=self._in_cents
+            )
+
+        validate_rates(tax_rate, required_purchase_total, global_rate)
+
+        cart_rules = []
+        if required_purchase_total is not None:
+            cart_rules.append(
+                Threshold(required_purchase_total, global_rate).compile_cart(self._in_cents)
+            )
 
-        return total
+        return self._plan(self.quantities).price(
+            self.quantities, tax_rate, cart_rules
+        )
 
     def total_discount(
             self,
@@ -118,34 +441,9 @@ class ShoppingCart:
 
         """
 
-        amount = 0
-        for product, quantity in self.product_list.items():
-            discount_offer = product.discount_offer
-            if discount_offer is None:
-                continue
-
-            number_of_discounted_items = quantity // discount_offer.required_quantity
-            amount += product.unit_price * number_of_discounted_items * discount_offer.percentage / 100
-
-        # add global discount
-        if required_purchase_total is not None:
-            if required_purchase_total <= 0:
-                raise InvalidValue(
-                    f"The required total cost of the purchase for global discount must be positive. "
-                    f"{required_purchase_total} is given instead."
-                )
-
-            if not 100 > global_rate > 0:
-                raise InvalidValue(
-                    f"Global discount rate must be between 0 and 100. {global_rate} is given instead."
-                )
-
-            price_after_product_discount = self.total_marked_price - amount
-            if price_after_product_discount >= required_purchase_total:
-                global_discount = price_after_product_discount * global_rate / 100
-                amount += global_discount
-
-        return round(amount, 2)
+        return self.price(
+            0, required_purchase_total, global_rate
+        ).total_discount
 
     def total_price_before_tax(
             self,
@@ -164,9 +462,9 @@ class ShoppingCart:
 
         """
 
-        return self.total_marked_price - self.total_discount(
-            required_purchase_total, global_rate
-        )
+        return self.price(
+            0, required_purchase_total, global_rate
+        ).total_price_before_tax
 
     def total_tax_amount(
             self,
@@ -197,17 +495,9 @@ class ShoppingCart:
 
         """
 
-        if tax_rate < 0:
-            raise InvalidValue(
-                f"Tax rate must be non-negative. {tax_rate} is given."
-            )
-
-        return round(
-            self.total_price_before_tax(
-                required_purchase_total, global_rate
-            ) * tax_rate / 100,
-            1
-        )
+        return self.price(
+            tax_rate, required_purchase_total, global_rate
+        ).total_tax
 
     def total_price(
             self,
@@ -234,24 +524,22 @@ class ShoppingCart:
 
         """
 
-        return round(
-            self.total_price_before_tax(
-                required_purchase_total, global_rate
-            ) + self.total_tax_amount(
-                tax_rate, required_purchase_total, global_rate
-            ),
-            2
-        )
+        return self.price(
+            tax_rate, required_purchase_total, global_rate
+        ).total_price
 
+    @_borrowing
     def price_breakdown(
             self,
             tax_rate: float,
             required_purchase_total: Optional[float] = None,
-            global_rate: Optional[float] = None
+            global_rate: Optional[float] = None,
+            catalog: Optional[Union[CatalogSnapshot, MappedCatalog]] = None
     ) -> dict:
         """
         Breakdown price of the cart in a dict including total discount,
-        total tax amount and total price
+        total tax amount and total price, looked up first in the quote
+        cache of the cart if it has one
 
         Parameters
         ----------
@@ -261,6 +549,9 @@ class ShoppingCart:
             required total cost of the purchase to get the global discount
         global_rate
             global discount rate
+        catalog
+            If given, price with this catalog snapshot or mapped
+            catalog file instead of the store. Default = None
 
         Returns
         -------
@@ -268,14 +559,493 @@ class ShoppingCart:
 
         """
 
-        return {
-            "total_discount": self.total_discount(
-                required_purchase_total, global_rate
-            ),
-            "total_tax": self.total_tax_amount(
-                tax_rate, required_purchase_total, global_rate
+        if self.quote_cache is None:
+            return self.price(
+                tax_rate, required_purchase_total, global_rate, catalog
+            ).as_dict()
+
+        if catalog is not None:
+            version = catalog.version
+        else:
+            # the plan is checked against the catalog version of the
+            # store once per transaction, see pricing_plan
+            version = self._plan(self.quantities).version
+
+        key = quote_key(
+            self.quantities,
+            tax_rate,
+            required_purchase_total,
+            global_rate,
+            version,
+            self._in_cents
+        )
+        breakdown = self.quote_cache.get(key, version)
+        if breakdown is None:
+            breakdown = self.price(
+                tax_rate, required_purchase_total, global_rate, catalog
+            ).as_dict()
+            self.quote_cache.put(key, version, breakdown)
+
+        return breakdown
+
+
+class ShoppingCart(BaseCart):
+    """
+    A shopping cart of a store database
+
+    The units added to the cart are reserved in the store by
+    reservations, which expire after the reservation ttl of the cart
+    """
+    _measured = BaseCart._measured + ("_reserved", "_unreserved_items")
+
+    def __init__(
+            self,
+            store: Union[Session, StoreHandle],
+            cart_id: Optional[str] = None,
+            items: List[Item] = None,
+            reservation_ttl: timedelta = DEFAULT_TTL,
+            quote_cache: Optional[QuoteCache] = None,
+            writer: Optional[CartWriter] = None
+    ):
+        """
+
+        Parameters
+        ----------
+        store
+            the store database, or a handle of it to borrow the
+            session of the calling thread for each operation
+        cart_id
+            identifier of the shopping cart. Default = None, i.e.
+            a new str(uuid4()) for each cart
+        items
+            items in the cart, which are not reserved. Default = None
+        reservation_ttl
+            how long the units added to the cart are reserved for.
+            Default = 15 minutes
+        quote_cache
+            cache of the price breakdowns, which may be shared by
+            the carts of the store. Default = None
+        writer
+            writer persisting the changes of the cart in the
+            background. Default = None
+
+        """
+
+        if isinstance(store, StoreHandle):
+            self._handle = store
+            self._store = None
+        else:
+            self._handle = None
+            self._store = store
+        super().__init__(cart_id, reservation_ttl, quote_cache, writer)
+
+        # Reserved quantities by reservation id, by product id
+        self._reserved: Dict[int, Dict[int, int]] = {}
+
+        self._unreserved_items = list(items or [])
+        for item in self._unreserved_items:
+            self._update(item.product, 1)
+        if self._unreserved_items:
+            self._persist()
+
+    @property
+    def store(self) -> Session:
+        """
+        Session of the store database, the session of the calling
+        thread if the cart has a store handle
+        """
+        if self._handle is None:
+            return self._store
+
+        return self._handle.session()
+
+    def _borrow(self):
+        """
+        Borrow a session of the store handle of the cart, if any
+        """
+        if self._handle is None:
+            return nullcontext(self._store)
+
+        return self._handle.borrow()
+
+    def _read_pricing_mode(self) -> str:
+        """
+        Pricing mode of the store of the cart
+        """
+        with self._borrow():
+            return get_pricing_mode(self.store)
+
+    @_borrowing
+    def add_product_items(
+            self,
+            product_name: str,
+            quantity: int,
+            is_random: bool = False
+    ):
+        """
+        Add N items of a given product to the cart, the
+        items are reserved in the store until they are
+        checked out, removed or the reservation expires
+
+        Parameters
+        ----------
+        product_name
+            the name of the product to be added
+        quantity
+            number of the product items to be added
+        is_random
+            If True, randomly pick the N
+            available items from the store.
+            Default = False
+
+        """
+
+        reservation = reserve(
+            self.store,
+            product_name,
+            quantity,
+            self.cart_id,
+            ttl=self.reservation_ttl,
+            is_random=is_random
+        )
+        self._add_reservation(reservation)
+        self._persist()
+
+    @_borrowing
+    def add_order(
+            self,
+            order: Dict[str, int],
+            is_random: bool = False
+    ):
+        """
+        Add the items of several products to the cart at once,
+        all or nothing. The products are looked up, checked for
+        stock and reserved in one transaction with a fixed number
+        of queries, rather than a few queries per product
+
+        Parameters
+        ----------
+        order
+            number of items to add by product name
+        is_random
+            If True, randomly pick the available items from the
+            store. Default = False
+
+        Raises
+        ------
+        OverDemand
+            If any product has fewer available items than ordered,
+            in which case nothing is added
+
+        """
+
+        for reservation in reserve_order(
+                self.store,
+                order,
+                self.cart_id,
+                ttl=self.reservation_ttl,
+                is_random=is_random
+        ):
+            self._add_reservation(reservation)
+        self._persist()
+
+    @_borrowing
+    def remove_product_items(
+            self,
+            product_name: str,
+            quantity: int
+    ):
+        """
+        Remove N items of a given product from the cart and
+        return them to the store, the latest added first
+
+        Parameters
+        ----------
+        product_name
+            the name of the product to be removed
+        quantity
+            number of the product items to be removed
+
+        Raises
+        ------
+        InvalidValue
+            If the quantity is non-positive or more than
+            the quantity of the product in the cart
+
+        """
+
+        if quantity <= 0:
+            raise InvalidValue(
+                "Quantity request must be positive."
+            )
+
+        self._load_products()
+        product = next(
+            (
+                product for product in self._products.values()
+                if product.name == product_name
             ),
-            "total_price": self.total_price(
-                tax_rate, required_purchase_total, global_rate
+            None
+        )
+        in_cart = 0 if product is None else self.quantities[product.id]
+        if in_cart < quantity:
+            raise InvalidValue(
+                f"Only {in_cart} {product_name} in the cart, "
+                f"but {quantity} is requested to be removed."
+            )
+
+        reserved = self._reserved.get(product.id, {})
+        reservations = self._load_reservations(reserved)
+
+        remaining = quantity
+        for reservation_id in reversed(list(reserved)):
+            if remaining == 0:
+                break
+
+            removed = min(remaining, reserved[reservation_id])
+            if reservation_id in reservations:
+                release(self.store, reservations[reservation_id], removed, commit=False)
+
+            reserved[reservation_id] -= removed
+            if reserved[reservation_id] == 0:
+                del reserved[reservation_id]
+            remaining -= removed
+
+        self.store.commit()
+
+        # the remainder are unreserved items
+        for _ in range(remaining):
+            self._unreserved_items.remove(
+                next(
+                    item for item in reversed(self._unreserved_items)
+                    if item.product_id == product.id
+                )
             )
+
+        self._update(product, -quantity)
+        self._persist()
+
+    def restore(
+            self,
+            lines: Iterable[Tuple[Product, int]],
+            reserved: Dict[int, Dict[int, int]],
+            unreserved_items: Iterable[Item] = ()
+    ):
+        """
+        Put back the content of a parked or persisted cart into
+        this empty cart, without reserving its units again, and
+        compute its running totals with the current catalog
+
+        Parameters
+        ----------
+        lines
+            (product, quantity) of each product in the cart
+        reserved
+            reserved quantities by reservation id, by product id
+        unreserved_items
+            items in the cart which are not reserved. Default = ()
+
+        Raises
+        ------
+        InvalidValue
+            If the cart is not empty
+
+        """
+        if self.quantities:
+            raise InvalidValue(
+                f"Cart {self.cart_id} must be empty to be restored."
+            )
+
+        self._reserved = {
+            product_id: dict(quantities) for product_id, quantities in reserved.items()
+        }
+        self._unreserved_items = list(unreserved_items)
+        for product, quantity in lines:
+            self._update(product, quantity)
+
+    def _add_reservation(
+            self,
+            reservation: Reservation
+    ):
+        """
+        Hold the units of a reservation in the cart
+        """
+        product = reservation.product
+        self._reserved.setdefault(
+            product.id, {}
+        )[reservation.id] = reservation.quantity
+
+        self._update(product, reservation.quantity)
+
+    def _plan(
+            self,
+            product_ids
+    ) -> PricingPlan:
+        """
+        Pricing plan of the store in the pricing mode of the cart,
+        covering the given products
+        """
+        return pricing_plan(self.store, self._in_cents, product_ids)
+
+    def _load_reservations(
+            self,
+            reserved: Dict[int, int]
+    ) -> Dict[int, Reservation]:
+        """
+        Reservations of the cart which are still in the store,
+        by id, loaded in one query
+        """
+        if not reserved:
+            return {}
+
+        return {
+            reservation.id: reservation
+            for reservation in self.store.query(
+                Reservation
+            ).filter(
+                Reservation.id.in_(list(reserved))
+            )
+        }
+
+    def _all_reserved(self) -> Dict[int, int]:
+        """
+        Reserved quantities of all the products by reservation id
+        """
+        return {
+            reservation_id: quantity
+            for reserved in self._reserved.values()
+            for reservation_id, quantity in reserved.items()
         }
+
+    @_borrowing
+    def empty(self):
+        """
+        Remove all the items from the cart and return
+        them to the store
+
+        """
+
+        for reservation in self._load_reservations(self._all_reserved()).values():
+            release(self.store, reservation, commit=False)
+        self.store.commit()
+
+        self._clear()
+
+    @_borrowing
+    def checkout(self):
+        """
+        Check out all the items in the cart, i.e. they are
+        no longer available in the store, and empty the cart
+
+        Raises
+        ------
+        ReservationExpired
+            If any reservation of the cart has expired and been
+            released, in which case nothing is checked out
+
+        """
+
+        reserved = self._all_reserved()
+        reservations = self._load_reservations(reserved)
+        if len(reservations) < len(reserved):
+            raise ReservationExpired(
+                "The reservation has already been released."
+            )
+
+        try:
+            for reservation in reservations.values():
+                confirm(self.store, reservation, commit=False)
+        except ReservationExpired:
+            self.store.rollback()
+            raise
+        self.store.commit()
+
+        self._clear()
+
+    def _clear(self):
+        """
+        Forget all the items in the cart
+        """
+        self._reserved = {}
+        self._unreserved_items = []
+        super()._clear()
+
+    @property
+    @_borrowing
+    def reservations(self) -> List[Reservation]:
+        """
+        Reservations holding the items in the cart
+
+        """
+
+        return sorted(
+            self._load_reservations(self._all_reserved()).values(),
+            key=lambda reservation: reservation.id
+        )
+
+    @property
+    @_borrowing
+    def items(self) -> List[Item]:
+        """
+        Items in the cart, loaded from the store. Products which
+        are not serial-tracked have no items
+
+        """
+
+        reserved = self._all_reserved()
+        if not reserved:
+            return list(self._unreserved_items)
+
+        return list(self._unreserved_items) + self.store.query(
+            Item
+        ).options(
+            joinedload(Item.product).joinedload(Product.discount_offer)
+        ).filter(
+            Item.reservation_id.in_(list(reserved))
+        ).order_by(
+            Item.id
+        ).all()
+
+    @property
+    def reserved(self) -> Dict[int, Dict[int, int]]:
+        """
+        Reserved quantities by reservation id, by product id,
+        as held by the cart, without loading the reservations
+
+        """
+
+        return {
+            product_id: dict(quantities) for product_id, quantities in self._reserved.items()
+        }
+
+    @property
+    def unreserved_item_ids(self) -> List[int]:
+        """
+        Ids of the items in the cart which are not reserved,
+        in ascending order
+
+        """
+
+        return sorted(item.id for item in self._unreserved_items)
+
+    def _load_products(self):
+        """
+        Load the expired products of the cart, e.g. after a commit,
+        and those of the session of another thread, together with
+        their offers in one query rather than one query per product
+        on access
+        """
+        store = self.store
+        expired = [
+            product_id for product_id, product in self._products.items()
+            if inspect(product).expired_attributes or inspect(product).session is not store
+        ]
+        if expired:
+            for product in store.query(
+                    Product
+            ).options(
+                joinedload(Product.discount_offer)
+            ).filter(
+                Product.id.in_(expired)
+            ):
+                self._products[product.id] = product
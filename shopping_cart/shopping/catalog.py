@@ -0,0 +1,293 @@
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from shopping_cart.data_model.catalog import catalog_version, catalog_version_column
+from shopping_cart.data_model.product import DiscountOffer, Product
+from shopping_cart.data_model.promotion import Promotion
+from shopping_cart.exc import InstanceNotFound
+from shopping_cart.shopping.pricing import PriceBreakdown, validate_rates
+from shopping_cart.shopping.rules import PricingPlan, PromotionRow, Threshold, build_plan
+
+
+class CatalogProduct:
+    """
+    A product of a catalog snapshot
+
+    Attributes
+    ----------
+    id
+        id of the product
+    name
+        name of the product
+    unit_price
+        marked price of a single item
+    unit_price_cents
+        marked price of a single item in cents
+    required_quantity
+        required quantity of the discount offer, None if the
+        product has no offer
+    percentage
+        discount percentage of the discount offer
+
+    """
+    __slots__ = (
+        "id", "name", "unit_price", "unit_price_cents", "required_quantity", "percentage"
+    )
+
+    def __init__(
+            self,
+            id: int,
+            name: str,
+            unit_price: float,
+            unit_price_cents: int,
+            required_quantity: Optional[int] = None,
+            percentage: Optional[float] = None
+    ):
+        set_slot = object.__setattr__
+        set_slot(self, "id", id)
+        set_slot(self, "name", name)
+        set_slot(self, "unit_price", unit_price)
+        set_slot(self, "unit_price_cents", unit_price_cents)
+        set_slot(self, "required_quantity", required_quantity)
+        set_slot(self, "percentage", percentage)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(
+            f"A catalog product is immutable, {key} cannot be set."
+        )
+
+    def __reduce__(self):
+        return CatalogProduct, self.as_tuple()
+
+    def as_tuple(self) -> tuple:
+        """
+        (id, name, unit price, unit price in cents, offer
+        required quantity, offer percentage) of the product
+        """
+        return (
+            self.id,
+            self.name,
+            self.unit_price,
+            self.unit_price_cents,
+            self.required_quantity,
+            self.percentage
+        )
+
+
+class CatalogSnapshot:
+    """
+    An immutable snapshot of the catalog of a store, i.e. the
+    product prices, their discount offers and the promotions,
+    at a catalog version
+
+    A snapshot prices carts without a store session, e.g. in
+    worker processes, and pickles as plain tuples. The pricing
+    plans are compiled on first use and are not pickled.
+
+    Attributes
+    ----------
+    version
+        catalog version of the store when the snapshot was taken
+    promotions
+        (id, kind, product id, JSON parameters) of each promotion
+
+    """
+    __slots__ = ("version", "promotions", "_products", "_plans")
+
+    def __init__(
+            self,
+            version: int,
+            products: Iterable[CatalogProduct],
+            promotions: Iterable[PromotionRow] = ()
+    ):
+        set_slot = object.__setattr__
+        set_slot(self, "version", version)
+        set_slot(self, "promotions", tuple(tuple(promotion) for promotion in promotions))
+        set_slot(self, "_products", {product.id: product for product in products})
+        set_slot(self, "_plans", {})
+
+    def __setattr__(self, key, value):
+        raise AttributeError(
+            f"A catalog snapshot is immutable, {key} cannot be set."
+        )
+
+    def __reduce__(self):
+        return CatalogSnapshot, (
+            self.version, tuple(self._products.values()), self.promotions
+        )
+
+    @classmethod
+    def load(
+            cls,
+            session: Session
+    ) -> "CatalogSnapshot":
+        """
+        Take a snapshot of the catalog of a store, with one query of
+        the products, their offers and the catalog version, and one
+        of the promotions
+
+        Parameters
+        ----------
+        session
+            a store database
+
+        Returns
+        -------
+            the snapshot
+
+        """
+
+        products = []
+        loaded_version = None
+        for *product, version_value in session.query(
+                Product.id,
+                Product.name,
+                Product.unit_price,
+                Product.unit_price_cents,
+                DiscountOffer.required_quantity,
+                DiscountOffer.percentage,
+                catalog_version_column()
+        ).outerjoin(
+            Product.discount_offer
+        ):
+            products.append(CatalogProduct(*product))
+            loaded_version = int(version_value or 0)
+
+        if loaded_version is None:
+            # no products to read the version along with
+            loaded_version = catalog_version(session)
+
+        promotions = session.query(
+            Promotion.id,
+            Promotion.kind,
+            Promotion.product_id,
+            Promotion.parameters
+        ).order_by(
+            Promotion.id
+        ).all()
+
+        return cls(loaded_version, products, promotions)
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self._products
+
+    def product(
+            self,
+            product_id: int
+    ) -> CatalogProduct:
+        """
+        A product of the snapshot
+
+        Raises
+        ------
+        InstanceNotFound
+            If the product is not in the snapshot
+
+        """
+        try:
+            return self._products[product_id]
+        except KeyError:
+            raise InstanceNotFound(
+                f"Product {product_id} is not in the catalog version {self.version}."
+            )
+
+    def is_current(
+            self,
+            session: Session
+    ) -> bool:
+        """
+        Whether the catalog of the store is still at the
+        version of the snapshot
+        """
+        return catalog_version(session) == self.version
+
+    def plan(
+            self,
+            in_cents: bool = False
+    ) -> PricingPlan:
+        """
+        Pricing plan of the snapshot, compiled on first use
+
+        Parameters
+        ----------
+        in_cents
+            If True, the plan for the cents pricing mode. Default = False
+
+        """
+        if in_cents not in self._plans:
+            self._plans[in_cents] = build_plan(
+                (
+                    (
+                        product.id,
+                        product.unit_price,
+                        product.unit_price_cents,
+                        product.required_quantity,
+                        product.percentage
+                    )
+                    for product in self._products.values()
+                ),
+                self.promotions,
+                in_cents,
+                self.version
+            )
+
+        return self._plans[in_cents]
+
+    def price(
+            self,
+            quantities: Dict[int, int],
+            tax_rate: float = 0,
+            required_purchase_total: Optional[float] = None,
+            global_rate: Optional[float] = None,
+            in_cents: bool = False
+    ) -> PriceBreakdown:
+        """
+        Price a cart, given as the quantity of each product
+        by product id, without a store
+
+        Parameters
+        ----------
+        quantities
+            quantity of each product by product id
+        tax_rate
+            tax rate (in percentage) of the shopping cart
+        required_purchase_total
+            required total cost of the purchase to get the global discount
+        global_rate
+            global discount rate
+        in_cents
+            If True, price in integer cents. Default = False
+
+        Returns
+        -------
+            the price breakdown
+
+        Raises
+        ------
+        InstanceNotFound
+            If a product of the cart is not in the snapshot
+
+        """
+
+        validate_rates(tax_rate, required_purchase_total, global_rate)
+
+        plan = self.plan(in_cents)
+        if not plan.covers(quantities):
+            missing = sorted(set(quantities) - set(self._products))
+            raise InstanceNotFound(
+                f"Product {', '.join(map(str, missing))} is not in the "
+                f"catalog version {self.version}."
+            )
+
+        cart_rules = ()
+        if required_purchase_total is not None:
+            cart_rules = (
+                Threshold(required_purchase_total, global_rate).compile_cart(in_cents),
+            )
+
+        return plan.price(quantities, tax_rate, cart_rules)
+
@@ -0,0 +1,459 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from shopping_cart.exc import InstanceNotFound, InvalidValue
+from shopping_cart.shopping.catalog import CatalogProduct, CatalogSnapshot
+from shopping_cart.shopping.pricing import PriceBreakdown, validate_rates
+from shopping_cart.shopping.rules import PricingPlan, Threshold, build_plan
+
+# leading bytes of a catalog file and version of its format
+MAGIC = b"SCCATLG\x00"
+FORMAT_VERSION = 1
+
+# magic, format version, number of products, catalog version, length
+# of the names, length of the promotions, CRC-32 of the file after
+# the header
+_HEADER = struct.Struct("<8sIIQQQI4x")
+
+# fixed-width arrays of the products, in ascending product id order,
+# of 8 byte signed integers (q), unsigned integers (Q) or floats (d)
+_ARRAYS = (
+    ("ids", "q"),
+    ("unit_prices", "d"),
+    ("unit_prices_cents", "q"),
+    ("required_quantities", "q"),
+    ("percentages", "d"),
+    # offsets of the names in the names section, one more than products
+    ("name_offsets", "Q"),
+    # positions of the products in ascending name order
+    ("name_order", "Q"),
+)
+
+
+def encode_catalog(
+        snapshot: CatalogSnapshot
+) -> bytes:
+    """
+    Encode a catalog snapshot in the binary catalog format,
+    which MappedCatalog reads without parsing
+
+    Parameters
+    ----------
+    snapshot
+        the catalog snapshot
+
+    Returns
+    -------
+        the encoded catalog
+
+    """
+
+    products = sorted(snapshot._products.values(), key=lambda product: product.id)
+    names = [product.name.encode() for product in products]
+
+    name_offsets = [0]
+    for name in names:
+        name_offsets.append(name_offsets[-1] + len(name))
+
+    n = len(products)
+    arrays = {
+        "ids": [product.id for product in products],
+        "unit_prices": [product.unit_price for product in products],
+        "unit_prices_cents": [product.unit_price_cents for product in products],
+        "required_quantities": [product.required_quantity or 0 for product in products],
+        "percentages": [product.percentage or 0.0 for product in products],
+        "name_offsets": name_offsets,
+        "name_order": sorted(range(n), key=lambda i: names[i]),
+    }
+    body = b"".join(
+        struct.pack(f"<{len(arrays[name])}{code}", *arrays[name])
+        for name, code in _ARRAYS
+    )
+    names_section = b"".join(names)
+    promotions = json.dumps([list(promotion) for promotion in snapshot.promotions]).encode()
+    payload = body + names_section + promotions
+
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        n,
+        snapshot.version,
+        len(names_section),
+        len(promotions),
+        zlib.crc32(payload)
+    )
+
+    return header + payload
+
+
+def write_catalog_file(
+        snapshot: CatalogSnapshot,
+        path
+):
+    """
+    Write a catalog snapshot to a binary catalog file
+
+    The file is written next to the path and moved in place, so
+    workers mapping the previous file keep reading it intact
+
+    Parameters
+    ----------
+    snapshot
+        the catalog snapshot
+    path
+        filepath of the catalog file
+
+    """
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(encode_catalog(snapshot))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def build_catalog_file(
+        store: Session,
+        path
+):
+    """
+    Compile the catalog of a store into a binary catalog file. A
+    catalog configuration yaml is compiled by making a store of it
+    first, e.g. with make_new_store
+
+    Parameters
+    ----------
+    store
+        a store database
+    path
+        filepath of the catalog file
+
+    """
+    write_catalog_file(CatalogSnapshot.load(store), path)
+
+
+class MappedCatalog:
+    """
+    A catalog snapshot memory-mapped from a binary catalog file
+
+    Opening a catalog reads the header, maps the file and checks its
+    checksum; the products are read from the mapped arrays on use, so
+    a pricing worker starts in about the same time whatever the size
+    of the catalog. A mapped catalog prices carts as a CatalogSnapshot,
+    e.g. cart.price(..., catalog=mapped), compiling the pricing plan
+    of the products of each cart.
+
+    Attributes
+    ----------
+    version
+        catalog version of the store the file was built from
+
+    """
+
+    def __init__(
+            self,
+            path,
+            verify: bool = True
+    ):
+        """
+
+        Parameters
+        ----------
+        path
+            filepath of the catalog file
+        verify
+            If True, check the CRC-32 of the file. Default = True
+
+        Raises
+        ------
+        InvalidValue
+            If the file is not a catalog file, of an unknown format
+            version, or its checksum does not match
+
+        """
+
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._open(self._map, verify)
+        except Exception:
+            self._map.close()
+            raise
+
+    def _open(
+            self,
+            buffer,
+            verify: bool
+    ):
+        """
+        Check the header and the checksum of an encoded catalog,
+        then view its sections in place
+        """
+        if len(buffer) < _HEADER.size or buffer[:len(MAGIC)] != MAGIC:
+            raise InvalidValue(f"{self.path} is not a catalog file.")
+
+        (
+            _, version, n, catalog_version, names_length, promotions_length, checksum
+        ) = _HEADER.unpack_from(buffer)
+        if version != FORMAT_VERSION:
+            raise InvalidValue(
+                f"Catalog file format version {version} is not supported. "
+                f"Version {FORMAT_VERSION} is expected."
+            )
+
+        arrays_length = 8 * (len(_ARRAYS) * n + 1)
+        size = _HEADER.size + arrays_length + names_length + promotions_length
+        if size != len(buffer):
+            raise InvalidValue(f"Catalog file {self.path} is corrupted.")
+
+        if verify:
+            with memoryview(buffer) as view:
+                if zlib.crc32(view[_HEADER.size:]) != checksum:
+                    raise InvalidValue(f"Catalog file {self.path} is corrupted.")
+
+        view = memoryview(buffer)
+        offset = _HEADER.size
+        self._arrays = {}
+        for name, code in _ARRAYS:
+            length = 8 * (n + 1 if name == "name_offsets" else n)
+            self._arrays[name] = view[offset:offset + length].cast(code)
+            offset += length
+
+        self._names = view[offset:offset + names_length]
+        self._promotions_bytes = view[offset + names_length:size]
+
+        self.version = catalog_version
+        self._size = n
+        self._promotions: Optional[List[tuple]] = None
+
+    def __enter__(self) -> "MappedCatalog":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Unmap the catalog file
+        """
+        for array in self._arrays.values():
+            array.release()
+        self._names.release()
+        self._promotions_bytes.release()
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, product_id: int) -> bool:
+        return self._position(product_id) is not None
+
+    @property
+    def promotions(self) -> List[tuple]:
+        """
+        (id, kind, product id, JSON parameters) of each promotion,
+        parsed on first use
+        """
+        if self._promotions is None:
+            self._promotions = [
+                tuple(promotion) for promotion in json.loads(bytes(self._promotions_bytes))
+            ]
+
+        return self._promotions
+
+    def _position(
+            self,
+            product_id: int
+    ) -> Optional[int]:
+        """
+        Position of a product in the arrays, by binary search
+        """
+        ids = self._arrays["ids"]
+        position = bisect_left(ids, product_id)
+        if position < self._size and ids[position] == product_id:
+            return position
+
+        return None
+
+    def _positions(
+            self,
+            product_ids
+    ) -> Dict[int, int]:
+        """
+        Positions of products in the arrays by product id
+
+        Raises
+        ------
+        InstanceNotFound
+            If a product is not in the catalog
+
+        """
+        positions = {product_id: self._position(product_id) for product_id in product_ids}
+        missing = sorted(
+            product_id for product_id, position in positions.items() if position is None
+        )
+        if missing:
+            raise InstanceNotFound(
+                f"Product {', '.join(map(str, missing))} is not in the "
+                f"catalog version {self.version}."
+            )
+
+        return positions
+
+    def _name(
+            self,
+            position: int
+    ) -> str:
+        offsets = self._arrays["name_offsets"]
+        return bytes(self._names[offsets[position]:offsets[position + 1]]).decode()
+
+    def _row(
+            self,
+            position: int
+    ) -> tuple:
+        """
+        (id, unit price, unit price in cents, offer required
+        quantity, offer percentage) of a product
+        """
+        arrays = self._arrays
+        required_quantity = arrays["required_quantities"][position]
+        return (
+            arrays["ids"][position],
+            arrays["unit_prices"][position],
+            arrays["unit_prices_cents"][position],
+            required_quantity or None,
+            arrays["percentages"][position] if required_quantity else None
+        )
+
+    def product(
+            self,
+            product_id: int
+    ) -> CatalogProduct:
+        """
+        A product of the catalog
+
+        Raises
+        ------
+        InstanceNotFound
+            If the product is not in the catalog
+
+        """
+        position = self._position(product_id)
+        if position is None:
+            raise InstanceNotFound(
+                f"Product {product_id} is not in the catalog version {self.version}."
+            )
+
+        product_id, unit_price, unit_price_cents, required_quantity, percentage = \
+            self._row(position)
+        return CatalogProduct(
+            product_id,
+            self._name(position),
+            unit_price,
+            unit_price_cents,
+            required_quantity,
+            percentage
+        )
+
+    def product_id(
+            self,
+            name: str
+    ) -> int:
+        """
+        Id of a product by name, by binary search of the name index
+
+        Raises
+        ------
+        InstanceNotFound
+            If the product is not in the catalog
+
+        """
+        key = name.encode()
+        order = self._arrays["name_order"]
+        offsets = self._arrays["name_offsets"]
+
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            position = order[middle]
+            if self._names[offsets[position]:offsets[position + 1]].tobytes() < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self._size and self._name(order[low]) == name:
+            return self._arrays["ids"][order[low]]
+
+        raise InstanceNotFound(f"Product {name} is not in the catalog version {self.version}.")
+
+    def plan(
+            self,
+            product_ids,
+            in_cents: bool = False
+    ) -> PricingPlan:
+        """
+        Pricing plan of some products of the catalog
+
+        Parameters
+        ----------
+        product_ids
+            ids of the products
+        in_cents
+            If True, the plan for the cents pricing mode. Default = False
+
+        Raises
+        ------
+        InstanceNotFound
+            If a product is not in the catalog
+
+        """
+        positions = self._positions(product_ids)
+
+        return build_plan(
+            (self._row(position) for position in positions.values()),
+            (
+                promotion for promotion in self.promotions
+                if promotion[2] is None or promotion[2] in positions
+            ),
+            in_cents,
+            self.version
+        )
+
+    def price(
+            self,
+            quantities: Dict[int, int],
+            tax_rate: float = 0,
+            required_purchase_total: Optional[float] = None,
+            global_rate: Optional[float] = None,
+            in_cents: bool = False
+    ) -> PriceBreakdown:
+        """
+        Price a cart, given as the quantity of each product
+        by product id, see CatalogSnapshot.price
+
+        Raises
+        ------
+        InstanceNotFound
+            If a product of the cart is not in the catalog
+
+        """
+
+        validate_rates(tax_rate, required_purchase_total, global_rate)
+
+        cart_rules = ()
+        if required_purchase_total is not None:
+            cart_rules = (
+                Threshold(required_purchase_total, global_rate).compile_cart(in_cents),
+            )
+
+        return self.plan(quantities, in_cents).price(quantities, tax_rate, cart_rules)
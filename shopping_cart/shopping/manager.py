@@ -0,0 +1,317 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from threading import RLock
+from typing import Callable, Optional
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from shopping_cart.exc import InstanceNotFound, InvalidValue
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.quote_cache import QuoteCache
+from shopping_cart.store.reservation import DEFAULT_TTL
+from shopping_cart.store.write_behind import CartWriter
+
+logger = logging.getLogger(__name__)
+
+
+class CartManager:
+    """
+    A registry of the live shopping carts of a store, which issues
+    unique cart ids and looks the carts up by id
+
+    The carts are kept in least recently used order. A cart idle
+    for longer than the idle time to live is evicted, and so is the
+    least recently used cart while there are more carts than the
+    maximum number or their footprint is over the memory budget.
+    The budget is soft: a cart is measured when it is made or looked
+    up, so carts growing between lookups may take the carts over the
+    budget until the next lookup evicts them.
+    An evicted cart is emptied, returning its reserved units to the
+    store, unless the manager is told to leave the reservations to
+    expire.
+
+    Attributes
+    ----------
+    store
+        the store database
+    max_carts
+        maximum number of carts kept, None for no maximum
+    idle_ttl
+        seconds a cart is kept for since it was last looked up,
+        None to keep it until evicted for room
+    memory_budget
+        maximum total footprint of the carts in bytes (see
+        ShoppingCart.footprint) as last measured, None for no budget
+    evictions
+        number of carts evicted
+
+    """
+
+    def __init__(
+            self,
+            store: Session,
+            max_carts: Optional[int] = None,
+            idle_ttl: Optional[float] = None,
+            memory_budget: Optional[int] = None,
+            reservation_ttl: timedelta = DEFAULT_TTL,
+            quote_cache: Optional[QuoteCache] = None,
+            writer: Optional[CartWriter] = None,
+            release_on_evict: bool = True,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+
+        Parameters
+        ----------
+        store
+            the store database
+        max_carts
+            maximum number of carts kept. Default = None
+        idle_ttl
+            seconds a cart is kept for since it was last looked
+            up. Default = None
+        memory_budget
+            maximum total footprint of the carts in bytes. Default = None
+        reservation_ttl
+            how long the units added to the carts are reserved for.
+            Default = 15 minutes
+        quote_cache
+            cache of the price breakdowns shared by the carts.
+            Default = None
+        writer
+            writer persisting the changes of the carts. Default = None
+        release_on_evict
+            If True, an evicted cart returns its reserved units to
+            the store, otherwise they are released when they expire.
+            Default = True
+        clock
+            clock of the idle time to live. Default = time.monotonic
+
+        Raises
+        ------
+        InvalidValue
+            If a bound is not positive
+
+        """
+
+        for name, bound in (
+                ("Maximum number of carts", max_carts),
+                ("Idle time to live", idle_ttl),
+                ("Memory budget", memory_budget)
+        ):
+            if bound is not None and bound <= 0:
+                raise InvalidValue(f"{name} must be positive. {bound} is given.")
+
+        self.store = store
+        self.max_carts = max_carts
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.reservation_ttl = reservation_ttl
+        self.quote_cache = quote_cache
+        self.writer = writer
+        self.release_on_evict = release_on_evict
+        self._clock = clock
+
+        # (last used, footprint, cart) by cart id, least recently used first
+        self._carts: OrderedDict = OrderedDict()
+        self._memory_usage = 0
+        self._lock = RLock()
+
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._carts)
+
+    def __contains__(self, cart_id: str) -> bool:
+        return cart_id in self._carts
+
+    @property
+    def memory_usage(self) -> int:
+        """
+        Total footprint of the carts in bytes, as measured
+        when each cart was last looked up
+        """
+        return self._memory_usage
+
+    def create(self) -> ShoppingCart:
+        """
+        Make a new empty cart with a unique id, evicting
+        idle carts and carts over the bounds first
+
+        Returns
+        -------
+            the new cart
+
+        """
+        with self._lock:
+            self.evict_idle()
+
+            cart_id = str(uuid4())
+            while cart_id in self._carts:
+                cart_id = str(uuid4())
+
+            cart = ShoppingCart(
+                store=self.store,
+                cart_id=cart_id,
+                reservation_ttl=self.reservation_ttl,
+                quote_cache=self.quote_cache,
+                writer=self.writer
+            )
+            self._track(cart)
+            self._evict_over_bounds(keep=cart_id)
+
+            return cart
+
+    def get(
+            self,
+            cart_id: str
+    ) -> ShoppingCart:
+        """
+        Look up a live cart by id, marking it as used
+
+        Parameters
+        ----------
+        cart_id
+            identifier of the cart
+
+        Returns
+        -------
+            the cart
+
+        Raises
+        ------
+        InstanceNotFound
+            If there is no such cart, or it has been evicted
+
+        """
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is not None and self._is_idle(entry[0]):
+                self._evict(cart_id)
+                entry = None
+
+            if entry is None:
+                raise InstanceNotFound(f"Cart {cart_id} is not found.")
+
+            cart = entry[2]
+            self._track(cart)
+            self._evict_over_bounds(keep=cart_id)
+
+            return cart
+
+    def discard(
+            self,
+            cart_id: str
+    ) -> Optional[ShoppingCart]:
+        """
+        Stop tracking a cart, e.g. once it is checked out, without
+        touching its reservations
+
+        Parameters
+        ----------
+        cart_id
+            identifier of the cart
+
+        Returns
+        -------
+            the cart, None if there is no such cart
+
+        """
+        with self._lock:
+            entry = self._carts.pop(cart_id, None)
+            if entry is None:
+                return None
+
+            self._memory_usage -= entry[1]
+            return entry[2]
+
+    def evict_idle(self) -> int:
+        """
+        Evict the carts idle for longer than the idle time to live
+
+        Returns
+        -------
+            number of carts evicted
+
+        """
+        if self.idle_ttl is None:
+            return 0
+
+        evicted = 0
+        with self._lock:
+            # the carts are in least recently used order
+            while self._carts:
+                cart_id, (last_used, _, _) = next(iter(self._carts.items()))
+                if not self._is_idle(last_used):
+                    break
+
+                self._evict(cart_id)
+                evicted += 1
+
+        return evicted
+
+    def stats(self) -> dict:
+        """
+        Statistics of the manager in a dict
+        """
+        return dict(
+            carts=len(self._carts),
+            memory_usage=self._memory_usage,
+            evictions=self.evictions
+        )
+
+    def _is_idle(
+            self,
+            last_used: float
+    ) -> bool:
+        return self.idle_ttl is not None and self._clock() - last_used >= self.idle_ttl
+
+    def _track(
+            self,
+            cart: ShoppingCart
+    ):
+        """
+        Mark a cart as the most recently used and measure it again
+        """
+        entry = self._carts.pop(cart.cart_id, None)
+        if entry is not None:
+            self._memory_usage -= entry[1]
+
+        size = cart.footprint()
+        self._carts[cart.cart_id] = (self._clock(), size, cart)
+        self._memory_usage += size
+
+    def _evict_over_bounds(
+            self,
+            keep: str
+    ):
+        """
+        Evict the least recently used carts, other than the given
+        one, while the carts are over the maximum or the budget
+        """
+        while len(self._carts) > 1 and (
+                (self.max_carts is not None and len(self._carts) > self.max_carts)
+                or (self.memory_budget is not None and self._memory_usage > self.memory_budget)
+        ):
+            cart_id = next(iter(self._carts))
+            if cart_id == keep:
+                break
+
+            self._evict(cart_id)
+
+    def _evict(
+            self,
+            cart_id: str
+    ):
+        cart = self.discard(cart_id)
+        self.evictions += 1
+
+        if self.release_on_evict and cart.reserved:
+            try:
+                cart.empty()
+            except Exception:
+                logger.exception(f"Failed to release the reservations of cart {cart_id}")
+                cart.store.rollback()
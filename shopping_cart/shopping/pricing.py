@@ -0,0 +1,486 @@
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from shopping_cart.data_model.setting import StoreSetting
+from shopping_cart.exc import InvalidValue
+from shopping_cart.money import to_basis_points, to_cents
+
+# Pricing modes of a store, i.e. prices in floats rounded with python's
+# round, or in integer minor units (cents) with a single rounding policy
+FLOAT_PRICING = "float"
+CENTS_PRICING = "cents"
+PRICING_MODES = (FLOAT_PRICING, CENTS_PRICING)
+
+# key of the pricing mode in the store settings
+PRICING_MODE_KEY = "pricing_mode"
+
+# Rates are applied in basis points, i.e. hundredths of a percent
+BASIS_POINTS = 10000
+
+# The tax is rounded off to the nearest 10 cents, i.e. to 1 decimal place
+TAX_ROUNDING_CENTS = 10
+
+# A priced line of a cart, i.e. (unit price, quantity, required quantity
+# of the product offer, offer discount percentage), where the offer
+# fields are None if the product has no offer
+Line = Tuple[float, int, Optional[int], Optional[float]]
+
+
+class PriceBreakdown:
+    """
+    Price breakdown of a shopping cart
+
+    Attributes
+    ----------
+    total_marked_price
+        total marked price before discount
+    product_discount
+        total discount of the individual product offers
+    global_discount
+        discount on the total purchase
+    total_discount
+        total discount, rounded off to 2 decimal places
+    total_price_before_tax
+        total price after discount before tax
+    total_tax
+        total tax amount, rounded off to 1 decimal place
+    total_price
+        total price with discount subtracted and tax added,
+        rounded off to 2 decimal places
+
+    """
+
+    def __init__(
+            self,
+            total_marked_price: float,
+            product_discount: float,
+            global_discount: float,
+            total_discount: float,
+            total_price_before_tax: float,
+            total_tax: float,
+            total_price: float
+    ):
+        self.total_marked_price = total_marked_price
+        self.product_discount = product_discount
+        self.global_discount = global_discount
+        self.total_discount = total_discount
+        self.total_price_before_tax = total_price_before_tax
+        self.total_tax = total_tax
+        self.total_price = total_price
+
+    def in_units(self) -> "PriceBreakdown":
+        """
+        Price breakdown in major units of a breakdown in cents
+        """
+        return PriceBreakdown(
+            **{key: value / 100 for key, value in vars(self).items()}
+        )
+
+    def as_dict(self) -> dict:
+        """
+        Breakdown price in a dict including total discount,
+        total tax amount and total price
+        """
+        return {
+            "total_discount": self.total_discount,
+            "total_tax": self.total_tax,
+            "total_price": self.total_price
+        }
+
+
+def validate_rates(
+        tax_rate: float = 0,
+        required_purchase_total: Optional[float] = None,
+        global_rate: Optional[float] = None
+):
+    """
+    Check the tax and global discount parameters of a cart pricing
+
+    Raises
+    ------
+    InvalidValue
+        If the tax rate is negative, the required total purchase
+        is non-positive or the global discount rate is not
+        between 0 and 100
+
+    """
+
+    if tax_rate < 0:
+        raise InvalidValue(
+            f"Tax rate must be non-negative. {tax_rate} is given."
+        )
+
+    if required_purchase_total is not None:
+        if required_purchase_total <= 0:
+            raise InvalidValue(
+                f"The required total cost of the purchase for global discount must be positive. "
+                f"{required_purchase_total} is given instead."
+            )
+
+        if not 100 > global_rate > 0:
+            raise InvalidValue(
+                f"Global discount rate must be between 0 and 100. {global_rate} is given instead."
+            )
+
+
+def line_discount(
+        unit_price: float,
+        quantity: int,
+        required_quantity: Optional[int],
+        percentage: Optional[float]
+) -> float:
+    """
+    Discount of the offer of a product on a line of a cart
+
+    Parameters
+    ----------
+    unit_price
+        marked price of a single item
+    quantity
+        number of items
+    required_quantity
+        required quantity of the product offer, None if the
+        product has no offer
+    percentage
+        discount percentage of the product offer
+
+    Returns
+    -------
+        the discount amount
+
+    """
+    if required_quantity is None:
+        return 0
+
+    number_of_discounted_items = quantity // required_quantity
+    return unit_price * number_of_discounted_items * percentage / 100
+
+
+def price(
+        lines: Iterable[Line],
+        tax_rate: float = 0,
+        required_purchase_total: Optional[float] = None,
+        global_rate: Optional[float] = None
+) -> PriceBreakdown:
+    """
+    Price a cart in a single pass over its aggregated lines
+
+    Amounts are accumulated in the order of the lines, so lines
+    should be given in a canonical order, e.g. by product id, for
+    the same cart to always give exactly the same floats.
+
+    The marked price of a line is its unit price times its quantity.
+    Carts used to be priced by adding the unit price item by item,
+    which rounds differently, so a total discount or a total price
+    on a half cent may differ by a cent from those of the previous
+    versions, e.g. 7 x 9.05 with 10 % off gives a discount of 6.34
+    rather than 6.33. The cents pricing mode gives the exact amounts.
+
+    Parameters
+    ----------
+    lines
+        (unit price, quantity, offer required quantity, offer
+        percentage) of each product in the cart
+    tax_rate
+        tax rate (in percentage) of the shopping cart
+    required_purchase_total
+        required total cost of the purchase to get the global discount
+    global_rate
+        global discount rate
+
+    Returns
+    -------
+        the price breakdown
+
+    Raises
+    ------
+    InvalidValue
+        If the tax rate or the global discount parameters are invalid
+
+    """
+
+    validate_rates(tax_rate, required_purchase_total, global_rate)
+
+    total_marked_price = 0
+    product_discount = 0
+    for unit_price, quantity, required_quantity, percentage in lines:
+        total_marked_price += unit_price * quantity
+
+        if required_quantity is not None:
+            product_discount += line_discount(
+                unit_price, quantity, required_quantity, percentage
+            )
+
+    global_discount = 0
+    if required_purchase_total is not None:
+        global_discount = threshold_discount(
+            total_marked_price, product_discount, required_purchase_total, global_rate
+        )
+
+    return breakdown(total_marked_price, product_discount, global_discount, tax_rate)
+
+
+def threshold_discount(
+        total_marked_price: float,
+        product_discount: float,
+        required_purchase_total: float,
+        global_rate: float
+) -> float:
+    """
+    Global discount on the total after product discounts,
+    if it reaches the required total
+    """
+    price_after_product_discount = total_marked_price - product_discount
+    if price_after_product_discount >= required_purchase_total:
+        return price_after_product_discount * global_rate / 100
+
+    return 0
+
+
+def breakdown(
+        total_marked_price: float,
+        product_discount: float,
+        global_discount: float,
+        tax_rate: float
+) -> PriceBreakdown:
+    """
+    Price breakdown of a cart from its total marked price and
+    discounts, with the rounding of the float pricing
+
+    Parameters
+    ----------
+    total_marked_price
+        total marked price before discount
+    product_discount
+        total discount of the individual product offers
+    global_discount
+        discount on the total purchase
+    tax_rate
+        tax rate (in percentage) of the shopping cart
+
+    Returns
+    -------
+        the price breakdown
+
+    """
+
+    total_discount = round(product_discount + global_discount, 2)
+    total_price_before_tax = total_marked_price - total_discount
+    total_tax = round(total_price_before_tax * tax_rate / 100, 1)
+
+    return PriceBreakdown(
+        total_marked_price=total_marked_price,
+        product_discount=product_discount,
+        global_discount=global_discount,
+        total_discount=total_discount,
+        total_price_before_tax=total_price_before_tax,
+        total_tax=total_tax,
+        total_price=round(total_price_before_tax + total_tax, 2)
+    )
+
+
+def price_cents(
+        lines: Iterable[Line],
+        tax_rate: float = 0,
+        required_purchase_total: Optional[float] = None,
+        global_rate: Optional[float] = None
+) -> PriceBreakdown:
+    """
+    Price a cart in integer minor units (cents) in a single pass
+    over its aggregated lines
+
+    Rounding policy: all the amounts are exact integers in cents,
+    percentages are applied in integer basis points (hundredths of
+    a percent) and exactly two amounts are rounded, each once and
+    half up, i.e.
+
+    - the total discount, i.e. the product offers and the global
+      discount together, to the nearest cent
+    - the tax on the price after discount, to the nearest 10 cents
+
+    so a cart prices the same regardless of the order of its lines.
+
+    Parameters
+    ----------
+    lines
+        (unit price in cents, quantity, offer required quantity,
+        offer percentage in basis points) of each product in the cart
+    tax_rate
+        tax rate (in percentage) of the shopping cart
+    required_purchase_total
+        required total cost of the purchase to get the global discount
+    global_rate
+        global discount rate
+
+    Returns
+    -------
+        the price breakdown in cents
+
+    Raises
+    ------
+    InvalidValue
+        If the tax rate or the global discount parameters are invalid
+
+    """
+
+    validate_rates(tax_rate, required_purchase_total, global_rate)
+
+    # product discount in cents x basis points
+    total_marked_price = 0
+    product_discount = 0
+    for unit_price, quantity, required_quantity, basis_points in lines:
+        total_marked_price += unit_price * quantity
+
+        if required_quantity is not None:
+            product_discount += unit_price * (quantity // required_quantity) * basis_points
+
+    global_discount = 0
+    if required_purchase_total is not None:
+        global_discount = threshold_discount_cents(
+            total_marked_price,
+            product_discount,
+            to_cents(required_purchase_total),
+            to_basis_points(global_rate)
+        )
+
+    return breakdown_cents(total_marked_price, product_discount, global_discount, tax_rate)
+
+
+def threshold_discount_cents(
+        total_marked_price: int,
+        product_discount: int,
+        required_purchase_total: int,
+        basis_points: int
+) -> int:
+    """
+    Global discount on the total after product discounts, if it
+    reaches the required total, in cents x basis points squared
+
+    Parameters
+    ----------
+    total_marked_price
+        total marked price in cents
+    product_discount
+        total discount of the product offers, in cents x basis points
+    required_purchase_total
+        required total in cents
+    basis_points
+        global discount rate in basis points
+
+    """
+    price_after_product_discount = total_marked_price * BASIS_POINTS - product_discount
+    if price_after_product_discount >= required_purchase_total * BASIS_POINTS:
+        return price_after_product_discount * basis_points
+
+    return 0
+
+
+def breakdown_cents(
+        total_marked_price: int,
+        product_discount: int,
+        global_discount: int,
+        tax_rate: float
+) -> PriceBreakdown:
+    """
+    Price breakdown in cents of a cart from its total marked price
+    and discounts, with the rounding policy of price_cents
+
+    Parameters
+    ----------
+    total_marked_price
+        total marked price in cents
+    product_discount
+        total discount of the product offers, in cents x basis points
+    global_discount
+        discount on the total purchase, in cents x basis points squared
+    tax_rate
+        tax rate (in percentage) of the shopping cart
+
+    Returns
+    -------
+        the price breakdown in cents
+
+    """
+
+    total_discount = _round_half_up(
+        product_discount * BASIS_POINTS + global_discount, BASIS_POINTS ** 2
+    )
+    total_price_before_tax = total_marked_price - total_discount
+    total_tax = TAX_ROUNDING_CENTS * _round_half_up(
+        total_price_before_tax * to_basis_points(tax_rate),
+        BASIS_POINTS * TAX_ROUNDING_CENTS
+    )
+
+    return PriceBreakdown(
+        total_marked_price=total_marked_price,
+        product_discount=_round_half_up(product_discount, BASIS_POINTS),
+        global_discount=_round_half_up(global_discount, BASIS_POINTS ** 2),
+        total_discount=total_discount,
+        total_price_before_tax=total_price_before_tax,
+        total_tax=total_tax,
+        total_price=total_price_before_tax + total_tax
+    )
+
+
+def _round_half_up(
+        numerator: int,
+        denominator: int
+) -> int:
+    """
+    Non-negative integer ratio rounded off half up
+    """
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def get_pricing_mode(
+        session: Session
+) -> str:
+    """
+    Pricing mode of a store
+
+    Parameters
+    ----------
+    session
+        a store database
+
+    Returns
+    -------
+        the pricing mode, FLOAT_PRICING unless set otherwise
+
+    """
+    return StoreSetting.get(session, PRICING_MODE_KEY, FLOAT_PRICING)
+
+
+def set_pricing_mode(
+        session: Session,
+        mode: str,
+        commit: bool = True
+):
+    """
+    Select the pricing mode of a store, for the carts
+    made afterwards
+
+    Parameters
+    ----------
+    session
+        a store database
+    mode
+        FLOAT_PRICING or CENTS_PRICING
+    commit
+        If True, commit the pricing mode. Default = True
+
+    Raises
+    ------
+    InvalidValue
+        If the pricing mode is unknown
+
+    """
+    if mode not in PRICING_MODES:
+        raise InvalidValue(
+            f"Pricing mode must be one of {', '.join(PRICING_MODES)}. {mode} is given."
+        )
+
+    StoreSetting.set(session, PRICING_MODE_KEY, mode)
+    if commit:
+        session.commit()
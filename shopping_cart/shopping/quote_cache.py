@@ -0,0 +1,255 @@
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+from shopping_cart.exc import InvalidValue
+
+# default maximum number of quotes kept in a cache
+DEFAULT_MAX_SIZE = 10_000
+
+
+def quote_key(
+        quantities: Dict[int, int],
+        tax_rate: float,
+        required_purchase_total: Optional[float],
+        global_rate: Optional[float],
+        version: int,
+        in_cents: bool = False
+) -> bytes:
+    """
+    Canonical key of a price quote, the same for any cart with the
+    same quantity of each product, whatever the order the products
+    were added in
+
+    Parameters
+    ----------
+    quantities
+        quantity of each product by product id
+    tax_rate
+        tax rate (in percentage) of the shopping cart
+    required_purchase_total
+        required total cost of the purchase to get the global discount
+    global_rate
+        global discount rate
+    version
+        catalog version the cart is priced at
+    in_cents
+        If True, the cart is priced in integer cents. Default = False
+
+    Returns
+    -------
+        the digest of the quote
+
+    """
+
+    canonical = repr(
+        (
+            tuple(sorted((product_id, quantity) for product_id, quantity in quantities.items() if quantity)),
+            float(tax_rate),
+            None if required_purchase_total is None else float(required_purchase_total),
+            None if global_rate is None else float(global_rate),
+            version,
+            in_cents
+        )
+    )
+    return blake2b(canonical.encode(), digest_size=16).digest()
+
+
+class QuoteCache:
+    """
+    A bounded cache of price breakdowns, keyed by the content of
+    the cart and the catalog version, which evicts the least recently
+    used quotes and optionally expires them after a time to live
+
+    Quotes of an older catalog version are dropped as soon as a quote
+    of a newer version is looked up or added, so a change of a price,
+    an offer or a promotion invalidates the cache. A cache is meant for
+    the carts of a single store.
+
+    Attributes
+    ----------
+    max_size
+        maximum number of quotes kept
+    ttl
+        how long a quote is kept for in seconds, None to keep it
+        until evicted
+    hits
+        number of lookups which found a quote
+    misses
+        number of lookups which did not find a quote
+    evictions
+        number of quotes evicted to keep the cache bounded
+    expirations
+        number of quotes dropped past their time to live
+    invalidations
+        number of catalog changes which dropped the cache
+
+    """
+
+    def __init__(
+            self,
+            max_size: int = DEFAULT_MAX_SIZE,
+            ttl: Optional[float] = None,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+
+        Parameters
+        ----------
+        max_size
+            maximum number of quotes kept. Default = 10000
+        ttl
+            how long a quote is kept for in seconds. Default = None
+        clock
+            clock of the time to live. Default = time.monotonic
+
+        Raises
+        ------
+        InvalidValue
+            If the size or the time to live is not positive
+
+        """
+
+        if max_size <= 0:
+            raise InvalidValue(
+                f"Quote cache size must be positive. {max_size} is given."
+            )
+
+        if ttl is not None and ttl <= 0:
+            raise InvalidValue(
+                f"Quote time to live must be positive. {ttl} is given."
+            )
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+
+        # (expiry, breakdown) by key, least recently used first
+        self._quotes: OrderedDict = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    def _see_version(
+            self,
+            version: int
+    ):
+        """
+        Drop the quotes of an older catalog version
+        """
+        if self._version is None or version > self._version:
+            if self._quotes:
+                self._quotes.clear()
+                self.invalidations += 1
+            self._version = version
+
+    def get(
+            self,
+            key: bytes,
+            version: int
+    ) -> Optional[dict]:
+        """
+        Cached price breakdown of a quote
+
+        Parameters
+        ----------
+        key
+            key of the quote, see quote_key
+        version
+            catalog version the cart is priced at
+
+        Returns
+        -------
+            a copy of the breakdown, None if it is not cached
+
+        """
+        with self._lock:
+            self._see_version(version)
+
+            quote = self._quotes.get(key)
+            if quote is not None and quote[0] is not None and quote[0] <= self._clock():
+                del self._quotes[key]
+                self.expirations += 1
+                quote = None
+
+            if quote is None:
+                self.misses += 1
+                return None
+
+            self._quotes.move_to_end(key)
+            self.hits += 1
+            return dict(quote[1])
+
+    def put(
+            self,
+            key: bytes,
+            version: int,
+            breakdown: dict
+    ):
+        """
+        Cache the price breakdown of a quote, evicting the least
+        recently used quote if the cache is full
+
+        Parameters
+        ----------
+        key
+            key of the quote, see quote_key
+        version
+            catalog version the cart is priced at
+        breakdown
+            the price breakdown
+
+        """
+        with self._lock:
+            self._see_version(version)
+            if version < self._version:
+                # priced at a catalog version which has since changed
+                return
+
+            expiry = None if self.ttl is None else self._clock() + self.ttl
+            self._quotes[key] = (expiry, dict(breakdown))
+            self._quotes.move_to_end(key)
+
+            while len(self._quotes) > self.max_size:
+                self._quotes.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop all the quotes, keeping the statistics
+        """
+        with self._lock:
+            self._quotes.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of the lookups which found a quote, 0 before any lookup
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        """
+        Statistics of the cache in a dict
+        """
+        return dict(
+            size=len(self._quotes),
+            max_size=self.max_size,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hit_rate,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            invalidations=self.invalidations
+        )
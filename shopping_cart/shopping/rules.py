@@ -0,0 +1,723 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+from inspect import isabstract
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session
+
+from shopping_cart.data_model.base import StoreSession
+from shopping_cart.data_model.catalog import (
+    CATALOG_CLASSES, catalog_version, catalog_version_column, changes_catalog
+)
+from shopping_cart.data_model.product import DiscountOffer, Product
+from shopping_cart.data_model.promotion import Promotion
+from shopping_cart.exc import InvalidValue
+from shopping_cart.money import to_basis_points, to_cents
+from shopping_cart.shopping.pricing import (
+    BASIS_POINTS, PriceBreakdown, breakdown, breakdown_cents, threshold_discount,
+    threshold_discount_cents, validate_rates
+)
+
+logger = logging.getLogger(__name__)
+
+# Discount of a line of a cart by the quantity of the product
+LineRule = Callable[[int], float]
+
+# Discount of a whole cart by its total marked price and
+# the total discount of its lines
+CartRule = Callable[[float, float], float]
+
+# A product of a catalog, i.e. (id, unit price, unit price in cents,
+# offer required quantity, offer percentage), where the offer
+# fields are None if the product has no offer
+ProductRow = Tuple[int, float, int, Optional[int], Optional[float]]
+
+# A promotion of a catalog, i.e. (id, kind, product id, JSON parameters)
+PromotionRow = Tuple[int, str, Optional[int], str]
+
+# Rule types by the kind of promotion they interpret
+RULE_TYPES: Dict[str, Type["Rule"]] = {}
+
+# key of the compiled pricing plans in the info of a store session
+_PLANS_KEY = "pricing_plans"
+
+# key of the flag of the info of a store session set once the
+# catalog version of its plans is checked in its transaction
+_CHECKED_KEY = "pricing_plans_checked"
+
+
+def rule_type(
+        kind: str
+):
+    """
+    Register a rule type interpreting the promotions of a kind
+
+    Parameters
+    ----------
+    kind
+        the kind of the promotions, as stored in the store
+
+    """
+
+    def _register(cls):
+        if not issubclass(cls, (ProductRule, CartWideRule)):
+            raise TypeError(
+                f"Rule type {cls.__name__} of {kind} promotions must derive "
+                f"from ProductRule or CartWideRule."
+            )
+        if isabstract(cls):
+            raise TypeError(
+                f"Rule type {cls.__name__} of {kind} promotions does not implement "
+                f"{', '.join(sorted(cls.__abstractmethods__))}."
+            )
+
+        cls.kind = kind
+        RULE_TYPES[kind] = cls
+        return cls
+
+    return _register
+
+
+class Rule(ABC):
+    """
+    A promotion rule, made from the parameters of a promotion
+    and compiled into the pricing plan of a store
+
+    A rule applies either to the lines of a product or to the
+    whole cart, see ProductRule and CartWideRule. In the float
+    pricing mode the compiled rules give amounts in major units, in
+    the cents pricing mode line discounts are in cents x basis points
+    and cart discounts in cents x basis points squared, so they add
+    up exactly.
+    """
+    kind: str = None
+
+    @abstractmethod
+    def compile_line(
+            self,
+            unit_price: float,
+            in_cents: bool
+    ) -> Optional[LineRule]:
+        """
+        Line discount of the rule for a product of the given
+        unit price, None if the rule never gives a discount
+        """
+
+    @abstractmethod
+    def compile_cart(
+            self,
+            in_cents: bool
+    ) -> Optional[CartRule]:
+        """
+        Cart discount of the rule, None if the rule never
+        gives a discount
+        """
+
+
+class ProductRule(Rule):
+    """
+    A rule applying to the lines of a product
+    """
+
+    def compile_cart(
+            self,
+            in_cents: bool
+    ) -> Optional[CartRule]:
+        return None
+
+
+class CartWideRule(Rule):
+    """
+    A rule applying to the whole cart
+    """
+
+    def compile_line(
+            self,
+            unit_price: float,
+            in_cents: bool
+    ) -> Optional[LineRule]:
+        return None
+
+
+@rule_type("percent_off")
+class PercentOff(ProductRule):
+    """
+    "Buy N, Get Y % off for the next one", i.e. the
+    discount offer of a product
+    """
+
+    def __init__(
+            self,
+            required_quantity: int,
+            percentage: float
+    ):
+        if required_quantity <= 0:
+            raise InvalidValue(
+                "Required quantity must be a positive integer for promotion offer."
+            )
+        if not 100 >= percentage > 0:
+            raise InvalidValue(
+                "Discount percentage must be between 0 and 100, including 100 but not 0."
+            )
+
+        self.required_quantity = required_quantity
+        self.percentage = percentage
+
+    def compile_line(
+            self,
+            unit_price: float,
+            in_cents: bool
+    ) -> LineRule:
+        required_quantity = self.required_quantity
+
+        if in_cents:
+            basis_points = to_basis_points(self.percentage)
+            return lambda quantity: unit_price * (quantity // required_quantity) * basis_points
+
+        percentage = self.percentage
+        return lambda quantity: unit_price * (quantity // required_quantity) * percentage / 100
+
+
+@rule_type("multi_buy")
+class MultiBuy(ProductRule):
+    """
+    "N for a fixed price", e.g. 3 for 10.00
+    """
+
+    def __init__(
+            self,
+            quantity: int,
+            price: float
+    ):
+        if quantity <= 0 or price <= 0:
+            raise InvalidValue(
+                f"Multi-buy quantity and price must be positive. "
+                f"{quantity} for {price} is given."
+            )
+
+        self.quantity = quantity
+        self.price = price
+
+    def compile_line(
+            self,
+            unit_price: float,
+            in_cents: bool
+    ) -> Optional[LineRule]:
+        bundle_quantity = self.quantity
+
+        if in_cents:
+            saving = (bundle_quantity * unit_price - to_cents(self.price)) * BASIS_POINTS
+        else:
+            saving = bundle_quantity * unit_price - self.price
+
+        if saving <= 0:
+            return None
+
+        return lambda quantity: (quantity // bundle_quantity) * saving
+
+
+@rule_type("threshold")
+class Threshold(CartWideRule):
+    """
+    Global discount of the total after product discounts,
+    if it reaches a required total
+    """
+
+    def __init__(
+            self,
+            required_purchase_total: float,
+            rate: float
+    ):
+        validate_rates(0, required_purchase_total, rate)
+
+        self.required_purchase_total = required_purchase_total
+        self.rate = rate
+
+    def compile_cart(
+            self,
+            in_cents: bool
+    ) -> CartRule:
+        if in_cents:
+            required_purchase_total = to_cents(self.required_purchase_total)
+            basis_points = to_basis_points(self.rate)
+            return lambda total_marked_price, product_discount: threshold_discount_cents(
+                total_marked_price, product_discount, required_purchase_total, basis_points
+            )
+
+        required_purchase_total = self.required_purchase_total
+        rate = self.rate
+        return lambda total_marked_price, product_discount: threshold_discount(
+            total_marked_price, product_discount, required_purchase_total, rate
+        )
+
+
+def make_rule(
+        kind: str,
+        parameters: dict
+) -> Rule:
+    """
+    Make a rule of a registered kind
+
+    Parameters
+    ----------
+    kind
+        the kind of the promotion
+    parameters
+        parameters of the promotion
+
+    Returns
+    -------
+        the rule
+
+    Raises
+    ------
+    InvalidValue
+        If the kind is not registered or the parameters
+        do not fit the kind
+
+    """
+
+    if kind not in RULE_TYPES:
+        raise InvalidValue(
+            f"Unknown promotion kind {kind}. "
+            f"Registered kinds are {', '.join(sorted(RULE_TYPES))}."
+        )
+
+    try:
+        return RULE_TYPES[kind](**parameters)
+    except TypeError:
+        raise InvalidValue(
+            f"Invalid parameters {parameters} of a {kind} promotion."
+        )
+
+
+class ProductPlan:
+    """
+    Compiled pricing of a product
+
+    Attributes
+    ----------
+    unit_price
+        unit price in the units of the plan
+    rules
+        compiled line rules applying to the product
+
+    """
+    __slots__ = ("unit_price", "rules")
+
+    def __init__(
+            self,
+            unit_price: float,
+            rules: Tuple[LineRule, ...] = ()
+    ):
+        self.unit_price = unit_price
+        self.rules = rules
+
+    def line_discount(
+            self,
+            quantity: int
+    ) -> float:
+        """
+        Discount of a line of the product
+        """
+        discount = 0
+        for rule in self.rules:
+            discount += rule(quantity)
+
+        return discount
+
+
+class PricingPlan:
+    """
+    The promotions of a store compiled into plans per product,
+    so products without promotions cost nothing beyond their
+    marked price, plus the rules of the whole cart
+
+    Attributes
+    ----------
+    products
+        plan of each product by product id
+    cart_rules
+        compiled rules of the whole cart
+    in_cents
+        If True, the plan prices in integer cents
+    version
+        catalog version the plan is compiled from
+
+    """
+
+    def __init__(
+            self,
+            products: Dict[int, ProductPlan],
+            cart_rules: List[CartRule],
+            in_cents: bool = False,
+            version: int = 0
+    ):
+        self.products = products
+        self.cart_rules = cart_rules
+        self.in_cents = in_cents
+        self.version = version
+
+    def covers(
+            self,
+            product_ids: Iterable[int]
+    ) -> bool:
+        """
+        Whether the plan has all the given products
+        """
+        return all(product_id in self.products for product_id in product_ids)
+
+    def price(
+            self,
+            quantities: Dict[int, int],
+            tax_rate: float = 0,
+            cart_rules: Iterable[CartRule] = ()
+    ) -> PriceBreakdown:
+        """
+        Price a cart by evaluating the plan
+
+        Products are accumulated in product id order, so the same
+        cart always gives exactly the same floats.
+
+        Parameters
+        ----------
+        quantities
+            quantity of each product by product id
+        tax_rate
+            tax rate (in percentage) of the shopping cart
+        cart_rules
+            extra compiled rules of the whole cart, e.g. a global
+            discount given for this pricing only
+
+        Returns
+        -------
+            the price breakdown, in major units
+
+        """
+
+        total_marked_price = 0
+        product_discount = 0
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            plan = self.products[product_id]
+
+            total_marked_price += plan.unit_price * quantity
+            for rule in plan.rules:
+                product_discount += rule(quantity)
+
+        global_discount = 0
+        for rule in chain(self.cart_rules, cart_rules):
+            global_discount += rule(total_marked_price, product_discount)
+
+        if self.in_cents:
+            return breakdown_cents(
+                total_marked_price, product_discount, global_discount, tax_rate
+            ).in_units()
+
+        return breakdown(total_marked_price, product_discount, global_discount, tax_rate)
+
+
+def build_plan(
+        products: Iterable[ProductRow],
+        promotions: Iterable[PromotionRow],
+        in_cents: bool = False,
+        version: int = 0
+) -> PricingPlan:
+    """
+    Compile the products, their discount offers and the
+    promotions of a catalog into a pricing plan
+
+    Parameters
+    ----------
+    products
+        (id, unit price, unit price in cents, offer required
+        quantity, offer percentage) of each product
+    promotions
+        (id, kind, product id, JSON parameters) of each promotion
+    in_cents
+        If True, compile the plan for the cents pricing mode.
+        Default = False
+    version
+        catalog version of the products and promotions
+
+    Returns
+    -------
+        the pricing plan
+
+    Raises
+    ------
+    InvalidValue
+        If a promotion has an unknown kind or invalid parameters
+
+    """
+
+    rules: Dict[int, List[Rule]] = {}
+    unit_prices: Dict[int, float] = {}
+    for product_id, unit_price, unit_price_cents, required_quantity, percentage in products:
+        unit_prices[product_id] = unit_price_cents if in_cents else unit_price
+        rules[product_id] = []
+        if required_quantity is not None:
+            rules[product_id].append(PercentOff(required_quantity, percentage))
+
+    cart_rules = []
+    for promotion_id, kind, product_id, parameters in promotions:
+        rule = make_rule(kind, json.loads(parameters or "{}"))
+        if isinstance(rule, CartWideRule):
+            compiled = rule.compile_cart(in_cents)
+            if compiled is not None:
+                cart_rules.append(compiled)
+        elif product_id in rules:
+            rules[product_id].append(rule)
+        else:
+            logger.warning(
+                f"Promotion {promotion_id} of unknown product {product_id} is ignored"
+            )
+
+    plans = {}
+    for product_id, unit_price in unit_prices.items():
+        compiled = (
+            rule.compile_line(unit_price, in_cents) for rule in rules[product_id]
+        )
+        plans[product_id] = ProductPlan(
+            unit_price,
+            tuple(rule for rule in compiled if rule is not None)
+        )
+
+    return PricingPlan(plans, cart_rules, in_cents, version)
+
+
+def compile_plan(
+        session: Session,
+        in_cents: bool = False,
+        product_ids: Optional[Iterable[int]] = None
+) -> PricingPlan:
+    """
+    Compile the discount offers and the promotions of a store
+    into a pricing plan, with one query each, the catalog version
+    being read along with the products
+
+    Parameters
+    ----------
+    session
+        a store database
+    in_cents
+        If True, compile the plan for the cents pricing mode.
+        Default = False
+    product_ids
+        ids of the products to compile, along with the rules of the
+        whole cart. Default = None, i.e. all the products
+
+    Returns
+    -------
+        the pricing plan
+
+    Raises
+    ------
+    InvalidValue
+        If a promotion of the store has an unknown kind or
+        invalid parameters
+
+    """
+
+    rows = session.query(
+        Product.id,
+        Product.unit_price,
+        Product.unit_price_cents,
+        DiscountOffer.required_quantity,
+        DiscountOffer.percentage,
+        catalog_version_column()
+    ).outerjoin(
+        Product.discount_offer
+    )
+    promotions = session.query(
+        Promotion.id,
+        Promotion.kind,
+        Promotion.product_id,
+        Promotion.parameters
+    ).order_by(
+        Promotion.id
+    )
+
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        rows = rows.filter(
+            Product.id.in_(product_ids)
+        )
+        promotions = promotions.filter(
+            or_(
+                Promotion.product_id.is_(None),
+                Promotion.product_id.in_(product_ids)
+            )
+        )
+
+    rows = rows.all()
+    version = int(rows[0][-1] or 0) if rows else catalog_version(session)
+
+    return build_plan((row[:-1] for row in rows), promotions, in_cents, version)
+
+
+def pricing_plan(
+        session: Session,
+        in_cents: bool = False,
+        product_ids: Iterable[int] = (),
+        refresh: bool = False
+) -> PricingPlan:
+    """
+    Pricing plan of a store covering the given products, compiled
+    product by product as they are priced and kept until a product
+    price, an offer or a promotion changes. A session which is not
+    a StoreSession compiles the plan of the products on every call
+
+    The plan is checked against the catalog version of the store
+    once per transaction of the session, so changes committed by
+    other sessions or processes are priced from the next
+    transaction on.
+
+    Parameters
+    ----------
+    session
+        a store database
+    in_cents
+        If True, the plan for the cents pricing mode. Default = False
+    product_ids
+        ids of the products the plan must cover. Default = (), i.e.
+        the products already compiled and the rules of the whole cart
+    refresh
+        If True, compile the plan again. Default = False
+
+    Returns
+    -------
+        the pricing plan
+
+    """
+
+    product_ids = set(product_ids)
+    if not isinstance(session, StoreSession):
+        # without the session events of a store session the plan
+        # could not be dropped when the catalog changes
+        return compile_plan(session, in_cents, product_ids)
+
+    plans = session.info.setdefault(_PLANS_KEY, {})
+    plan = plans.get(in_cents)
+
+    if plan is not None and not refresh and not session.info.get(_CHECKED_KEY):
+        version = session.query(catalog_version_column()).scalar()
+        session.info[_CHECKED_KEY] = True
+        if int(version or 0) != plan.version:
+            plans.clear()
+            plan = None
+
+    if refresh or plan is None:
+        plan = plans[in_cents] = compile_plan(session, in_cents, product_ids)
+        session.info[_CHECKED_KEY] = True
+    elif not plan.covers(product_ids):
+        added = compile_plan(
+            session,
+            in_cents,
+            [product_id for product_id in product_ids if product_id not in plan.products]
+        )
+        if added.version == plan.version:
+            plan.products.update(added.products)
+        else:
+            plan = plans[in_cents] = compile_plan(session, in_cents, product_ids)
+
+    return plan
+
+
+def add_promotion(
+        session: Session,
+        kind: str,
+        parameters: dict,
+        product_name: Optional[str] = None
+) -> Promotion:
+    """
+    Add a promotion to the store
+
+    Parameters
+    ----------
+    session
+        a store database
+    kind
+        the kind of the promotion, a registered rule type
+    parameters
+        parameters of the promotion
+    product_name
+        name of the product of the promotion, None if the
+        promotion applies to the whole cart
+
+    Returns
+    -------
+        the promotion
+
+    Raises
+    ------
+    InvalidValue
+        If the kind is unknown, the parameters are invalid, or a
+        product is (not) given for a product (cart) promotion
+    InstanceNotFound
+        If the product is not found
+
+    """
+
+    rule = make_rule(kind, parameters)
+    if isinstance(rule, ProductRule) and product_name is None:
+        raise InvalidValue(
+            f"A {kind} promotion applies to a product, but no product is given."
+        )
+    if isinstance(rule, CartWideRule) and product_name is not None:
+        raise InvalidValue(
+            f"A {kind} promotion applies to the whole cart, but product {product_name} is given."
+        )
+
+    promotion = Promotion(
+        kind=kind,
+        parameters=json.dumps(parameters, sort_keys=True),
+        product=None if product_name is None else Product.with_name(session, product_name)
+    )
+    session.add(promotion)
+    session.commit()
+
+    return promotion
+
+
+@event.listens_for(StoreSession, "after_flush")
+def _invalidate_plans(
+        session: Session,
+        flush_context
+):
+    """
+    Drop the compiled pricing plans of a store when a
+    product price, an offer or a promotion changes
+    """
+    if changes_catalog(session):
+        session.info.pop(_PLANS_KEY, None)
+
+
+@event.listens_for(StoreSession, "after_begin")
+@event.listens_for(StoreSession, "after_transaction_end")
+def _check_plans(
+        session: Session,
+        transaction,
+        *args
+):
+    """
+    Check the compiled pricing plans of a store against its
+    catalog version again in the next transaction
+    """
+    session.info.pop(_CHECKED_KEY, None)
+
+
+@event.listens_for(StoreSession, "after_bulk_update")
+@event.listens_for(StoreSession, "after_bulk_delete")
+def _invalidate_plans_in_bulk(
+        context
+):
+    """
+    Drop the compiled pricing plans of a store when products,
+    offers or promotions are updated or deleted by a query
+    """
+    if issubclass(context.mapper.class_, CATALOG_CLASSES):
+        context.session.info.pop(_PLANS_KEY, None)
@@ -0,0 +1,434 @@
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, joinedload
+
+from shopping_cart.data_model.cart import CartLine
+from shopping_cart.data_model.product import Item, Product
+from shopping_cart.data_model.reservation import Reservation
+from shopping_cart.exc import InstanceNotFound, InvalidValue, ReservationExpired
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.quote_cache import QuoteCache
+from shopping_cart.store.reservation import DEFAULT_TTL, reserve_order
+from shopping_cart.store.write_behind import CartWriter
+
+logger = logging.getLogger(__name__)
+
+# leading bytes of an encoded cart and version of the encoding
+MAGIC = b"SC"
+FORMAT_VERSION = 1
+
+
+def _write_varint(
+        out: bytearray,
+        value: int
+):
+    """
+    Append a non-negative integer in 7 bit groups, least
+    significant first, i.e. 1 byte for values below 128
+    """
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(
+        data: bytes,
+        offset: int
+) -> Tuple[int, int]:
+    """
+    Read an integer written by _write_varint
+
+    Returns
+    -------
+        the integer and the offset of the next one
+
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ParkedCart:
+    """
+    The content of an encoded cart
+
+    Attributes
+    ----------
+    cart_id
+        identifier of the cart
+    catalog_version
+        catalog version of the store when the cart was encoded
+    quantities
+        quantity of each product by product id
+    reserved
+        reserved quantities by reservation id, by product id
+    item_ids
+        ids of the items in the cart which are not reserved
+
+    """
+    __slots__ = ("cart_id", "catalog_version", "quantities", "reserved", "item_ids")
+
+    def __init__(
+            self,
+            cart_id: str,
+            catalog_version: int,
+            quantities: Dict[int, int],
+            reserved: Dict[int, Dict[int, int]],
+            item_ids: List[int]
+    ):
+        self.cart_id = cart_id
+        self.catalog_version = catalog_version
+        self.quantities = quantities
+        self.reserved = reserved
+        self.item_ids = item_ids
+
+
+def encode_cart(
+        cart: ShoppingCart
+) -> bytes:
+    """
+    Encode a cart into a compact binary string, i.e. its id, the
+    catalog version, and for each product its quantity and the
+    quantity of each of its reservations, and the unreserved items
+
+    The integers are written as variable length integers, and the
+    product, reservation and item ids as differences to the previous
+    id in ascending order, so a line usually takes a few bytes
+
+    Parameters
+    ----------
+    cart
+        a shopping cart
+
+    Returns
+    -------
+        the encoded cart
+
+    """
+
+    out = bytearray(MAGIC)
+    out.append(FORMAT_VERSION)
+    _write_varint(out, cart.catalog_version)
+
+    cart_id = cart.cart_id.encode()
+    _write_varint(out, len(cart_id))
+    out += cart_id
+
+    cart_reserved = cart.reserved
+    _write_varint(out, len(cart.quantities))
+    previous = 0
+    for product_id in sorted(cart.quantities):
+        _write_varint(out, product_id - previous)
+        _write_varint(out, cart.quantities[product_id])
+        previous = product_id
+
+        reserved = cart_reserved.get(product_id, {})
+        _write_varint(out, len(reserved))
+        previous_reservation = 0
+        for reservation_id in sorted(reserved):
+            _write_varint(out, reservation_id - previous_reservation)
+            _write_varint(out, reserved[reservation_id])
+            previous_reservation = reservation_id
+
+    item_ids = cart.unreserved_item_ids
+    _write_varint(out, len(item_ids))
+    previous = 0
+    for item_id in item_ids:
+        _write_varint(out, item_id - previous)
+        previous = item_id
+
+    return bytes(out)
+
+
+def decode_cart(
+        data: bytes
+) -> ParkedCart:
+    """
+    Decode a cart encoded by encode_cart, without a store
+
+    Parameters
+    ----------
+    data
+        the encoded cart
+
+    Returns
+    -------
+        the content of the cart
+
+    Raises
+    ------
+    InvalidValue
+        If the data is not an encoded cart, or of an unknown
+        version of the encoding
+
+    """
+
+    if data[:len(MAGIC)] != MAGIC or len(data) <= len(MAGIC):
+        raise InvalidValue("The data is not an encoded cart.")
+
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise InvalidValue(
+            f"Cart encoding version {version} is not supported. "
+            f"Version {FORMAT_VERSION} is expected."
+        )
+
+    try:
+        catalog_version, offset = _read_varint(data, len(MAGIC) + 1)
+        id_length, offset = _read_varint(data, offset)
+        cart_id = data[offset:offset + id_length].decode()
+        offset += id_length
+
+        quantities = {}
+        reserved = {}
+        n_products, offset = _read_varint(data, offset)
+        product_id = 0
+        for _ in range(n_products):
+            delta, offset = _read_varint(data, offset)
+            product_id += delta
+            quantity, offset = _read_varint(data, offset)
+            quantities[product_id] = quantity
+
+            n_reservations, offset = _read_varint(data, offset)
+            reservation_id = 0
+            for _ in range(n_reservations):
+                delta, offset = _read_varint(data, offset)
+                reservation_id += delta
+                quantity, offset = _read_varint(data, offset)
+                reserved.setdefault(product_id, {})[reservation_id] = quantity
+
+        item_ids = []
+        n_items, offset = _read_varint(data, offset)
+        item_id = 0
+        for _ in range(n_items):
+            delta, offset = _read_varint(data, offset)
+            item_id += delta
+            item_ids.append(item_id)
+    except (IndexError, UnicodeDecodeError):
+        raise InvalidValue("The data is not an encoded cart.")
+
+    if offset != len(data):
+        raise InvalidValue("The data is not an encoded cart.")
+
+    return ParkedCart(cart_id, catalog_version, quantities, reserved, item_ids)
+
+
+def restore_cart(
+        store: Session,
+        data: bytes,
+        reservation_ttl: timedelta = DEFAULT_TTL,
+        quote_cache: Optional[QuoteCache] = None,
+        writer: Optional[CartWriter] = None,
+        same_catalog: bool = False
+) -> ShoppingCart:
+    """
+    Rebuild a cart encoded by encode_cart, loading its products and
+    their offers in one query, and its unreserved items if any in
+    another. The reservations are not checked until the cart is
+    checked out, see ShoppingCart.checkout
+
+    The cart is priced with the current catalog of the store. If the
+    catalog changed since the cart was encoded, the cart is re-priced
+    at the new version, or rejected if the same catalog is required.
+
+    Parameters
+    ----------
+    store
+        the store database
+    data
+        the encoded cart
+    reservation_ttl
+        how long the units added to the cart are reserved for.
+        Default = 15 minutes
+    quote_cache
+        cache of the price breakdowns. Default = None
+    writer
+        writer persisting the changes of the cart. Default = None
+    same_catalog
+        If True, reject a cart encoded at another catalog version.
+        Default = False
+
+    Returns
+    -------
+        the cart
+
+    Raises
+    ------
+    InvalidValue
+        If the data is not an encoded cart, or the catalog changed
+        since and the same catalog is required
+    InstanceNotFound
+        If a product of the cart is no longer in the store
+
+    """
+
+    parked = decode_cart(data)
+    cart = ShoppingCart(
+        store=store,
+        cart_id=parked.cart_id,
+        reservation_ttl=reservation_ttl,
+        quote_cache=quote_cache,
+        writer=writer
+    )
+
+    products = {
+        product.id: product
+        for product in store.query(
+            Product
+        ).options(
+            joinedload(Product.discount_offer)
+        ).filter(
+            Product.id.in_(list(parked.quantities))
+        )
+    } if parked.quantities else {}
+
+    missing = sorted(set(parked.quantities) - set(products))
+    if missing:
+        raise InstanceNotFound(
+            f"Product {', '.join(map(str, missing))} is no longer in the store."
+        )
+
+    unreserved_items = store.query(
+        Item
+    ).filter(
+        Item.id.in_(parked.item_ids)
+    ).order_by(
+        Item.id
+    ).all() if parked.item_ids else []
+
+    cart.restore(
+        (
+            (products[product_id], quantity)
+            for product_id, quantity in parked.quantities.items()
+        ),
+        parked.reserved,
+        unreserved_items
+    )
+
+    version = cart.catalog_version
+    if version != parked.catalog_version:
+        if same_catalog:
+            raise InvalidValue(
+                f"Cart {parked.cart_id} was encoded at catalog version "
+                f"{parked.catalog_version}, but the store is at version {version}."
+            )
+
+        logger.info(
+            f"Cart {parked.cart_id} encoded at catalog version {parked.catalog_version} "
+            f"is priced at version {version}"
+        )
+
+    return cart
+
+
+def load_cart(
+        store: Session,
+        cart_id: str,
+        reservation_ttl: timedelta = DEFAULT_TTL,
+        quote_cache: Optional[QuoteCache] = None,
+        writer: Optional[CartWriter] = None,
+        reserve_released: bool = False
+) -> ShoppingCart:
+    """
+    Rebuild a cart persisted by a CartWriter, e.g. after a restart,
+    loading its lines together with their products and offers in one
+    query, and its reservations in another
+
+    The units of a line which are no longer reserved, e.g. as its
+    reservations expired and were released by the sweeper, are
+    reserved again or the cart is rejected, so a loaded cart never
+    checks out units it does not hold.
+
+    Parameters
+    ----------
+    store
+        the store database
+    cart_id
+        identifier of the cart
+    reservation_ttl
+        how long the units added to the cart are reserved for.
+        Default = 15 minutes
+    quote_cache
+        cache of the price breakdowns. Default = None
+    writer
+        writer persisting the changes of the cart. Default = None
+    reserve_released
+        If True, reserve again the units of the cart which are no
+        longer reserved, otherwise reject the cart. Default = False
+
+    Returns
+    -------
+        the cart
+
+    Raises
+    ------
+    InstanceNotFound
+        If the cart is not persisted, e.g. it is empty
+    ReservationExpired
+        If units of the cart are no longer reserved, and they
+        are not to be reserved again
+    OverDemand
+        If units of the cart are reserved again, but fewer
+        are available, in which case nothing is reserved
+
+    """
+
+    lines = store.query(
+        Product, CartLine.quantity
+    ).join(
+        CartLine, CartLine.product_id == Product.id
+    ).options(
+        joinedload(Product.discount_offer)
+    ).filter(
+        CartLine.cart_id == cart_id
+    ).all()
+    if not lines:
+        raise InstanceNotFound(f"Cart {cart_id} is not found.")
+
+    cart = ShoppingCart(
+        store=store,
+        cart_id=cart_id,
+        reservation_ttl=reservation_ttl,
+        quote_cache=quote_cache,
+        writer=writer
+    )
+
+    reserved = {}
+    for product_id, reservation_id, quantity in store.query(
+            Reservation.product_id, Reservation.id, Reservation.quantity
+    ).filter(
+        Reservation.cart_id == cart_id
+    ):
+        reserved.setdefault(product_id, {})[reservation_id] = quantity
+
+    released = {
+        product.name: quantity - sum(reserved.get(product.id, {}).values())
+        for product, quantity in lines
+        if quantity > sum(reserved.get(product.id, {}).values())
+    }
+    if released and not reserve_released:
+        raise ReservationExpired(
+            f"The reservations of {', '.join(sorted(released))} in cart "
+            f"{cart_id} have already been released."
+        )
+
+    if released:
+        for reservation in reserve_order(
+                store, released, cart_id, ttl=reservation_ttl
+        ):
+            reserved.setdefault(
+                reservation.product_id, {}
+            )[reservation.id] = reservation.quantity
+
+    cart.restore(lines, reserved)
+
+    return cart
@@ -0,0 +1,324 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session, scoped_session
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue, ServiceBusy
+from shopping_cart.shopping.manager import CartManager
+from shopping_cart.shopping.quote_cache import QuoteCache
+
+
+class CartService:
+    """
+    An asyncio facade over the store and the shopping carts, which
+    runs the database work on a bounded pool of worker threads
+
+    Each worker thread has its own store session and cart manager,
+    and a cart lives on the worker it was created on, so the requests
+    on a cart run one at a time in order while the requests on carts
+    of different workers run concurrently. At most max_pending
+    requests are taken at once; further requests wait for a slot,
+    or raise ServiceBusy past the timeout.
+
+    The service is used as an async context manager, or closed
+    with close()
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Session],
+            workers: int = 4,
+            max_pending: Optional[int] = None,
+            timeout: Optional[float] = None,
+            idle_ttl: Optional[float] = None,
+            quote_cache: Optional[QuoteCache] = None
+    ):
+        """
+
+        Parameters
+        ----------
+        session_factory
+            makes a new session of the store database, e.g. a
+            sessionmaker bound to a file-backed or shared engine
+        workers
+            number of worker threads. Default = 4
+        max_pending
+            maximum number of requests taken at once. Default = None,
+            i.e. 8 per worker
+        timeout
+            seconds a request waits for a slot before raising
+            ServiceBusy. Default = None, i.e. wait as long as needed
+        idle_ttl
+            seconds a cart is kept for since its last request, see
+            CartManager. Default = None
+        quote_cache
+            cache of the price breakdowns shared by the carts. Default = None
+
+        Raises
+        ------
+        InvalidValue
+            If the number of workers or pending requests is not positive
+
+        """
+
+        if workers <= 0:
+            raise InvalidValue(f"Number of workers must be positive. {workers} is given.")
+
+        max_pending = 8 * workers if max_pending is None else max_pending
+        if max_pending <= 0:
+            raise InvalidValue(
+                f"Maximum number of pending requests must be positive. {max_pending} is given."
+            )
+
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.idle_ttl = idle_ttl
+        self.quote_cache = quote_cache
+
+        # a session per worker thread
+        self._sessions = scoped_session(session_factory)
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cart-service-{i}")
+            for i in range(workers)
+        ]
+        # the cart manager of each worker, made on its thread
+        self._managers: List[Optional[CartManager]] = [None] * workers
+        # worker of each cart by cart id
+        self._workers: Dict[str, int] = {}
+        self._next_worker = itertools.cycle(range(workers))
+
+        # made on first use, in the running event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "CartService":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(
+            self,
+            worker: int,
+            function: Callable,
+            *args
+    ):
+        """
+        Run a function on a worker thread once a slot is free,
+        rolling back the session of the worker if it fails
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise ServiceBusy(
+                f"The cart service is busy with {self.max_pending} requests."
+            )
+
+        def call():
+            try:
+                return function(*args)
+            except Exception:
+                self._sessions().rollback()
+                raise
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executors[worker], call
+            )
+        finally:
+            self._slots.release()
+
+    def _manager(
+            self,
+            worker: int
+    ) -> CartManager:
+        """
+        Cart manager of a worker, called on the worker thread
+        """
+        if self._managers[worker] is None:
+            self._managers[worker] = CartManager(
+                self._sessions(),
+                idle_ttl=self.idle_ttl,
+                quote_cache=self.quote_cache
+            )
+
+        return self._managers[worker]
+
+    async def _on_cart(
+            self,
+            cart_id: str,
+            operation: Callable
+    ):
+        """
+        Run an operation on a cart on its worker thread
+
+        Raises
+        ------
+        InstanceNotFound
+            If there is no such cart, e.g. it has been evicted
+
+        """
+        worker = self._workers.get(cart_id)
+        if worker is None:
+            raise InstanceNotFound(f"Cart {cart_id} is not found.")
+
+        try:
+            return await self._run(
+                worker, lambda: operation(self._manager(worker).get(cart_id))
+            )
+        except InstanceNotFound:
+            manager = self._managers[worker]
+            if manager is None or cart_id not in manager:
+                # evicted for being idle
+                self._workers.pop(cart_id, None)
+            raise
+
+    async def create_cart(self) -> str:
+        """
+        Make a new empty cart, on the next worker in turn
+
+        Returns
+        -------
+            identifier of the cart
+
+        """
+        worker = next(self._next_worker)
+        cart_id = await self._run(
+            worker, lambda: self._manager(worker).create().cart_id
+        )
+        self._workers[cart_id] = worker
+        return cart_id
+
+    async def add_product_items(
+            self,
+            cart_id: str,
+            product_name: str,
+            quantity: int,
+            is_random: bool = False
+    ):
+        """
+        Add N items of a given product to a cart, see
+        ShoppingCart.add_product_items
+        """
+        await self._on_cart(
+            cart_id, lambda cart: cart.add_product_items(product_name, quantity, is_random)
+        )
+
+    async def add_order(
+            self,
+            cart_id: str,
+            order: Dict[str, int],
+            is_random: bool = False
+    ):
+        """
+        Add the items of several products to a cart at once,
+        see ShoppingCart.add_order
+        """
+        await self._on_cart(cart_id, lambda cart: cart.add_order(order, is_random))
+
+    async def remove_product_items(
+            self,
+            cart_id: str,
+            product_name: str,
+            quantity: int
+    ):
+        """
+        Remove N items of a given product from a cart, see
+        ShoppingCart.remove_product_items
+        """
+        await self._on_cart(
+            cart_id, lambda cart: cart.remove_product_items(product_name, quantity)
+        )
+
+    async def product_list(
+            self,
+            cart_id: str
+    ) -> Dict[str, int]:
+        """
+        Quantity of each product in a cart by product name
+        """
+        return await self._on_cart(
+            cart_id,
+            lambda cart: {
+                product.name: quantity for product, quantity in cart.product_list.items()
+            }
+        )
+
+    async def price_breakdown(
+            self,
+            cart_id: str,
+            tax_rate: float,
+            required_purchase_total: Optional[float] = None,
+            global_rate: Optional[float] = None
+    ) -> dict:
+        """
+        Breakdown price of a cart, see ShoppingCart.price_breakdown
+        """
+        return await self._on_cart(
+            cart_id,
+            lambda cart: cart.price_breakdown(tax_rate, required_purchase_total, global_rate)
+        )
+
+    async def checkout(
+            self,
+            cart_id: str
+    ):
+        """
+        Check out all the items in a cart and close the cart,
+        see ShoppingCart.checkout
+        """
+        worker = self._workers.get(cart_id)
+
+        def checkout(cart):
+            cart.checkout()
+            self._manager(worker).discard(cart_id)
+
+        await self._on_cart(cart_id, checkout)
+        self._workers.pop(cart_id, None)
+
+    async def empty(
+            self,
+            cart_id: str
+    ):
+        """
+        Remove all the items from a cart and return them
+        to the store, see ShoppingCart.empty
+        """
+        await self._on_cart(cart_id, lambda cart: cart.empty())
+
+    async def pick(
+            self,
+            product_name: str,
+            quantity: int,
+            is_random: bool = False
+    ) -> List[int]:
+        """
+        Ids of N available items of a product, see Product.pick
+        """
+        return await self._run(
+            next(self._next_worker),
+            lambda: [
+                item.id for item in m.Product.pick(
+                    self._sessions(), product_name, quantity, is_random
+                )
+            ]
+        )
+
+    async def close(self):
+        """
+        Close the sessions of the workers and shut them down
+        """
+        for executor in self._executors:
+            await asyncio.get_running_loop().run_in_executor(
+                executor, self._sessions.remove
+            )
+            executor.shutdown(wait=True)
+
+        self._managers = [None] * self.workers
+        self._workers.clear()
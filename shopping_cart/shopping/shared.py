@@ -0,0 +1,956 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import logging
+import multiprocessing
+from multiprocessing.context import BaseContext
+from multiprocessing.shared_memory import SharedMemory
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue, OverDemand, ReservationExpired
+from shopping_cart.shopping.cart import BaseCart
+from shopping_cart.shopping.catalog import CatalogSnapshot
+from shopping_cart.shopping.catalog_file import MappedCatalog, encode_catalog
+from shopping_cart.shopping.pricing import get_pricing_mode
+from shopping_cart.shopping.quote_cache import QuoteCache
+from shopping_cart.shopping.rules import PricingPlan
+from shopping_cart.store.reservation import DEFAULT_TTL
+from shopping_cart.store.write_behind import CartWriter
+
+logger = logging.getLogger(__name__)
+
+# number of locks guarding the stock counters, a counter is
+# guarded by the lock of its position modulo the number of locks
+DEFAULT_STRIPES = 16
+
+# number of holds of reserved units in the table of holds
+DEFAULT_CAPACITY = 4096
+
+# fields of a hold in the table, a hold is identified by the number
+# of times its slot has been taken and the slot, so the id of a
+# released hold never matches the next hold in its slot
+_HOLD_FIELDS = 4
+_GENERATION, _POSITION, _QUANTITY, _OWNER = range(_HOLD_FIELDS)
+_SLOT_MASK = (1 << 32) - 1
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class SharedCatalog(MappedCatalog):
+    """
+    A catalog read in place from a block of shared memory, in the
+    binary catalog file format, see MappedCatalog
+    """
+
+    def __init__(
+            self,
+            shared_memory: SharedMemory,
+            size: int,
+            verify: bool = False
+    ):
+        """
+
+        Parameters
+        ----------
+        shared_memory
+            the block holding the encoded catalog
+        size
+            length of the encoded catalog, the block may be larger
+        verify
+            If True, check the CRC-32 of the catalog. Default = False
+
+        """
+
+        self.path = shared_memory.name
+        self._map = shared_memory
+        self._open(shared_memory.buf[:size], verify)
+
+
+class SharedStore:
+    """
+    The catalog of a store and the available stock of each of its
+    products, published in shared memory by a parent process for the
+    worker processes serving the carts of the store
+
+    The workers read the catalog in place rather than each building
+    a store database of their own, and reserve and release stock on
+    the same counters, so the stock of a product is the same for all
+    of them. A counter is changed under the lock of its stripe, and a
+    reservation of several products takes their locks in order, so
+    it is all or nothing.
+
+    Reserved units are held by a hold of one product, recording the
+    process owning it and when it expires, in a table of holds of a
+    fixed capacity. A hold is kept in a slot of the stripe of its
+    product, so it is changed under the same lock as the counter. The
+    units of an expired hold, e.g. of a worker which crashed, are
+    returned to the stock by release_expired, or by a HoldSweeper
+    thread of the parent.
+
+    The parent publishes the store with SharedStore.publish, hands the
+    shared store to the workers as they start, i.e. as an argument of
+    multiprocessing.Process or of a Pool initializer, and unlinks it
+    once the workers are done, e.g. by using it as a context manager.
+    The counters are not written back to the store database.
+
+    Attributes
+    ----------
+    catalog
+        the shared catalog
+    pricing_mode
+        pricing mode of the store
+
+    """
+
+    def __init__(
+            self,
+            catalog_memory: SharedMemory,
+            catalog_size: int,
+            stock_memory: SharedMemory,
+            holds_memory: SharedMemory,
+            capacity: int,
+            locks: list,
+            pricing_mode: str,
+            owner: bool = False
+    ):
+        """
+        Use SharedStore.publish to publish a store rather than
+        making a shared store directly
+
+        Parameters
+        ----------
+        catalog_memory
+            the block holding the encoded catalog
+        catalog_size
+            length of the encoded catalog
+        stock_memory
+            the block holding the available stock of each product,
+            in the order of the products in the catalog
+        holds_memory
+            the block holding the table of holds
+        capacity
+            number of holds in the table
+        locks
+            the locks of the stripes of the stock counters
+        pricing_mode
+            pricing mode of the store
+        owner
+            If True, the shared store unlinks the blocks when it is
+            closed as a context manager. Default = False
+
+        """
+
+        self._catalog_memory = catalog_memory
+        self._catalog_size = catalog_size
+        self._stock_memory = stock_memory
+        self._holds_memory = holds_memory
+        self._capacity = capacity
+        self._locks = locks
+        self._owner = owner
+        self.pricing_mode = pricing_mode
+
+        self.catalog = SharedCatalog(catalog_memory, catalog_size)
+        self._stock = stock_memory.buf[:8 * len(self.catalog)].cast("q")
+        self._holds = holds_memory.buf[:8 * _HOLD_FIELDS * capacity].cast("q")
+        self._expiry = holds_memory.buf[
+            8 * _HOLD_FIELDS * capacity:8 * (_HOLD_FIELDS + 1) * capacity
+        ].cast("d")
+
+    @classmethod
+    def publish(
+            cls,
+            store: Session,
+            stripes: int = DEFAULT_STRIPES,
+            context: Optional[BaseContext] = None,
+            capacity: int = DEFAULT_CAPACITY
+    ) -> "SharedStore":
+        """
+        Publish the catalog of a store and the available stock of
+        each of its products in shared memory
+
+        Parameters
+        ----------
+        store
+            a store database
+        stripes
+            number of locks guarding the stock counters.
+            Default = DEFAULT_STRIPES
+        context
+            multiprocessing context the worker processes are started
+            with. Default = None, i.e. the default context
+        capacity
+            maximum number of holds at a time, shared evenly by the
+            stripes. Default = DEFAULT_CAPACITY
+
+        Returns
+        -------
+            the shared store, owning the shared memory
+
+        Raises
+        ------
+        InvalidValue
+            If the number of stripes is not positive, or the capacity
+            is less than the number of stripes
+
+        """
+
+        if stripes <= 0:
+            raise InvalidValue(f"Number of stripes must be positive. {stripes} is given.")
+        if capacity < stripes:
+            raise InvalidValue(
+                f"Capacity must be at least the number of stripes {stripes}. "
+                f"{capacity} is given."
+            )
+
+        data = encode_catalog(CatalogSnapshot.load(store))
+        stock = available_stock(store)
+
+        catalog_memory = SharedMemory(create=True, size=len(data))
+        catalog_memory.buf[:len(data)] = data
+        stock_memory = SharedMemory(create=True, size=max(8 * len(stock), 8))
+        holds_memory = SharedMemory(create=True, size=8 * (_HOLD_FIELDS + 1) * capacity)
+        holds_memory.buf[:8 * (_HOLD_FIELDS + 1) * capacity] = bytes(
+            8 * (_HOLD_FIELDS + 1) * capacity
+        )
+
+        shared = cls(
+            catalog_memory,
+            len(data),
+            stock_memory,
+            holds_memory,
+            capacity,
+            [(context or multiprocessing).Lock() for _ in range(stripes)],
+            get_pricing_mode(store),
+            owner=True
+        )
+        for product_id, available in stock.items():
+            shared._stock[shared.catalog._position(product_id)] = available
+
+        return shared
+
+    def __getstate__(self) -> dict:
+        # the locks are only pickled when starting a worker process
+        return dict(
+            catalog_name=self._catalog_memory.name,
+            catalog_size=self._catalog_size,
+            stock_name=self._stock_memory.name,
+            holds_name=self._holds_memory.name,
+            capacity=self._capacity,
+            locks=self._locks,
+            pricing_mode=self.pricing_mode
+        )
+
+    def __setstate__(self, state: dict):
+        self.__init__(
+            SharedMemory(name=state["catalog_name"]),
+            state["catalog_size"],
+            SharedMemory(name=state["stock_name"]),
+            SharedMemory(name=state["holds_name"]),
+            state["capacity"],
+            state["locks"],
+            state["pricing_mode"]
+        )
+
+    def __enter__(self) -> "SharedStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def close(self):
+        """
+        Detach the shared store from the shared memory of this process
+        """
+        self._stock.release()
+        self._holds.release()
+        self._expiry.release()
+        self.catalog.close()
+        self._stock_memory.close()
+        self._holds_memory.close()
+
+    def unlink(self):
+        """
+        Free the shared memory, once every process has closed it
+        """
+        self._catalog_memory.unlink()
+        self._stock_memory.unlink()
+        self._holds_memory.unlink()
+
+    def available(
+            self,
+            product_id: int
+    ) -> int:
+        """
+        Number of units of a product available
+
+        Raises
+        ------
+        InstanceNotFound
+            If the product is not in the catalog
+
+        """
+        return self._stock[self.catalog._positions([product_id])[product_id]]
+
+    def reserve(
+            self,
+            order: Dict[int, int],
+            ttl: timedelta = DEFAULT_TTL,
+            now: Optional[datetime] = None,
+            owner: Optional[int] = None
+    ) -> Dict[int, int]:
+        """
+        Take units of several products out of the stock, all or
+        nothing, and hold them until they are released, confirmed
+        or the holds expire
+
+        Parameters
+        ----------
+        order
+            number of units by product id
+        ttl
+            how long the units are held for. Default = 15 minutes
+        now
+            current (UTC) time. Default = datetime.utcnow()
+        owner
+            id of the process owning the holds. Default = None,
+            i.e. the id of the current process
+
+        Returns
+        -------
+            the id of the hold of each product by product id
+
+        Raises
+        ------
+        InvalidValue
+            If any quantity is non-positive
+        InstanceNotFound
+            If a product is not in the catalog
+        OverDemand
+            If request to reserve more units than what is available for
+            any product, listing every product short of stock, or if
+            there is no hold left for a product
+
+        """
+        _validate_order(order)
+        positions = self.catalog._positions(order)
+        now = _timestamp(now or datetime.utcnow())
+        expires_at = now + ttl.total_seconds()
+        owner = os.getpid() if owner is None else owner
+
+        with self._locked({position % len(self._locks) for position in positions.values()}):
+            shortages = [
+                f"only {self._stock[position]} of {self.catalog._name(position)} "
+                f"is available, but {order[product_id]} is requested"
+                for product_id, position in positions.items()
+                if self._stock[position] < order[product_id]
+            ]
+            if shortages:
+                raise OverDemand(
+                    f"Excess demand request. {'; '.join(shortages)}."
+                )
+
+            slots = {}
+            for product_id, position in positions.items():
+                slot = self._free_slot(position % len(self._locks), now, set(slots.values()))
+                if slot is None:
+                    raise OverDemand(
+                        f"No hold left for {self.catalog._name(position)}, "
+                        f"all {self._capacity} holds are in use."
+                    )
+                slots[product_id] = slot
+
+            holds = {}
+            for product_id, slot in slots.items():
+                position = positions[product_id]
+                self._stock[position] -= order[product_id]
+
+                field = _HOLD_FIELDS * slot
+                self._holds[field + _GENERATION] += 1
+                self._holds[field + _POSITION] = position
+                self._holds[field + _QUANTITY] = order[product_id]
+                self._holds[field + _OWNER] = owner
+                self._expiry[slot] = expires_at
+                holds[product_id] = (self._holds[field + _GENERATION] << 32) | slot
+
+        return holds
+
+    def release(
+            self,
+            hold: int,
+            quantity: Optional[int] = None
+    ) -> int:
+        """
+        Return held units to the stock
+
+        Parameters
+        ----------
+        hold
+            id of the hold
+        quantity
+            number of units to release. Default = None, i.e.
+            release all the held units
+
+        Returns
+        -------
+            number of units released, zero if the hold has
+            already been released
+
+        Raises
+        ------
+        InvalidValue
+            If the quantity is non-positive
+
+        """
+        if quantity is not None:
+            _validate_order({hold: quantity})
+
+        slot = hold & _SLOT_MASK
+        with self._locked([slot % len(self._locks)]):
+            if not self._is_active(hold):
+                return 0
+
+            field = _HOLD_FIELDS * slot
+            held = self._holds[field + _QUANTITY]
+            if quantity is None or quantity > held:
+                quantity = held
+
+            self._stock[self._holds[field + _POSITION]] += quantity
+            self._holds[field + _QUANTITY] = held - quantity
+
+        return quantity
+
+    def confirm(
+            self,
+            holds: Iterable[int]
+    ):
+        """
+        Check out held units, i.e. the units leave the store and
+        the holds are removed, all or nothing
+
+        Parameters
+        ----------
+        holds
+            ids of the holds
+
+        Raises
+        ------
+        ReservationExpired
+            If any hold has been released, in which case nothing
+            is checked out
+
+        """
+        holds = list(holds)
+        with self._locked({(hold & _SLOT_MASK) % len(self._locks) for hold in holds}):
+            if not all(self._is_active(hold) for hold in holds):
+                raise ReservationExpired(
+                    "The hold has already been released."
+                )
+
+            for hold in holds:
+                self._holds[_HOLD_FIELDS * (hold & _SLOT_MASK) + _QUANTITY] = 0
+
+    def release_expired(
+            self,
+            now: Optional[datetime] = None
+    ) -> int:
+        """
+        Return the units of all expired holds to the stock
+
+        Parameters
+        ----------
+        now
+            current (UTC) time. Default = datetime.utcnow()
+
+        Returns
+        -------
+            number of expired holds released
+
+        """
+        now = _timestamp(now or datetime.utcnow())
+        return self._release_where(lambda slot: self._expiry[slot] <= now)
+
+    def release_owned(
+            self,
+            owner: int
+    ) -> int:
+        """
+        Return the units of all the holds of a process to the stock,
+        e.g. of a worker process which has exited
+
+        Parameters
+        ----------
+        owner
+            id of the process
+
+        Returns
+        -------
+            number of holds released
+
+        """
+        return self._release_where(
+            lambda slot: self._holds[_HOLD_FIELDS * slot + _OWNER] == owner
+        )
+
+    def _release_where(
+            self,
+            condition: Callable[[int], bool]
+    ) -> int:
+        """
+        Return the units of the holds meeting a condition on their
+        slot to the stock, one stripe at a time
+        """
+        released = 0
+        for stripe in range(len(self._locks)):
+            with self._locked([stripe]):
+                for slot in range(stripe, self._capacity, len(self._locks)):
+                    if self._holds[_HOLD_FIELDS * slot + _QUANTITY] and condition(slot):
+                        self._return(slot)
+                        released += 1
+
+        return released
+
+    def _free_slot(
+            self,
+            stripe: int,
+            now: float,
+            taken: Set[int]
+    ) -> Optional[int]:
+        """
+        A slot of a stripe holding nothing, or else the slot of an
+        expired hold, whose units are returned to the stock. The
+        stripe must be locked
+        """
+        expired = None
+        for slot in range(stripe, self._capacity, len(self._locks)):
+            if slot in taken:
+                continue
+            if self._holds[_HOLD_FIELDS * slot + _QUANTITY] == 0:
+                return slot
+            if expired is None and self._expiry[slot] <= now:
+                expired = slot
+
+        if expired is not None:
+            self._return(expired)
+        return expired
+
+    def _return(
+            self,
+            slot: int
+    ):
+        """
+        Return the units of the hold of a slot to the stock and free
+        the slot. The stripe of the slot must be locked
+        """
+        field = _HOLD_FIELDS * slot
+        self._stock[self._holds[field + _POSITION]] += self._holds[field + _QUANTITY]
+        self._holds[field + _QUANTITY] = 0
+
+    def _is_active(
+            self,
+            hold: int
+    ) -> bool:
+        """
+        Whether a hold still holds units, i.e. its slot has not been
+        freed nor taken by another hold. The stripe of its slot must
+        be locked
+        """
+        slot = hold & _SLOT_MASK
+        if slot >= self._capacity:
+            return False
+
+        field = _HOLD_FIELDS * slot
+        return self._holds[field + _GENERATION] == hold >> 32 \
+            and self._holds[field + _QUANTITY] > 0
+
+    @contextmanager
+    def _locked(
+            self,
+            stripes: Iterable[int]
+    ):
+        """
+        Hold the locks of the given stripes, taken in order
+        """
+        stripes = sorted(stripes)
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+
+class HoldSweeper(threading.Thread):
+    """
+    A background thread returning the units of expired holds
+    of a shared store periodically
+    """
+
+    def __init__(
+            self,
+            shared: SharedStore,
+            interval: float = 60.0
+    ):
+        """
+
+        Parameters
+        ----------
+        shared
+            the shared store
+        interval
+            seconds between sweeps. Default = 60
+
+        """
+        super().__init__(daemon=True)
+
+        self.shared = shared
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Failed to release expired holds")
+
+    def sweep(self) -> int:
+        """
+        Release all expired holds once
+
+        Returns
+        -------
+            number of expired holds released
+
+        """
+        return self.shared.release_expired()
+
+    def stop(self):
+        """
+        Stop sweeping and wait for the thread to finish
+        """
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+def _timestamp(
+        time: datetime
+) -> float:
+    """
+    Seconds since the epoch of a naive UTC time
+    """
+    return (time - _EPOCH).total_seconds()
+
+
+def _validate_order(
+        order: Dict[int, int]
+):
+    """
+    Check the quantities of an order of the shared stock are positive,
+    as a negative quantity would turn a reservation into a release
+    """
+    if any(quantity <= 0 for quantity in order.values()):
+        raise InvalidValue(
+            "Quantity request must be positive."
+        )
+
+
+def available_stock(
+        store: Session
+) -> Dict[int, int]:
+    """
+    Number of units available of each product of a store by product
+    id, counting the available items of the serial-tracked products
+    in one query
+
+    Parameters
+    ----------
+    store
+        a store database
+
+    Returns
+    -------
+        the available units by product id
+
+    """
+    stock = {
+        product_id: 0 if is_serial_tracked else number_available or 0
+        for product_id, is_serial_tracked, number_available in store.query(
+            m.Product.id, m.Product.is_serial_tracked, m.Product.number_available
+        )
+    }
+    stock.update(
+        store.query(
+            m.Item.product_id, func.count(m.Item.id)
+        ).filter(
+            m.Item.is_available
+        ).group_by(
+            m.Item.product_id
+        )
+    )
+    return stock
+
+
+class SharedCart(BaseCart):
+    """
+    A shopping cart of a worker process, priced with the catalog of
+    a shared store and reserving units on its shared stock counters,
+    without a store database
+
+    The cart holds quantities of products rather than items, and its
+    units are held on the shared stock until they are removed, the
+    cart is emptied or checked out, or the holds expire. It has no
+    items nor reservations of a store database, but the holds of the
+    shared stock, and its product list holds the catalog products of
+    the shared catalog, with the id, name and unit_price of a product
+    of the store but not its relationships, e.g. its discount offer.
+    """
+    _measured = BaseCart._measured + ("_holds",)
+
+    def __init__(
+            self,
+            shared: SharedStore,
+            cart_id: Optional[str] = None,
+            reservation_ttl: timedelta = DEFAULT_TTL,
+            quote_cache: Optional[QuoteCache] = None,
+            writer: Optional[CartWriter] = None
+    ):
+        """
+
+        Parameters
+        ----------
+        shared
+            the shared store
+        cart_id
+            identifier of the shopping cart. Default = None, i.e.
+            a new str(uuid4()) for each cart
+        reservation_ttl
+            how long the units added to the cart are held for.
+            Default = 15 minutes
+        quote_cache
+            cache of the price breakdowns, which may be shared by
+            the carts of the worker. Default = None
+        writer
+            writer persisting the changes of the cart in the
+            background. Default = None
+
+        """
+
+        self.shared = shared
+        # Held quantities by hold id, by product id
+        self._holds: Dict[int, Dict[int, int]] = {}
+        super().__init__(cart_id, reservation_ttl, quote_cache, writer)
+
+    def _read_pricing_mode(self) -> str:
+        """
+        Pricing mode of the shared store
+        """
+        return self.shared.pricing_mode
+
+    def add_product_items(
+            self,
+            product_name: str,
+            quantity: int,
+            is_random: bool = False
+    ):
+        """
+        Add N units of a given product to the cart, held on the
+        shared stock until they are checked out, removed or the
+        hold expires
+
+        Parameters
+        ----------
+        product_name
+            the name of the product to be added
+        quantity
+            number of the product units to be added
+        is_random
+            unused, the cart holds no items. Default = False
+
+        """
+        self.add_order({product_name: quantity})
+
+    def add_order(
+            self,
+            order: Dict[str, int],
+            is_random: bool = False
+    ):
+        """
+        Add the units of several products to the cart at once,
+        all or nothing
+
+        Parameters
+        ----------
+        order
+            number of units to add by product name
+        is_random
+            unused, the cart holds no items. Default = False
+
+        Raises
+        ------
+        InvalidValue
+            If any request quantity is non-positive
+        InstanceNotFound
+            If any product name is not found
+        OverDemand
+            If any product has fewer available units than ordered,
+            in which case nothing is added
+
+        """
+
+        if any(quantity <= 0 for quantity in order.values()):
+            raise InvalidValue(
+                "Quantity request must be positive."
+            )
+
+        catalog = self.shared.catalog
+        product_ids = {}
+        for name in order:
+            try:
+                product_ids[name] = catalog.product_id(name)
+            except InstanceNotFound:
+                pass
+
+        missing = [name for name in order if name not in product_ids]
+        if missing:
+            raise InstanceNotFound(
+                f"Product {', '.join(missing)} not found."
+            )
+
+        holds = self.shared.reserve(
+            {product_ids[name]: quantity for name, quantity in order.items()},
+            ttl=self.reservation_ttl
+        )
+        for name, quantity in order.items():
+            product_id = product_ids[name]
+            self._holds.setdefault(product_id, {})[holds[product_id]] = quantity
+            self._update(catalog.product(product_id), quantity)
+        self._persist()
+
+    def remove_product_items(
+            self,
+            product_name: str,
+            quantity: int
+    ):
+        """
+        Remove N units of a given product from the cart and
+        return them to the shared stock, the latest added first
+
+        Parameters
+        ----------
+        product_name
+            the name of the product to be removed
+        quantity
+            number of the product units to be removed
+
+        Raises
+        ------
+        InvalidValue
+            If the quantity is non-positive or more than
+            the quantity of the product in the cart
+
+        """
+
+        if quantity <= 0:
+            raise InvalidValue(
+                "Quantity request must be positive."
+            )
+
+        product = next(
+            (
+                product for product in self._products.values()
+                if product.name == product_name
+            ),
+            None
+        )
+        in_cart = 0 if product is None else self.quantities[product.id]
+        if in_cart < quantity:
+            raise InvalidValue(
+                f"Only {in_cart} {product_name} in the cart, "
+                f"but {quantity} is requested to be removed."
+            )
+
+        held = self._holds[product.id]
+        remaining = quantity
+        for hold in reversed(list(held)):
+            if remaining == 0:
+                break
+
+            removed = min(remaining, held[hold])
+            self.shared.release(hold, removed)
+
+            held[hold] -= removed
+            if held[hold] == 0:
+                del held[hold]
+            remaining -= removed
+
+        if not held:
+            del self._holds[product.id]
+        self._update(product, -quantity)
+        self._persist()
+
+    def empty(self):
+        """
+        Remove all the units from the cart and return
+        them to the shared stock
+
+        """
+        for hold in self._all_holds():
+            self.shared.release(hold)
+        self._clear()
+
+    def checkout(self):
+        """
+        Check out all the units in the cart, i.e. their holds are
+        removed, and empty the cart
+
+        Raises
+        ------
+        ReservationExpired
+            If any hold of the cart has expired and been released,
+            in which case nothing is checked out
+
+        """
+        self.shared.confirm(self._all_holds())
+        self._clear()
+
+    def _all_holds(self) -> List[int]:
+        """
+        Ids of all the holds of the cart
+        """
+        return [hold for held in self._holds.values() for hold in held]
+
+    def _clear(self):
+        """
+        Forget all the units in the cart
+        """
+        self._holds = {}
+        super()._clear()
+
+    def _plan(
+            self,
+            product_ids
+    ) -> PricingPlan:
+        """
+        Pricing plan of the given products in the shared catalog
+        """
+        return self.shared.catalog.plan(product_ids, self._in_cents)
+
+    @property
+    def holds(self) -> Dict[int, Dict[int, int]]:
+        """
+        Held quantities by hold id, by product id
+
+        """
+
+        return {
+            product_id: dict(quantities) for product_id, quantities in self._holds.items()
+        }
@@ -0,0 +1,232 @@
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from shopping_cart.data_model.base import StoreSession
+
+# URL of a store kept in memory
+IN_MEMORY_URL = "sqlite://"
+
+# pragmas of the connections of a file-backed SQLite store: readers
+# do not block the writer nor each other (WAL), commits are synced at
+# checkpoints only, and the pages are cached (64 MB) and memory-mapped
+# (256 MB) so several processes serving the same file share the pages
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64_000,
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5_000,
+}
+
+# key of the flag of the info of a session set while
+# its transaction holds a connection
+_IN_TRANSACTION_KEY = "store_handle_in_transaction"
+
+
+def is_in_memory(
+        url: str
+) -> bool:
+    """
+    Whether a database URL is of an in-memory SQLite database
+    """
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+class StoreHandle:
+    """
+    A handle of a store database owning its engine, its connection
+    pool and a factory of a session per thread
+
+    An in-memory store has a single connection (StaticPool), so every
+    session sees the same database, and the same transaction; its
+    sessions are borrowed one at a time. A file-backed or server
+    store has a pool of connections (QueuePool), and threads borrow
+    their sessions concurrently. Either way a transaction left open
+    by a borrow is rolled back when the borrow ends, so no thread
+    sees nor ends the transaction of another, nor waits for it.
+
+    A cart given a handle rather than a session borrows the session
+    of the calling thread for each operation, so the carts of a store
+    can be served by many threads.
+
+    Attributes
+    ----------
+    url
+        URL of the store database
+    engine
+        engine of the store database
+    sessions
+        the session of each thread
+
+    """
+
+    def __init__(
+            self,
+            url: str = IN_MEMORY_URL,
+            pool_size: int = 5,
+            max_overflow: int = 10,
+            pool_timeout: float = 30,
+            pragmas: Optional[Dict[str, Union[str, int]]] = None
+    ):
+        """
+
+        Parameters
+        ----------
+        url
+            URL of the store database. Default = "sqlite://", i.e.
+            in memory
+        pool_size
+            number of connections kept open, unless in memory. Default = 5
+        max_overflow
+            number of connections opened beyond the pool size under
+            load, unless in memory. Default = 10
+        pool_timeout
+            seconds to wait for a connection of a full pool. Default = 30
+        pragmas
+            pragmas set on each new connection of a file-backed SQLite
+            store. Default = None, i.e. DEFAULT_PRAGMAS
+
+        """
+
+        self.url = url
+        connect_args = {}
+        if make_url(url).get_backend_name() == "sqlite":
+            # connections are handed between threads by the pool
+            connect_args["check_same_thread"] = False
+
+        if is_in_memory(url):
+            self.engine = create_engine(
+                url,
+                poolclass=StaticPool,
+                connect_args=connect_args
+            )
+            # a single connection, so one session at a time
+            self._lock = threading.RLock()
+        else:
+            self.engine = create_engine(
+                url,
+                poolclass=QueuePool,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+                connect_args=connect_args
+            )
+            self._lock = None
+
+            if make_url(url).get_backend_name() == "sqlite":
+                _set_pragmas(
+                    self.engine, DEFAULT_PRAGMAS if pragmas is None else pragmas
+                )
+
+        # number of nested borrows of each thread
+        self._borrowed = threading.local()
+
+        factory = sessionmaker(bind=self.engine, class_=StoreSession)
+        event.listen(factory, "after_begin", _mark_begun)
+        event.listen(factory, "after_transaction_end", _mark_ended)
+        self.sessions = scoped_session(factory)
+
+    def __enter__(self) -> "StoreHandle":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.dispose()
+
+    def session(self) -> Session:
+        """
+        The session of the calling thread
+        """
+        return self.sessions()
+
+    @contextmanager
+    def borrow(self) -> Iterator[Session]:
+        """
+        Borrow the session of the calling thread for an operation,
+        rolling back its transaction if the operation fails, or if
+        it is left open when the outermost borrow of the thread ends.
+        The borrows of an in-memory store are serialized
+
+        Yields
+        ------
+            the session
+
+        """
+        with nullcontext() if self._lock is None else self._lock:
+            depth = getattr(self._borrowed, "depth", 0)
+            self._borrowed.depth = depth + 1
+            try:
+                session = self.sessions()
+                try:
+                    yield session
+                except Exception:
+                    session.rollback()
+                    raise
+
+                if depth == 0 and session.info.get(_IN_TRANSACTION_KEY):
+                    session.rollback()
+            finally:
+                self._borrowed.depth = depth
+
+    def remove(self):
+        """
+        Close the session of the calling thread, e.g. when
+        a worker thread finishes
+        """
+        self.sessions.remove()
+
+    def dispose(self):
+        """
+        Close the session of the calling thread and all the
+        connections of the pool
+        """
+        self.sessions.remove()
+        self.engine.dispose()
+
+
+def _mark_begun(
+        session: Session,
+        transaction,
+        connection
+):
+    """
+    Flag a session whose transaction holds a connection
+    """
+    session.info[_IN_TRANSACTION_KEY] = True
+
+
+def _mark_ended(
+        session: Session,
+        transaction
+):
+    """
+    Clear the flag of a session once its transaction has ended
+    """
+    if transaction.parent is None:
+        session.info.pop(_IN_TRANSACTION_KEY, None)
+
+
+def _set_pragmas(
+        engine,
+        pragmas: Dict[str, Union[str, int]]
+):
+    """
+    Set pragmas on each new connection of an SQLite engine
+    """
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
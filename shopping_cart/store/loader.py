@@ -0,0 +1,147 @@
+from typing import IO, Iterator, Union
+
+import yaml
+
+from shopping_cart.exc import InvalidValue
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+
+def iter_products(
+        stream: Union[str, bytes, IO]
+) -> Iterator[dict]:
+    """
+    Lazily parse the products of a store products configuration,
+    one product at a time
+
+    Only the parser events of the current product are held in
+    memory, so the size of the configuration file does not matter.
+    The C (libyaml) parser is used when available.
+
+    Parameters
+    ----------
+    stream
+        store products configuration YAML, i.e. an open file or
+        a string, with a top-level `products` sequence
+
+    Yields
+    ------
+        configuration data of a single product
+
+    Raises
+    ------
+    InvalidValue
+        If the configuration has no `products` sequence or uses
+        YAML aliases
+
+    """
+
+    loader = SafeLoader(stream)
+    try:
+        _expect(loader, yaml.StreamStartEvent)
+        _expect(loader, yaml.DocumentStartEvent)
+        _expect(loader, yaml.MappingStartEvent)
+
+        found = False
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _construct(loader, loader.get_event())
+            if key != "products":
+                _skip(loader, loader.get_event())
+                continue
+
+            found = True
+            _expect(loader, yaml.SequenceStartEvent)
+            while not loader.check_event(yaml.SequenceEndEvent):
+                yield _construct(loader, loader.get_event())
+            loader.get_event()
+
+        if not found:
+            raise InvalidValue(
+                "No products found in the store products configuration."
+            )
+    finally:
+        loader.dispose()
+
+
+def _expect(
+        loader: SafeLoader,
+        event_type: type
+) -> yaml.Event:
+    """
+    Consume the next parser event, which must be of the given type
+    """
+    event = loader.get_event()
+    if not isinstance(event, event_type):
+        raise InvalidValue(
+            f"Invalid store products configuration, expected "
+            f"{event_type.__name__} but found {type(event).__name__} "
+            f"at {event.start_mark}."
+        )
+
+    return event
+
+
+def _construct(
+        loader: SafeLoader,
+        event: yaml.Event
+):
+    """
+    Build the python object of the node starting with the given
+    event, consuming its remaining events
+
+    Scalars are resolved and constructed by the loader itself, so
+    values come out exactly as from `yaml.safe_load`, but nothing is
+    kept in the loader's object cache between products.
+    """
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(
+            tag, event.value, event.start_mark, event.end_mark, style=event.style
+        )
+        constructor = loader.yaml_constructors.get(
+            tag, loader.yaml_constructors[None]
+        )
+        return constructor(loader, node)
+
+    if isinstance(event, yaml.SequenceStartEvent):
+        values = []
+        while not loader.check_event(yaml.SequenceEndEvent):
+            values.append(_construct(loader, loader.get_event()))
+        loader.get_event()
+        return values
+
+    if isinstance(event, yaml.MappingStartEvent):
+        mapping = {}
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _construct(loader, loader.get_event())
+            mapping[key] = _construct(loader, loader.get_event())
+        loader.get_event()
+        return mapping
+
+    raise InvalidValue(
+        f"Unsupported YAML node {type(event).__name__} in the store products "
+        f"configuration at {event.start_mark}."
+    )
+
+
+def _skip(
+        loader: SafeLoader,
+        event: yaml.Event
+):
+    """
+    Consume the events of the node starting with the given event
+    without building it
+    """
+    depth = int(isinstance(event, (yaml.SequenceStartEvent, yaml.MappingStartEvent)))
+    while depth:
+        event = loader.get_event()
+        if isinstance(event, (yaml.SequenceStartEvent, yaml.MappingStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.SequenceEndEvent, yaml.MappingEndEvent)):
+            depth -= 1
@@ -1,22 +1,95 @@
-from copy import deepcopy
-from itertools import count
+from itertools import count, islice
 import logging
+from typing import Callable, Iterable, List, Optional
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from shopping_cart import data_model as m
+from shopping_cart.exc import InvalidValue
 
 logger = logging.getLogger(__name__)
 
+# number of item rows written per INSERT statement in bulk mode
+DEFAULT_CHUNK_SIZE = 10000
 
-_default_product_id = count()
-_default_offer_id = count()
-_default_item_id = count()
+
+class IdAllocator:
+    """
+    Allocator of the ids of the products, offers and items added to
+    a store, so the ids of a store only depend on its own rows and
+    several stores can be populated side by side
+
+    Attributes
+    ----------
+    product_ids
+        the next product ids
+    offer_ids
+        the next discount offer ids
+    item_ids
+        the next item ids
+
+    """
+
+    def __init__(
+            self,
+            product_id: int = 1,
+            offer_id: int = 1,
+            item_id: int = 1
+    ):
+        """
+
+        Parameters
+        ----------
+        product_id
+            first product id. Default = 1
+        offer_id
+            first discount offer id. Default = 1
+        item_id
+            first item id. Default = 1
+
+        """
+        self.product_ids = count(product_id)
+        self.offer_ids = count(offer_id)
+        self.item_ids = count(item_id)
+
+    @classmethod
+    def for_store(
+            cls,
+            session: Session
+    ) -> "IdAllocator":
+        """
+        Allocator of the ids following the largest ids of a store
+
+        Parameters
+        ----------
+        session
+            store product database
+
+        Returns
+        -------
+            the allocator
+
+        """
+        product_id, offer_id, item_id = session.query(
+            session.query(func.max(m.Product.id)).as_scalar(),
+            session.query(func.max(m.DiscountOffer.id)).as_scalar(),
+            session.query(func.max(m.Item.id)).as_scalar()
+        ).one()
+
+        return cls(
+            (product_id or 0) + 1,
+            (offer_id or 0) + 1,
+            (item_id or 0) + 1
+        )
 
 
 def populate(
         model_dict: dict,
-        session: Session
+        session: Session,
+        bulk: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        ids: Optional[IdAllocator] = None
 ):
     """
     Parse product data from YAML and add it to the store database
@@ -27,37 +100,266 @@ def populate(
         store products configuration data
     session
         store product database
+    bulk
+        If True, write products, offers and items with set-based
+        inserts instead of one ORM object per row. Both modes
+        produce the same rows. Default = False
+    chunk_size
+        number of item rows per INSERT statement in bulk mode
+    ids
+        allocator of the ids of the new rows. Default = None,
+        i.e. following the largest ids of the store
+
+    """
+
+    populate_products(
+        model_dict["products"],
+        session,
+        bulk=bulk,
+        chunk_size=chunk_size,
+        ids=ids
+    )
+
+
+def populate_products(
+        products: Iterable[dict],
+        session: Session,
+        bulk: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        batch_size: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        ids: Optional[IdAllocator] = None
+):
+    """
+    Add products to the store database, committing every
+    `batch_size` products
+
+    Together with a lazy iterable of products, e.g.
+    `shopping_cart.store.loader.iter_products`, memory use is bounded
+    by the batch size rather than the size of the catalog.
+
+    Parameters
+    ----------
+    products
+        iterable of product configuration data
+    session
+        store product database
+    bulk
+        If True, use set-based inserts. Default = False
+    chunk_size
+        number of item rows per INSERT statement in bulk mode
+    batch_size
+        number of products per transaction. Default = None,
+        i.e. a single commit once all products are added
+    progress
+        Called after each commit with the total number of
+        products and items added so far
+    ids
+        allocator of the ids of the new rows. Default = None,
+        i.e. following the largest ids of the store
+
+    Raises
+    ------
+    InvalidValue
+        If the batch size or the chunk size is non-positive
 
     """
-    model_dict = deepcopy(model_dict)
 
-    for product in model_dict["products"]:
+    if batch_size is not None and batch_size <= 0:
+        raise InvalidValue(
+            f"Batch size must be positive. {batch_size} is given."
+        )
+    if chunk_size <= 0:
+        raise InvalidValue(
+            f"Chunk size must be positive. {chunk_size} is given."
+        )
+
+    if ids is None:
+        ids = IdAllocator.for_store(session)
+
+    number_of_products = 0
+    number_of_items = 0
+
+    def _commit(batch):
+        nonlocal number_of_products, number_of_items
+
+        if bulk:
+            _bulk_add_products(batch, session, ids, chunk_size)
+        else:
+            for product in batch:
+                _add_product(product, session, ids)
+        session.commit()
+
+        number_of_products += len(batch)
+        number_of_items += sum(
+            product["number_in_store"] for product in batch
+        )
+        logger.info(
+            f"Committed {number_of_products} products "
+            f"and {number_of_items} items"
+        )
+        if progress is not None:
+            progress(number_of_products, number_of_items)
+
+    batch = []
+    for product in products:
+        batch.append(product)
+        if batch_size is not None and len(batch) == batch_size:
+            _commit(batch)
+            batch = []
+
+    if batch or number_of_products == 0:
+        _commit(batch)
+
+
+def _add_product(
+        product: dict,
+        session: Session,
+        ids: IdAllocator
+):
+    """
+    Add a product, its promotion offer and its items
+    to the session as ORM objects
+
+    Parameters
+    ----------
+    product
+        product configuration data
+    session
+        store product database
+    ids
+        allocator of the ids of the new rows
+
+    """
+
+    logger.info(f'Adding product {product["name"]}')
+
+    # Promotion offer associated to the product
+    promotion_offer = None
+    if "promotion" in product:
+        promotion = product["promotion"]
+        promotion_offer = m.DiscountOffer(
+            id=next(ids.offer_ids),
+            required_quantity=promotion["required_quantity"],
+            percentage=promotion["percentage"]
+        )
+
+    # Stock of a product which is not serial-tracked is only counted
+    is_serial_tracked = product.get("serial_tracked", True)
+
+    product_instance = m.Product(
+        id=next(ids.product_ids),
+        name=product["name"],
+        unit_price=product["unit_price"],
+        is_serial_tracked=is_serial_tracked,
+        number_available=0 if is_serial_tracked else product["number_in_store"],
+        number_reserved=0,
+        discount_offer=promotion_offer
+    )
+
+    session.add(product_instance)
+
+    if not is_serial_tracked:
+        return
+
+    for _ in range(product["number_in_store"]):
+        session.add(
+            m.Item(
+                id=next(ids.item_ids),
+                product=product_instance
+            )
+        )
+
+
+def _bulk_add_products(
+        products: List[dict],
+        session: Session,
+        ids: IdAllocator,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+):
+    """
+    Add products, promotion offers and items to the store
+    database with executemany inserts
+
+    Products and offers are still constructed as (transient) ORM
+    objects so that their values are validated, but items are
+    written as plain rows in chunks of `chunk_size`, so the cost
+    per item is a tuple rather than an ORM object.
+
+    Parameters
+    ----------
+    products
+        list of product configuration data
+    session
+        store product database
+    ids
+        allocator of the ids of the new rows
+    chunk_size
+        number of item rows per INSERT statement
+
+    """
+
+    instances = []
+    offers = []
+    stock = []
+    for product in products:
 
         logger.info(f'Adding product {product["name"]}')
 
-        # Promotion offer associated to the product
-        promotion_offer = None
+        offer_id = None
         if "promotion" in product:
-            promotion = product["promotion"]
-            promotion_offer = m.DiscountOffer(
-                id=next(_default_offer_id),
-                required_quantity=promotion["required_quantity"],
-                percentage=promotion["percentage"]
-            )
+            offer_id = next(ids.offer_ids)
 
-        product_instance = m.Product(
-            id=next(_default_product_id),
-            name=product["name"],
-            unit_price=product["unit_price"],
-            discount_offer=promotion_offer
+        is_serial_tracked = product.get("serial_tracked", True)
+
+        product_id = next(ids.product_ids)
+        instances.append(
+            m.Product(
+                id=product_id,
+                name=product["name"],
+                unit_price=product["unit_price"],
+                is_serial_tracked=is_serial_tracked,
+                number_available=0 if is_serial_tracked else product["number_in_store"],
+                number_reserved=0
+            )
         )
 
-        for _ in range(product["number_in_store"]):
-            session.add(
-                m.Item(
-                    id=next(_default_item_id),
-                    product=product_instance
+        if offer_id is not None:
+            promotion = product["promotion"]
+            offers.append(
+                m.DiscountOffer(
+                    id=offer_id,
+                    required_quantity=promotion["required_quantity"],
+                    percentage=promotion["percentage"],
+                    product_id=product_id
                 )
             )
 
-    session.commit()
+        if is_serial_tracked:
+            stock.append(
+                (product_id, product["number_in_store"])
+            )
+
+    session.bulk_save_objects(instances)
+    session.bulk_save_objects(offers)
+    if instances:
+        # bulk saves bypass the session events which version the catalog
+        m.bump_catalog_version(session)
+
+    insert_items = m.Item.__table__.insert()
+    for product_id, number_in_store in stock:
+        remaining = number_in_store
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            session.execute(
+                insert_items,
+                [
+                    {
+                        "id": item_id,
+                        "product_id": product_id,
+                        "is_available": True
+                    }
+                    for item_id in islice(ids.item_ids, size)
+                ]
+            )
+            remaining -= size
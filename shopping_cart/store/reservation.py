@@ -0,0 +1,810 @@
+from datetime import datetime, timedelta
+import logging
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, inspect, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import (
+    InstanceNotFound, InvalidValue, OverDemand, ReservationExpired
+)
+
+logger = logging.getLogger(__name__)
+
+# how long reserved units are held for a shopping cart
+DEFAULT_TTL = timedelta(minutes=15)
+
+_item = m.Item.__table__
+_product = m.Product.__table__
+_reservation = m.Reservation.__table__
+
+
+def reserve(
+        session: Session,
+        product_name: str,
+        quantity: int,
+        cart_id: str,
+        ttl: timedelta = DEFAULT_TTL,
+        is_random: bool = False,
+        now: Optional[datetime] = None,
+        commit: bool = True,
+        rng: Optional[random.Random] = None
+) -> m.Reservation:
+    """
+    Reserve N available units of a product for a shopping cart
+
+    Units are claimed with conditional UPDATEs which only touch
+    units that are still available, so concurrent reservations
+    never claim the same unit without any locking in python.
+
+    Parameters
+    ----------
+    session
+        A store database session
+    product_name
+        name of the product
+    quantity
+        number of units to reserve
+    cart_id
+        identifier of the shopping cart
+    ttl
+        how long the units are held before they can be released
+    is_random
+        If True, randomly pick the reserved items of a
+        serial-tracked product. Default = False
+    now
+        current (UTC) time. Default = datetime.utcnow()
+    commit
+        If True, commit the reservation, or roll back if it
+        fails. Default = True
+    rng
+        random number generator of the random picks, e.g.
+        random.Random(seed). Default = the `random` module
+
+    Returns
+    -------
+        the reservation
+
+    Raises
+    ------
+    InvalidValue
+        If the request quantity is non-positive
+    OverDemand
+        If request to reserve more units than what is available
+        in the database
+
+    """
+
+    if quantity <= 0:
+        raise InvalidValue(
+            "Quantity request must be positive."
+        )
+
+    product = m.Product.with_name(session, product_name)
+
+    reservation = m.Reservation(
+        cart_id=cart_id,
+        quantity=quantity,
+        expires_at=(now or datetime.utcnow()) + ttl,
+        product_id=product.id
+    )
+    session.add(reservation)
+
+    try:
+        session.flush()
+        _claim(session, product, reservation, is_random, rng)
+    except Exception:
+        if commit:
+            session.rollback()
+        raise
+
+    if commit:
+        session.commit()
+    else:
+        # refresh the claimed items already loaded in the session
+        session.query(
+            m.Item
+        ).filter(
+            m.Item.reservation_id == reservation.id
+        ).populate_existing().all()
+
+    return reservation
+
+
+def reserve_order(
+        session: Session,
+        order: Dict[str, int],
+        cart_id: str,
+        ttl: timedelta = DEFAULT_TTL,
+        is_random: bool = False,
+        now: Optional[datetime] = None,
+        rng: Optional[random.Random] = None
+) -> List[m.Reservation]:
+    """
+    Reserve the units of several products for a shopping cart
+    in one transaction, all or nothing
+
+    All the products are looked up in one query and their available
+    stock is checked in one grouped query. The reservations are then
+    inserted, one INSERT per product as each needs its generated id,
+    and their units are claimed with one UPDATE for the products which
+    are not serial-tracked and one for the items of the serial-tracked
+    ones. Random picks are sampled product by product, see
+    `Item.sample_available_ids`. Should fewer units be claimed than
+    checked, e.g. as they were taken by another cart in between, the
+    claims are made again product by product as in `reserve`.
+
+    Parameters
+    ----------
+    session
+        A store database session
+    order
+        quantity to reserve by product name
+    cart_id
+        identifier of the shopping cart
+    ttl
+        how long the units are held before they can be released
+    is_random
+        If True, randomly pick the reserved items of
+        serial-tracked products. Default = False
+    now
+        current (UTC) time. Default = datetime.utcnow()
+    rng
+        random number generator of the random picks, e.g.
+        random.Random(seed). Default = the `random` module
+
+    Returns
+    -------
+        the reservations, in the order of the products in the order,
+        with their products and items loaded
+
+    Raises
+    ------
+    InvalidValue
+        If any request quantity is non-positive
+    InstanceNotFound
+        If any product name is not found
+    OverDemand
+        If request to reserve more units than what is available for
+        any product, listing every product short of stock
+
+    """
+
+    if any(quantity <= 0 for quantity in order.values()):
+        raise InvalidValue(
+            "Quantity request must be positive."
+        )
+
+    products = {
+        product.name: product
+        for product in session.query(
+            m.Product
+        ).filter(
+            m.Product.name.in_(order)
+        )
+    }
+
+    missing = [name for name in order if name not in products]
+    if missing:
+        raise InstanceNotFound(
+            f"Product {', '.join(missing)} not found."
+        )
+
+    available = {
+        product.id: product.number_available
+        for product in products.values()
+        if not product.is_serial_tracked
+    }
+    serial_tracked_ids = [
+        product.id for product in products.values()
+        if product.is_serial_tracked
+    ]
+    if serial_tracked_ids:
+        available.update(
+            session.query(
+                m.Item.product_id, func.count(m.Item.id)
+            ).filter(
+                m.Item.product_id.in_(serial_tracked_ids),
+                m.Item.is_available
+            ).group_by(
+                m.Item.product_id
+            )
+        )
+
+    _check_stock(
+        {
+            name: (available.get(products[name].id, 0), quantity)
+            for name, quantity in order.items()
+        }
+    )
+
+    expires_at = (now or datetime.utcnow()) + ttl
+
+    def _add_reservations():
+        added = [
+            m.Reservation(
+                cart_id=cart_id,
+                quantity=quantity,
+                expires_at=expires_at,
+                product_id=products[name].id
+            )
+            for name, quantity in order.items()
+        ]
+        session.add_all(added)
+        session.flush()
+        return added
+
+    try:
+        reservations = _add_reservations()
+        claims = [
+            (products[name], reservation)
+            for name, reservation in zip(order, reservations)
+        ]
+        if not _claim_all(session, claims, is_random, rng):
+            # claim again product by product to find the shortfall
+            session.rollback()
+            reservations = _add_reservations()
+            for reservation, name in zip(reservations, order):
+                _claim(session, products[name], reservation, is_random, rng)
+    except Exception:
+        session.rollback()
+        raise
+
+    # read before committing, which expires the reservations
+    reservation_ids = [reservation.id for reservation in reservations]
+    session.commit()
+
+    loaded = {
+        reservation.id: reservation
+        for reservation in session.query(
+            m.Reservation
+        ).filter(
+            m.Reservation.id.in_(reservation_ids)
+        ).options(
+            joinedload(m.Reservation.product),
+            selectinload(m.Reservation.items)
+        )
+    }
+
+    return [loaded[reservation_id] for reservation_id in reservation_ids]
+
+
+def _check_stock(
+        stock: Dict[str, Tuple[int, int]]
+):
+    """
+    Raise an OverDemand listing every product short of stock,
+    given (available, requested) quantities by product name
+    """
+
+    shortages = [
+        f"only {available} of {name} is available, but {quantity} is requested"
+        for name, (available, quantity) in stock.items()
+        if available < quantity
+    ]
+    if shortages:
+        raise OverDemand(
+            f"Excess demand request. {'; '.join(shortages)}."
+        )
+
+
+def _claim(
+        session: Session,
+        product: m.Product,
+        reservation: m.Reservation,
+        is_random: bool,
+        rng: Optional[random.Random] = None
+):
+    """
+    Claim the units of a (flushed) reservation
+
+    Raises
+    ------
+    OverDemand
+        If fewer units than reserved are available
+
+    """
+
+    quantity = reservation.quantity
+    if product.is_serial_tracked:
+        claimed = _claim_items(session, product, reservation, quantity, is_random, rng)
+    else:
+        claimed = _claim_units(session, product, quantity)
+
+    if claimed < quantity:
+        raise OverDemand(
+            f"Excess demand request. Only "
+            f"{claimed} is available, but {quantity} is requested."
+        )
+
+
+def _claim_all(
+        session: Session,
+        claims: List[Tuple[m.Product, m.Reservation]],
+        is_random: bool,
+        rng: Optional[random.Random] = None
+) -> bool:
+    """
+    Claim the units of (flushed) reservations of several products,
+    with one UPDATE for the products which are not serial-tracked and
+    one for the items of the serial-tracked ones, given (product,
+    reservation) pairs, and return whether every unit was claimed
+    """
+
+    counted = [
+        (product, reservation) for product, reservation in claims
+        if not product.is_serial_tracked
+    ]
+    tracked = [
+        (product, reservation) for product, reservation in claims
+        if product.is_serial_tracked
+    ]
+
+    claimed = 0
+    if counted:
+        claimed += session.execute(
+            _product.update().where(
+                and_(
+                    _product.c.id == bindparam("claim_product_id"),
+                    _product.c.number_available >= bindparam("claim_quantity")
+                )
+            ).values(
+                number_available=_product.c.number_available - bindparam("claim_quantity"),
+                number_reserved=_product.c.number_reserved + bindparam("claim_quantity")
+            ),
+            [
+                {"claim_product_id": product.id, "claim_quantity": reservation.quantity}
+                for product, reservation in counted
+            ]
+        ).rowcount
+        for product, _ in counted:
+            session.expire(product, ["number_available", "number_reserved"])
+
+    if tracked and is_random:
+        item_ids = [
+            item_id
+            for product, reservation in tracked
+            for item_id in m.Item.sample_available_ids(
+                session, product.id, reservation.quantity, rng
+            )
+        ]
+        claimed += session.execute(
+            _item.update().where(
+                and_(_item.c.id.in_(item_ids), _item.c.is_available)
+            ).values(
+                is_available=False,
+                reservation_id=case(
+                    {product.id: reservation.id for product, reservation in tracked},
+                    value=_item.c.product_id
+                )
+            )
+        ).rowcount
+    elif tracked:
+        claimed += session.execute(
+            _item.update().where(
+                and_(
+                    _item.c.id.in_(
+                        select(
+                            [_item.c.id]
+                        ).where(
+                            and_(
+                                _item.c.product_id == bindparam("claim_product_id"),
+                                _item.c.is_available
+                            )
+                        ).order_by(
+                            _item.c.id
+                        ).limit(
+                            bindparam("claim_quantity")
+                        )
+                    ),
+                    _item.c.is_available
+                )
+            ).values(
+                is_available=False,
+                reservation_id=bindparam("claim_reservation_id")
+            ),
+            [
+                {
+                    "claim_product_id": product.id,
+                    "claim_quantity": reservation.quantity,
+                    "claim_reservation_id": reservation.id
+                }
+                for product, reservation in tracked
+            ]
+        ).rowcount
+
+    # a counted product is claimed by one row, an item by one row each
+    return claimed == len(counted) + sum(
+        reservation.quantity for _, reservation in tracked
+    )
+
+
+def _claim_items(
+        session: Session,
+        product: m.Product,
+        reservation: m.Reservation,
+        quantity: int,
+        is_random: bool,
+        rng: Optional[random.Random] = None
+) -> int:
+    """
+    Claim up to N available items of a serial-tracked product
+    for a reservation, and return how many were claimed
+
+    Items claimed concurrently between choosing and updating them
+    are skipped by the `is_available` condition, and the shortfall
+    is claimed again from the remaining items.
+    """
+
+    claimed = 0
+    while claimed < quantity:
+        remaining = quantity - claimed
+
+        if is_random:
+            item_ids = m.Item.sample_available_ids(session, product.id, remaining, rng)
+            if not item_ids:
+                break
+            chosen = _item.c.id.in_(item_ids)
+        else:
+            chosen = _item.c.id.in_(
+                select(
+                    [_item.c.id]
+                ).where(
+                    and_(
+                        _item.c.product_id == product.id,
+                        _item.c.is_available
+                    )
+                ).order_by(
+                    _item.c.id
+                ).limit(
+                    remaining
+                )
+            )
+
+        count = session.execute(
+            _item.update().where(
+                and_(chosen, _item.c.is_available)
+            ).values(
+                is_available=False,
+                reservation_id=reservation.id
+            )
+        ).rowcount
+        if count == 0:
+            break
+
+        claimed += count
+
+    return claimed
+
+
+def _claim_units(
+        session: Session,
+        product: m.Product,
+        quantity: int
+) -> int:
+    """
+    Claim N units of a product which is not serial-tracked,
+    and return how many were claimed, i.e. N or the number
+    available if fewer
+    """
+
+    while True:
+        count = session.execute(
+            _product.update().where(
+                and_(
+                    _product.c.id == product.id,
+                    _product.c.number_available >= quantity
+                )
+            ).values(
+                number_available=_product.c.number_available - quantity,
+                number_reserved=_product.c.number_reserved + quantity
+            )
+        ).rowcount
+
+        session.expire(product, ["number_available", "number_reserved"])
+        if count:
+            return quantity
+
+        # units may have been returned since the update
+        if product.number_available < quantity:
+            return product.number_available
+
+
+def release(
+        session: Session,
+        reservation: m.Reservation,
+        quantity: Optional[int] = None,
+        commit: bool = True
+) -> int:
+    """
+    Return reserved units to the store
+
+    Parameters
+    ----------
+    session
+        A store database session
+    reservation
+        the reservation
+    quantity
+        number of units to release. Default = None, i.e.
+        release all the reserved units
+    commit
+        If True, commit the release. Default = True
+
+    Returns
+    -------
+        number of units released, zero if the reservation has
+        already been released
+
+    """
+
+    if reservation not in session or not _is_active(session, reservation):
+        return 0
+
+    if quantity is None or quantity > reservation.quantity:
+        quantity = reservation.quantity
+
+    if reservation.product.is_serial_tracked:
+        session.execute(
+            _item.update().where(
+                _item.c.id.in_(
+                    select(
+                        [_item.c.id]
+                    ).where(
+                        _item.c.reservation_id == reservation.id
+                    ).order_by(
+                        _item.c.id.desc()
+                    ).limit(
+                        quantity
+                    )
+                )
+            ).values(
+                is_available=True,
+                reservation_id=None
+            )
+        )
+    else:
+        _return_units(session, [(reservation.product_id, quantity)])
+
+    reservation.quantity -= quantity
+    if reservation.quantity == 0:
+        session.delete(reservation)
+
+    if commit:
+        session.commit()
+    else:
+        session.flush()
+        session.expire_all()
+
+    return quantity
+
+
+def confirm(
+        session: Session,
+        reservation: m.Reservation,
+        commit: bool = True
+):
+    """
+    Check out reserved units, i.e. the units leave the store
+    and the reservation is removed
+
+    Parameters
+    ----------
+    session
+        A store database session
+    reservation
+        the reservation
+    commit
+        If True, commit the checkout. Default = True
+
+    Raises
+    ------
+    ReservationExpired
+        If the reservation has been released
+
+    """
+
+    if reservation not in session or not _is_active(session, reservation):
+        raise ReservationExpired(
+            "The reservation has already been released."
+        )
+
+    if reservation.product.is_serial_tracked:
+        session.execute(
+            _item.update().where(
+                _item.c.reservation_id == reservation.id
+            ).values(
+                reservation_id=None
+            )
+        )
+    else:
+        session.execute(
+            _product.update().where(
+                _product.c.id == reservation.product_id
+            ).values(
+                number_reserved=_product.c.number_reserved - reservation.quantity
+            )
+        )
+
+    session.delete(reservation)
+
+    if commit:
+        session.commit()
+    else:
+        session.expire_all()
+
+
+def release_expired(
+        session: Session,
+        now: Optional[datetime] = None
+) -> int:
+    """
+    Return the units of all expired reservations to the
+    store in bulk
+
+    Parameters
+    ----------
+    session
+        A store database session
+    now
+        current (UTC) time. Default = datetime.utcnow()
+
+    Returns
+    -------
+        number of expired reservations released
+
+    """
+
+    now = now or datetime.utcnow()
+    expired = select(
+        [_reservation.c.id]
+    ).where(
+        _reservation.c.expires_at <= now
+    )
+
+    session.execute(
+        _item.update().where(
+            _item.c.reservation_id.in_(expired)
+        ).values(
+            is_available=True,
+            reservation_id=None
+        )
+    )
+
+    _return_units(
+        session,
+        session.execute(
+            select(
+                [_reservation.c.product_id, func.sum(_reservation.c.quantity)]
+            ).select_from(
+                _reservation.join(_product)
+            ).where(
+                and_(
+                    _reservation.c.expires_at <= now,
+                    _product.c.is_serial_tracked.is_(False)
+                )
+            ).group_by(
+                _reservation.c.product_id
+            )
+        ).fetchall()
+    )
+
+    count = session.execute(
+        _reservation.delete().where(
+            _reservation.c.expires_at <= now
+        )
+    ).rowcount
+
+    session.commit()
+
+    if count:
+        logger.info(f"Released {count} expired reservations")
+
+    return count
+
+
+def _return_units(
+        session: Session,
+        quantities: List[tuple]
+):
+    """
+    Move reserved units of products which are not serial-tracked
+    back to their available stock, given (product id, quantity) pairs
+    """
+    if not quantities:
+        return
+
+    session.execute(
+        _product.update().where(
+            _product.c.id == bindparam("product_id")
+        ).values(
+            number_available=_product.c.number_available + bindparam("quantity"),
+            number_reserved=_product.c.number_reserved - bindparam("quantity")
+        ),
+        [
+            {"product_id": product_id, "quantity": quantity}
+            for product_id, quantity in quantities
+        ]
+    )
+
+
+def _is_active(
+        session: Session,
+        reservation: m.Reservation
+) -> bool:
+    """
+    Whether the reservation still exists in the database,
+    i.e. it has not been released by the sweeper
+    """
+    # the identity is known without loading the (possibly deleted) row
+    identity = inspect(reservation).identity
+    if identity is None:
+        return False
+
+    return session.query(
+        m.Reservation
+    ).filter(
+        m.Reservation.id == identity[0]
+    ).count() > 0
+
+
+class ReservationSweeper(threading.Thread):
+    """
+    A background thread releasing expired reservations
+    periodically
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Session],
+            interval: float = 60.0
+    ):
+        """
+
+        Parameters
+        ----------
+        session_factory
+            makes a new session of the store database, e.g. a
+            sessionmaker bound to a file-backed or shared engine
+        interval
+            seconds between sweeps. Default = 60
+
+        """
+        super().__init__(daemon=True)
+
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Failed to release expired reservations")
+
+    def sweep(self) -> int:
+        """
+        Release all expired reservations once
+
+        Returns
+        -------
+            number of expired reservations released
+
+        """
+        session = self.session_factory()
+        try:
+            return release_expired(session)
+        finally:
+            session.close()
+
+    def stop(self):
+        """
+        Stop sweeping and wait for the thread to finish
+        """
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,228 @@
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from shopping_cart import data_model as m
+
+logger = logging.getLogger(__name__)
+
+# number of carts written in one statement, under the SQLite
+# limit of the number of query parameters
+_CHUNK_SIZE = 500
+
+
+class CartWriter(threading.Thread):
+    """
+    A background thread persisting the changes of shopping carts
+    to the Cart and CartLine tables behind the carts in memory
+
+    A cart records its quantities on every change, which only
+    replaces the pending quantities of the cart, so any number of
+    changes of a cart between two flushes is one write. The pending
+    carts are written in one transaction every interval, or as soon
+    as the number of pending carts reaches the threshold, and once
+    more when the writer is stopped, including at interpreter exit.
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Session],
+            interval: float = 1.0,
+            max_pending: int = 1_000
+    ):
+        """
+
+        Parameters
+        ----------
+        session_factory
+            makes a new session of the store database, e.g. a
+            sessionmaker bound to a file-backed or shared engine
+        interval
+            seconds between flushes. Default = 1
+        max_pending
+            number of pending carts which triggers a flush
+            before the interval is over. Default = 1000
+
+        """
+        super().__init__(daemon=True)
+
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_pending = max_pending
+
+        # quantity of each product by product id, by cart id
+        self._pending: Dict[str, Dict[int, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+        self.flushes = 0
+        self.writes = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of carts with changes not written yet
+        """
+        return len(self._pending)
+
+    def record(
+            self,
+            cart_id: str,
+            quantities: Dict[int, int]
+    ):
+        """
+        Record the quantities of a cart to be written, an
+        empty cart is deleted
+
+        Parameters
+        ----------
+        cart_id
+            identifier of the cart
+        quantities
+            quantity of each product in the cart by product id
+
+        """
+        with self._lock:
+            self._pending[cart_id] = dict(quantities)
+            full = len(self._pending) >= self.max_pending
+
+        if full:
+            if self.is_alive():
+                self._wake.set()
+            else:
+                self.flush()
+
+    def start(self):
+        super().start()
+        atexit.register(self.stop)
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write the shopping carts")
+
+    def flush(self) -> int:
+        """
+        Write all the pending carts in one transaction. If the
+        transaction fails, the carts are pending again unless
+        they were changed since
+
+        Returns
+        -------
+            number of carts written
+
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+
+            if not batch:
+                return 0
+
+            session = self.session_factory()
+            try:
+                _write_carts(session, batch)
+                session.commit()
+            except Exception:
+                session.rollback()
+                with self._lock:
+                    for cart_id, quantities in batch.items():
+                        self._pending.setdefault(cart_id, quantities)
+                raise
+            finally:
+                session.close()
+
+            self.flushes += 1
+            self.writes += len(batch)
+            return len(batch)
+
+    def stop(self):
+        """
+        Stop the writer, wait for the thread to finish and
+        write the carts still pending
+        """
+        self._stopped.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join()
+        atexit.unregister(self.stop)
+
+        self.flush()
+
+
+def _write_carts(
+        session: Session,
+        batch: Dict[str, Dict[int, int]]
+):
+    """
+    Replace the lines of the given carts with a fixed number of
+    statements per chunk of carts, deleting the empty carts
+    """
+    now = datetime.utcnow()
+    cart_ids = list(batch)
+
+    for start in range(0, len(cart_ids), _CHUNK_SIZE):
+        chunk = cart_ids[start:start + _CHUNK_SIZE]
+
+        session.query(
+            m.CartLine
+        ).filter(
+            m.CartLine.cart_id.in_(chunk)
+        ).delete(
+            synchronize_session=False
+        )
+
+        existing = {
+            cart_id for cart_id, in session.query(
+                m.Cart.id
+            ).filter(
+                m.Cart.id.in_(chunk)
+            )
+        }
+
+        empty = [cart_id for cart_id in chunk if not batch[cart_id]]
+        if empty:
+            session.query(
+                m.Cart
+            ).filter(
+                m.Cart.id.in_(empty)
+            ).delete(
+                synchronize_session=False
+            )
+
+        updated = [cart_id for cart_id in chunk if batch[cart_id] and cart_id in existing]
+        if updated:
+            session.query(
+                m.Cart
+            ).filter(
+                m.Cart.id.in_(updated)
+            ).update(
+                {m.Cart.updated_at: now},
+                synchronize_session=False
+            )
+
+        session.bulk_insert_mappings(
+            m.Cart,
+            [
+                dict(id=cart_id, created_at=now, updated_at=now)
+                for cart_id in chunk if batch[cart_id] and cart_id not in existing
+            ]
+        )
+        session.bulk_insert_mappings(
+            m.CartLine,
+            [
+                dict(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                for cart_id in chunk
+                for product_id, quantity in batch[cart_id].items()
+            ]
+        )
@@ -2,7 +2,7 @@ from pathlib import Path
 import pytest
 import yaml
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from shopping_cart import data_model as m
@@ -19,7 +19,7 @@ def make_store_session():
 
     """
     engine = create_engine('sqlite://')
-    session = sessionmaker(bind=engine)()
+    session = sessionmaker(bind=engine, class_=m.StoreSession)()
     m.Base.metadata.create_all(engine)
     yield session
     session.close()
@@ -63,3 +63,22 @@ def make_store_database(session):
     )
 
     return session
+
+
+@pytest.fixture(name="statements")
+def record_statements(session):
+    """
+    Pytest fixture recording the SQL statements executed
+    on the store database
+
+    """
+
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", _record)
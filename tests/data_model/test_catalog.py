@@ -0,0 +1,76 @@
+from sqlalchemy.orm import Session
+
+from shopping_cart import data_model as m
+
+
+class TestCatalogVersion:
+    """
+    Test the catalog version of a store follows
+    its prices, offers and promotions
+    """
+
+    def test_populate(self, store):
+        """
+        Test populating a store changes its catalog
+
+        """
+
+        assert m.catalog_version(store) > 0
+
+    def test_price_change(self, store):
+        """
+        Test only changes of the catalog bump the version
+
+        """
+
+        version = m.catalog_version(store)
+
+        product = m.Product.with_name(store, "A")
+        product.number_available = 5
+        store.commit()
+        assert m.catalog_version(store) == version
+
+        product.unit_price = 30
+        store.commit()
+        assert m.catalog_version(store) == version + 1
+
+        m.Product.with_name(store, "B").discount_offer.percentage = 10
+        store.commit()
+        assert m.catalog_version(store) == version + 2
+
+    def test_bulk_change(self, store):
+        """
+        Test changing the catalog with a query bumps the version
+
+        """
+
+        version = m.catalog_version(store)
+
+        store.query(m.DiscountOffer).delete()
+        store.commit()
+        assert m.catalog_version(store) == version + 1
+
+        store.query(m.Item).delete()
+        store.commit()
+        assert m.catalog_version(store) == version + 1
+
+    def test_other_session(self, store):
+        """
+        Test the changes of a session which is not a store session
+        do not bump the version, unless bumped explicitly
+
+        """
+
+        version = m.catalog_version(store)
+
+        session = Session(bind=store.get_bind())
+        m.Product.with_name(session, "A").unit_price = 30
+        session.flush()
+        assert m.catalog_version(session) == version
+
+        m.bump_catalog_version(session)
+        session.flush()
+        assert m.catalog_version(session) == version + 1
+
+        session.rollback()
+        session.close()
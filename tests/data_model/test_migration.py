@@ -0,0 +1,141 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.data_model import base
+from shopping_cart.data_model.migration import migrate, schema_version
+from shopping_cart.exc import InvalidValue
+
+# schema of the first version of the store
+_SCHEMA_VERSION_1 = [
+    "CREATE TABLE product ("
+    "id INTEGER NOT NULL PRIMARY KEY, name VARCHAR UNIQUE, unit_price FLOAT, "
+    "discount_offer_id INTEGER REFERENCES product (id))",
+    "CREATE TABLE discount_offer ("
+    "id INTEGER NOT NULL PRIMARY KEY, required_quantity INTEGER, percentage FLOAT, "
+    "product_id INTEGER REFERENCES product (id))",
+    "CREATE TABLE item ("
+    "id INTEGER NOT NULL PRIMARY KEY, is_available BOOLEAN, "
+    "product_id INTEGER REFERENCES product (id), CHECK (is_available IN (0, 1)))",
+]
+
+
+@pytest.fixture(name="engine")
+def make_engine(tmp_path):
+    """
+    Pytest fixture of an engine of an empty file-backed store
+
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    yield engine
+    engine.dispose()
+
+
+class TestMigrate:
+    """
+    Test the store schema migrations
+    """
+
+    def test_new_store(self, engine):
+        """
+        Test migrating an empty database creates the schema
+
+        """
+
+        assert migrate(engine) == 0
+
+        with engine.connect() as connection:
+            assert schema_version(connection) == base._schema_version
+
+        tables = set(inspect(engine).get_table_names())
+        assert {"product", "discount_offer", "item", "reservation", "cart", "cart_line"} <= tables
+
+        # migrating again does nothing
+        assert migrate(engine) == base._schema_version
+
+    def test_migrate_version_1(self, engine):
+        """
+        Test upgrading a store of the first schema version
+        keeps its data
+
+        """
+
+        with engine.begin() as connection:
+            for statement in _SCHEMA_VERSION_1:
+                connection.execute(statement)
+            connection.execute("INSERT INTO product VALUES (0, 'A', 10.5, NULL)")
+            connection.execute("INSERT INTO discount_offer VALUES (0, 2, 50, 0)")
+            connection.execute("INSERT INTO item VALUES (0, 1, 0), (1, 0, 0), (2, 1, 0)")
+
+            assert schema_version(connection) == 1
+
+        assert migrate(engine) == 1
+
+        session = sessionmaker(bind=engine, class_=m.StoreSession)()
+        product = m.Product.with_name(session, 'A')
+        assert product.unit_price == 10.5
+        assert product.unit_price_cents == 1050
+        assert product.is_serial_tracked is True
+        assert product.number_available == 0
+        assert product.discount_offer.percentage == 50
+        assert product.discount_offer.basis_points == 5000
+        assert [item.id for item in m.Product.pick(session, 'A', 2)] == [0, 2]
+        assert m.StoreSetting.get(session, "schema_version") == str(base._schema_version)
+        session.close()
+
+        indexes = {
+            index["name"]
+            for table in ("item", "discount_offer", "reservation")
+            for index in inspect(engine).get_indexes(table)
+        }
+        assert indexes == {
+            "ix_item_product_available",
+            "ix_item_reservation_id",
+            "ix_discount_offer_product_id",
+            "ix_reservation_expires_at"
+        }
+
+    def test_integer_prices_rounding(self, engine):
+        """
+        Test the cents and basis points of an upgraded store are
+        rounded as by the model validators, i.e. half to even
+
+        """
+
+        with engine.begin() as connection:
+            for statement in _SCHEMA_VERSION_1:
+                connection.execute(statement)
+            # 10.125 * 100 and 12.125 * 100 are exact halves
+            connection.execute("INSERT INTO product VALUES (0, 'A', 10.125, NULL)")
+            connection.execute("INSERT INTO discount_offer VALUES (0, 2, 12.125, 0)")
+            assert connection.execute("SELECT ROUND(10.125 * 100)").scalar() == 1013
+
+        migrate(engine)
+
+        session = sessionmaker(bind=engine, class_=m.StoreSession)()
+        product = m.Product.with_name(session, 'A')
+        assert product.unit_price_cents == 1012
+        assert product.discount_offer.basis_points == 1212
+        assert m.Product(unit_price=10.125).unit_price_cents == product.unit_price_cents
+        session.close()
+
+    def test_newer_version(self, engine):
+        """
+        Test migrating a store of a newer schema version
+
+        """
+
+        migrate(engine)
+        with engine.begin() as connection:
+            connection.execute(
+                "UPDATE store_setting SET value = '1000' WHERE key = 'schema_version'"
+            )
+
+        with pytest.raises(InvalidValue) as exc_info:
+            migrate(engine)
+
+        assert exc_info.match(
+            f"Store schema version 1000 is newer than the supported "
+            f"version {base._schema_version}."
+        )
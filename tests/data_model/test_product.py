@@ -1,7 +1,11 @@
+from datetime import datetime
 import pytest
 import random
 
+from sqlalchemy import inspect
+
 from shopping_cart.data_model.product import Product, DiscountOffer, Item
+from shopping_cart.data_model.reservation import Reservation
 from shopping_cart.exc import InvalidValue, OverDemand, InstanceNotFound
 
 
@@ -157,6 +161,69 @@ class TestProduct:
         assert len(items) == 3
         assert [item.id for item in items] == item_ids
 
+    def test_pick_rng(self, product, session):
+        """
+        Test random picks follow the given random number generator
+
+        """
+
+        product_example = product(
+            product_id=0,
+            name='C',
+            price=40
+        )
+        for i in range(1, 11):
+            session.add(
+                Item(
+                    id=i,
+                    product=product_example
+                )
+            )
+
+        expected = Item.sample_available_ids(session, 0, 3, rng=random.Random(7))
+
+        items = Product.pick(session, 'C', 3, is_random=True, rng=random.Random(7))
+        assert [item.id for item in items] == expected
+
+        stock = Product.pick_stock(session, 'C', 3, is_random=True, rng=random.Random(7))
+        assert [item.id for item in stock.items] == expected
+
+    def test_pick_unavailable(self, product, session):
+        """
+        Test .pick() method skips unavailable items and
+        only loads the picked items
+
+        """
+
+        product_example = product(
+            product_id=0,
+            name='C',
+            price=40
+        )
+
+        for i in range(10, 0, -1):
+            session.add(
+                Item(
+                    id=i,
+                    product=product_example,
+                    is_available=i % 3 != 0
+                )
+            )
+        session.commit()
+        session.expire_all()
+
+        items = Product.pick(session, 'C', 4)
+        assert [item.id for item in items] == [1, 2, 4, 5]
+        assert 'items' not in inspect(product_example).dict
+
+        with pytest.raises(OverDemand) as exc_info:
+            Product.pick(session, 'C', 8)
+
+        expected_error_message = (
+            f"Excess demand request. Only 7 is available, but 8 is requested."
+        )
+        assert exc_info.match(expected_error_message)
+
     def test_invalid_quantity(self, session):
         """
         Test invalid request quantity when calling .pick() method
@@ -200,6 +267,104 @@ class TestProduct:
         assert exc_info.match(expected_error_message)
 
 
+    def test_invalid_stock(self):
+        """
+        Test assigning negative stock to a product
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            Product(
+                id=0,
+                is_serial_tracked=False,
+                number_available=-1
+            )
+
+        expected_error_message = (
+            "Stock of a product must be non-negative."
+        )
+        assert exc_info.match(expected_error_message)
+
+    def test_pick_stock_serial_tracked(self, product, session):
+        """
+        Test .pick_stock() method for a serial-tracked product
+
+        """
+
+        product_example = product(
+            product_id=0,
+            name='C',
+            price=40
+        )
+
+        for i in range(5, 0, -1):
+            session.add(
+                Item(
+                    id=i,
+                    product=product_example
+                )
+            )
+
+        stock = Product.pick_stock(session, 'C', 2)
+        assert stock.product == product_example
+        assert stock.quantity == 2
+        assert [item.id for item in stock.items] == [1, 2]
+
+    def test_pick_stock_counted(self, session):
+        """
+        Test .pick_stock() method for a product
+        which is not serial-tracked
+
+        """
+
+        product_example = Product(
+            id=0,
+            name='D',
+            unit_price=10,
+            is_serial_tracked=False,
+            number_available=4
+        )
+        session.add(product_example)
+
+        stock = Product.pick_stock(session, 'D', 4)
+        assert stock.product == product_example
+        assert stock.quantity == 4
+        assert stock.items == []
+
+        with pytest.raises(OverDemand) as exc_info:
+            Product.pick_stock(session, 'D', 5)
+
+        expected_error_message = (
+            f"Excess demand request. Only 4 is available, but 5 is requested."
+        )
+        assert exc_info.match(expected_error_message)
+
+    def test_pick_counted(self, session):
+        """
+        Test .pick() method for a product which is
+        not serial-tracked
+
+        """
+
+        session.add(
+            Product(
+                id=0,
+                name='D',
+                unit_price=10,
+                is_serial_tracked=False,
+                number_available=4
+            )
+        )
+
+        with pytest.raises(InvalidValue) as exc_info:
+            Product.pick(session, 'D', 1)
+
+        expected_error_message = (
+            "Product D is not serial-tracked, its items cannot be picked individually."
+        )
+        assert exc_info.match(expected_error_message)
+
+
 class TestDiscountOffer:
     """
     Test the discount offer class
@@ -304,3 +469,147 @@ class TestItem:
         queried_product = Product.with_id(0, session)
         assert len(queried_product.items) == 1
         assert queried_product.name == 'A'
+
+    @pytest.mark.parametrize(
+        "item_ids",
+        [
+            list(range(1, 11)),
+            # sparse ids, sampled among all the available ids
+            [1, 500, 1000, 5000, 10000, 20000, 50000, 70000, 90000, 100000]
+        ]
+    )
+    def test_sample_available_ids(self, product, session, item_ids):
+        """
+        Test sampling available items is uniform and
+        reproducible under a fixed seed
+
+        """
+
+        product_example = product(
+            product_id=0,
+            name='A',
+            price=30
+        )
+        for item_id in item_ids:
+            session.add(
+                Item(
+                    id=item_id,
+                    product=product_example
+                )
+            )
+        # an unavailable item is never chosen
+        session.add(
+            Item(
+                id=item_ids[-1] + 1,
+                product=product_example,
+                is_available=False
+            )
+        )
+
+        rng = random.Random(0)
+        counts = dict.fromkeys(item_ids, 0)
+        for _ in range(300):
+            chosen = Item.sample_available_ids(session, 0, 3, rng=rng)
+            assert len(set(chosen)) == 3
+            for item_id in chosen:
+                counts[item_id] += 1
+
+        # each item is expected to be chosen 90 times
+        assert all(60 < count < 120 for count in counts.values())
+
+        assert (
+            Item.sample_available_ids(session, 0, 4, rng=random.Random(1))
+            == Item.sample_available_ids(session, 0, 4, rng=random.Random(1))
+        )
+
+        # all the available items when more are requested
+        assert sorted(Item.sample_available_ids(session, 0, 20)) == item_ids
+        assert Item.sample_available_ids(session, 1, 2) == []
+
+
+def _query_plan(session, query) -> str:
+    """
+    SQLite query plan of an ORM query
+    """
+    statement = query.statement.compile(
+        dialect=session.bind.dialect,
+        compile_kwargs={"literal_binds": True}
+    )
+    return " ".join(
+        row[-1] for row in session.execute(f"EXPLAIN QUERY PLAN {statement}")
+    )
+
+
+class TestQueryPlan:
+    """
+    Test the hot queries use the indexes
+    """
+
+    def test_pick(self, session):
+        """
+        Test picking available items of a product
+
+        """
+
+        plan = _query_plan(
+            session,
+            session.query(
+                Item
+            ).filter(
+                Item.product_id == 0,
+                Item.is_available
+            ).order_by(
+                Item.id
+            ).limit(2)
+        )
+        assert "USING INDEX ix_item_product_available" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_discount_offer(self, session):
+        """
+        Test querying the offer of a product
+
+        """
+
+        plan = _query_plan(
+            session,
+            session.query(
+                DiscountOffer
+            ).filter(
+                DiscountOffer.product_id == 0
+            )
+        )
+        assert "USING INDEX ix_discount_offer_product_id" in plan
+
+    def test_reserved_items(self, session):
+        """
+        Test querying the items of a reservation
+
+        """
+
+        plan = _query_plan(
+            session,
+            session.query(
+                Item
+            ).filter(
+                Item.reservation_id == 0
+            )
+        )
+        assert "USING INDEX ix_item_reservation_id" in plan
+
+    def test_expired_reservations(self, session):
+        """
+        Test querying expired reservations
+
+        """
+
+        plan = _query_plan(
+            session,
+            session.query(
+                Reservation.id
+            ).filter(
+                Reservation.expires_at <= datetime(2021, 1, 1)
+            )
+        )
+        assert "USING COVERING INDEX ix_reservation_expires_at" in plan
+
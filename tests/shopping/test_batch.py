@@ -0,0 +1,176 @@
+import random
+
+import numpy as np
+import pytest
+
+from shopping_cart.exc import InvalidValue
+from shopping_cart.shopping.batch import price_batch, price_carts, _round
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.pricing import CENTS_PRICING, FLOAT_PRICING, price, set_pricing_mode
+from shopping_cart.shopping.rules import add_promotion
+
+
+class TestPriceBatch:
+    """
+    Test pricing many carts at once with array operations
+    """
+
+    @pytest.mark.parametrize(
+        "tax_rate, required_purchase_total, global_rate",
+        [
+            (0, None, None),
+            (8, None, None),
+            (12.5, 300, 10),
+            (17.5, 50, 33.3),
+        ]
+    )
+    def test_matches_scalar(
+            self, tax_rate, required_purchase_total, global_rate
+    ):
+        """
+        Test the batch prices are exactly the scalar prices
+
+        """
+
+        rng = random.Random(42)
+        n_products = 12
+        unit_prices = [round(rng.uniform(0.01, 250), 2) for _ in range(n_products)]
+        required_quantities = [rng.choice([0, 2, 3, 5]) for _ in range(n_products)]
+        percentages = [rng.choice([10, 12.5, 33.3, 50, 100]) for _ in range(n_products)]
+        quantities = [
+            [rng.choice([0, 0, 1, 2, 3, 7, 20]) for _ in range(n_products)]
+            for _ in range(500)
+        ]
+
+        batch = price_batch(
+            quantities,
+            unit_prices,
+            required_quantities,
+            percentages,
+            tax_rate,
+            required_purchase_total,
+            global_rate
+        )
+
+        assert len(batch) == 500
+        for i, row in enumerate(quantities):
+            lines = [
+                (
+                    unit_prices[j],
+                    quantity,
+                    required_quantities[j] or None,
+                    percentages[j] if required_quantities[j] else None
+                )
+                for j, quantity in enumerate(row) if quantity
+            ]
+            expected = price(lines, tax_rate, required_purchase_total, global_rate)
+
+            assert batch[i].__dict__ == expected.__dict__
+
+    @pytest.mark.parametrize(
+        "value, decimals",
+        [
+            (2.675, 2),
+            (0.125, 2),
+            (1.005, 2),
+            (0.25, 1),
+            (0.35, 1),
+            (-2.675, 2),
+            (1234567.125, 2),
+        ]
+    )
+    def test_round_ties(
+            self, value, decimals
+    ):
+        """
+        Test rounding close to a tie matches python's round
+
+        """
+
+        assert _round(np.array([value]), decimals)[0] == round(value, decimals)
+
+    def test_price_carts(
+            self, store
+    ):
+        """
+        Test pricing shopping carts in a batch
+
+        """
+
+        carts = [ShoppingCart(store=store, cart_id=str(i)) for i in range(3)]
+        carts[0].add_order({"A": 2, "C": 5})
+        carts[1].add_order({"B": 4})
+
+        batch = price_carts(carts, 8, 300, 10)
+
+        assert batch.as_dicts() == [
+            cart.price_breakdown(8, 300, 10) for cart in carts
+        ]
+        assert batch.as_dicts()[2] == {
+            "total_discount": 0, "total_tax": 0, "total_price": 0
+        }
+
+    @pytest.mark.parametrize("pricing_mode", [FLOAT_PRICING, CENTS_PRICING])
+    def test_promotions(
+            self, store, pricing_mode
+    ):
+        """
+        Test carts priced in a batch with the promotions and the
+        pricing mode of the store price as each cart on its own
+
+        """
+
+        set_pricing_mode(store, pricing_mode)
+        add_promotion(store, "multi_buy", {"quantity": 3, "price": 50}, "A")
+        add_promotion(store, "multi_buy", {"quantity": 2, "price": 12.35}, "C")
+        add_promotion(store, "threshold", {"required_purchase_total": 100, "rate": 5})
+
+        orders = [{"A": 3}, {"A": 7, "B": 1}, {"C": 5}, {"A": 1, "B": 2, "C": 2}, {}]
+        carts = []
+        for i, order in enumerate(orders):
+            cart = ShoppingCart(store=store, cart_id=str(i))
+            if order:
+                cart.add_order(order)
+            carts.append(cart)
+
+        for args in [(0,), (8, 300, 10), (17.5, 50, 33.3)]:
+            batch = price_carts(carts, *args)
+            for i, cart in enumerate(carts):
+                assert batch[i].__dict__ == cart.price(*args).__dict__
+
+    def test_mixed_pricing_modes(
+            self, store
+    ):
+        """
+        Test carts of different pricing modes are not priced
+        in a batch
+
+        """
+
+        cart = ShoppingCart(store=store)
+        set_pricing_mode(store, CENTS_PRICING)
+
+        with pytest.raises(InvalidValue) as exc_info:
+            price_carts([cart, ShoppingCart(store=store)])
+        assert exc_info.match("must have the same pricing mode")
+
+    @pytest.mark.parametrize(
+        "quantities, unit_prices, message",
+        [
+            ([1, 2], [1, 2], "Quantities must be a carts x products matrix."),
+            ([[1, 2]], [1], r"Expected 2 unit prices, one per product."),
+            ([[1, -2]], [1, 2], "Quantities of products in a cart must be non-negative."),
+        ]
+    )
+    def test_invalid_arrays(
+            self, quantities, unit_prices, message
+    ):
+        """
+        Test pricing with mismatched arrays
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            price_batch(quantities, unit_prices, [0, 0], [0, 0])
+
+        assert exc_info.match(message)
@@ -1,7 +1,18 @@
+import sys
+from datetime import timedelta
+from pathlib import Path
+
 import pytest
 
-from shopping_cart.exc import InvalidValue
+from shopping_cart.data_model.product import Product, DiscountOffer
+from shopping_cart.exc import InvalidValue, ReservationExpired
+from shopping_cart.make_store import make_new_store
 from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.pricing import CENTS_PRICING, FLOAT_PRICING
+from shopping_cart.store.operations import populate
+from shopping_cart.store.reservation import release_expired
+
+stores = Path(__file__).parent.parent.parent / "files/stores"
 
 
 @pytest.fixture(name="cart")
@@ -13,6 +24,31 @@ def make_empty_cart(store):
     return ShoppingCart(store=store)
 
 
+@pytest.fixture(name="counted_product")
+def add_counted_product(store):
+    """
+    Pytest fixture to add a product which is
+    not serial-tracked to the store
+
+    """
+    product = Product(
+        id=100,
+        name="D",
+        unit_price=100,
+        is_serial_tracked=False,
+        number_available=10,
+        discount_offer=DiscountOffer(
+            id=100,
+            required_quantity=2,
+            percentage=100
+        )
+    )
+    store.add(product)
+    store.commit()
+
+    return product
+
+
 class TestShoppingCart:
     """
     Test the shopping cart class
@@ -247,3 +283,434 @@ class TestShoppingCart:
         assert cart.price_breakdown(8) == {
             'total_discount': 200.0, 'total_price': 388.78, 'total_tax': 28.8
         }
+
+    def test_counted_product(
+            self, cart, counted_product
+    ):
+        """
+        Test a cart with a product which is not serial-tracked
+        prices the same as a serial-tracked product
+
+        """
+
+        cart.add_product_items(
+            "D", 3
+        )
+        cart.add_product_items(
+            "D", 2
+        )
+        cart.add_product_items(
+            "A", 2
+        )
+        assert len(cart.items) == 2
+        assert cart.number_of_items == 7
+        assert cart.quantities[counted_product.id] == 5
+
+        product_list = {}
+        for product, quantity in cart.product_list.items():
+            product_list[product.name] = quantity
+
+        assert product_list == {"A": 2, "D": 5}
+
+        # the same prices as 5 C's and 2 A's
+        assert cart.price_breakdown(8) == {
+            'total_discount': 200.0, 'total_price': 388.78, 'total_tax': 28.8
+        }
+
+    def test_add_reserves_items(
+            self, cart, counted_product
+    ):
+        """
+        Test the added items are reserved for the cart
+
+        """
+
+        cart.add_product_items(
+            "C", 3
+        )
+        cart.add_product_items(
+            "D", 4
+        )
+
+        assert all(not item.is_available for item in cart.items)
+        assert [
+            reservation.cart_id for reservation in cart.reservations
+        ] == [cart.cart_id, cart.cart_id]
+        assert counted_product.number_available == 6
+        assert counted_product.number_reserved == 4
+
+    def test_unique_ids(
+            self, store
+    ):
+        """
+        Test each cart gets its own id by default
+
+        """
+
+        assert ShoppingCart(store=store).cart_id != ShoppingCart(store=store).cart_id
+
+    def test_empty(
+            self, cart, counted_product
+    ):
+        """
+        Test emptying the cart returns the items to the store
+
+        """
+
+        cart.add_product_items(
+            "C", 10
+        )
+        cart.add_product_items(
+            "D", 4
+        )
+        cart.empty()
+
+        assert cart.items == []
+        assert cart.product_list == {}
+        assert cart.reservations == []
+
+        assert len(Product.pick(cart.store, "C", 10)) == 10
+        assert counted_product.number_available == 10
+        assert counted_product.number_reserved == 0
+
+    def test_checkout(
+            self, cart, counted_product
+    ):
+        """
+        Test checking out the cart
+
+        """
+
+        cart.add_product_items(
+            "C", 3
+        )
+        cart.add_product_items(
+            "D", 4
+        )
+        checked_out = list(cart.items)
+        cart.checkout()
+
+        assert cart.items == []
+        assert cart.reservations == []
+        assert all(not item.is_available for item in checked_out)
+        assert all(item.reservation is None for item in checked_out)
+        assert counted_product.number_available == 6
+        assert counted_product.number_reserved == 0
+
+    def test_checkout_expired(
+            self, store
+    ):
+        """
+        Test checking out a cart with an expired reservation
+
+        """
+
+        cart = ShoppingCart(store=store, reservation_ttl=timedelta(seconds=-1))
+        cart.add_product_items(
+            "C", 3
+        )
+        release_expired(store)
+
+        with pytest.raises(ReservationExpired) as exc_info:
+            cart.checkout()
+
+        assert exc_info.match("The reservation has already been released.")
+
+    def test_add_order(
+            self, cart, counted_product
+    ):
+        """
+        Test adding several products at once
+
+        """
+
+        cart.add_order({"C": 5, "A": 1, "D": 2})
+        cart.add_order({"A": 1})
+
+        product_list = {}
+        for product, quantity in cart.product_list.items():
+            product_list[product.name] = quantity
+
+        assert product_list == {"A": 2, "C": 5, "D": 2}
+        assert len(cart.items) == 7
+        assert cart.price_breakdown(8) == {
+            'total_discount': 300.0, 'total_price': 496.78, 'total_tax': 36.8
+        }
+
+    def test_remove_product_items(
+            self, cart, counted_product
+    ):
+        """
+        Test removing items returns the latest added to the store
+
+        """
+
+        cart.add_product_items(
+            "C", 3
+        )
+        cart.add_product_items(
+            "C", 2
+        )
+        cart.add_product_items(
+            "D", 4
+        )
+        first_items = cart.items[:2]
+
+        cart.remove_product_items("C", 3)
+        cart.remove_product_items("D", 4)
+
+        assert cart.items == first_items
+        assert [
+            reservation.quantity for reservation in cart.reservations
+        ] == [2]
+        assert cart.number_of_items == 2
+        assert counted_product.number_available == 10
+        assert counted_product.number_reserved == 0
+
+        product_list = {}
+        for product, quantity in cart.product_list.items():
+            product_list[product.name] = quantity
+
+        assert product_list == {"C": 2}
+
+    @pytest.mark.parametrize(
+        "product_name, quantity, message",
+        [
+            ("C", 4, "Only 3 C in the cart, but 4 is requested to be removed."),
+            ("A", 1, "Only 0 A in the cart, but 1 is requested to be removed."),
+            ("C", 0, "Quantity request must be positive."),
+        ]
+    )
+    def test_invalid_remove(
+            self, cart, product_name, quantity, message
+    ):
+        """
+        Test removing more items than in the cart
+
+        """
+
+        cart.add_product_items(
+            "C", 3
+        )
+
+        with pytest.raises(InvalidValue) as exc_info:
+            cart.remove_product_items(product_name, quantity)
+
+        assert exc_info.match(message)
+        assert cart.number_of_items == 3
+
+    def test_running_totals(
+            self, cart, counted_product
+    ):
+        """
+        Test the running totals follow the cart as items are
+        added and removed
+
+        """
+
+        cart.add_order({"C": 5, "A": 1, "D": 2})
+        assert cart.total_marked_price == cart.price().total_marked_price
+        assert cart.discounted_subtotal == pytest.approx(
+            cart.price().total_marked_price - cart.price().product_discount
+        )
+
+        cart.remove_product_items("D", 1)
+        assert cart.discounted_subtotal == pytest.approx(
+            cart.total_marked_price - 200
+        )
+
+        cart.remove_product_items("C", 5)
+        cart.remove_product_items("A", 1)
+        cart.remove_product_items("D", 1)
+        assert cart.total_marked_price == 0
+        assert cart.discounted_subtotal == 0
+
+    def test_restore(
+            self, cart, counted_product
+    ):
+        """
+        Test restoring lines into an empty cart and rejecting a
+        non-empty one
+
+        """
+
+        product = counted_product
+        cart.restore([(product, 2)], {product.id: {7: 2}})
+
+        assert cart.quantities == {product.id: 2}
+        assert cart.reserved == {product.id: {7: 2}}
+        assert cart.unreserved_item_ids == []
+        assert cart.total_marked_price == cart.price().total_marked_price
+
+        message = f"Cart {cart.cart_id} must be empty to be restored."
+        with pytest.raises(InvalidValue) as exc_info:
+            cart.restore([(product, 1)], {})
+
+        assert exc_info.match(message)
+
+    def test_footprint(
+            self, cart
+    ):
+        """
+        Test the footprint counts the ids and amounts held by the
+        cart and not only its containers
+
+        """
+
+        cart.add_product_items(
+            "C", 3
+        )
+        containers = sum(
+            sys.getsizeof(value)
+            for value in (
+                cart, cart.__dict__, cart._products, cart.quantities,
+                cart._line_discounts, cart._reserved, cart._unreserved_items
+            )
+        )
+        amounts = sum(
+            sys.getsizeof(product_id) + sys.getsizeof(amount)
+            for lines in (cart.quantities, cart._line_discounts)
+            for product_id, amount in lines.items()
+        )
+        reserved = sum(
+            sys.getsizeof(product_id) + sys.getsizeof(holds)
+            + sum(
+                sys.getsizeof(reservation_id) + sys.getsizeof(quantity)
+                for reservation_id, quantity in holds.items()
+            )
+            for product_id, holds in cart._reserved.items()
+        )
+
+        assert cart.footprint() == containers + amounts + reserved
+
+
+class TestCentsPricing:
+    """
+    Test shopping carts of a store in the cents pricing mode
+    """
+
+    @pytest.mark.parametrize(
+        "store_config, orders, rates",
+        [
+            ("store_1.yaml", [{"Dove Soap": 5}, {"Dove Soap": 3}], (0,)),
+            ("store_1.yaml", [{"Dove Soap": 2}, {"Axe Deo": 2}], (12.5,)),
+            ("store_2.yaml", [{"Dove Soap": 3}], (12.5,)),
+            ("store_2.yaml", [{"Dove Soap": 5}], (12.5,)),
+            ("store_2.yaml", [{"Dove Soap": 3}, {"Axe Deo": 2}], (12.5,)),
+            ("store_3.yaml", [{"Dove Soap": 2}], (12.5,)),
+            ("store_4.yaml", [{"Dove Soap": 5}, {"Axe Deo": 4}], (12.5, 500, 20)),
+        ]
+    )
+    def test_examples(
+            self, store_config, orders, rates
+    ):
+        """
+        Test the carts of the examples price the same
+        in the float and the cents pricing modes
+
+        """
+
+        carts = []
+        for pricing_mode in (FLOAT_PRICING, CENTS_PRICING):
+            cart = ShoppingCart(
+                store=make_new_store(stores / store_config, pricing_mode=pricing_mode)
+            )
+            for order in orders:
+                cart.add_order(order)
+            carts.append(cart)
+
+        float_cart, cents_cart = carts
+        assert cents_cart.pricing_mode == CENTS_PRICING
+        assert cents_cart.price_breakdown(*rates) == float_cart.price_breakdown(*rates)
+        assert cents_cart.total_marked_price == round(float_cart.total_marked_price, 2)
+        assert cents_cart.discounted_subtotal == pytest.approx(
+            float_cart.discounted_subtotal
+        )
+
+
+@pytest.fixture(name="large_cart")
+def make_large_cart(session):
+    """
+    Pytest fixture of a cart of 200 items of 20 products
+    with offers, on a fresh session
+
+    """
+
+    populate(
+        {
+            "products": [
+                {
+                    "name": f"product_{i}",
+                    "unit_price": 1.99 + i,
+                    "number_in_store": 20,
+                    "promotion": {"required_quantity": 3, "percentage": 50}
+                }
+                for i in range(20)
+            ]
+        },
+        session
+    )
+
+    cart = ShoppingCart(store=session)
+    cart.add_order({f"product_{i}": 10 for i in range(20)})
+    session.expire_all()
+    return cart
+
+
+class TestQueryCount:
+    """
+    Test the cart pricing path costs a fixed number of
+    queries whatever the size of the cart
+    """
+
+    def test_product_list(self, large_cart, statements):
+        """
+        Test listing the products of a cart loads
+        them with their offers in one query
+
+        """
+
+        product_list = large_cart.product_list
+        assert [
+            product.discount_offer.required_quantity for product in product_list
+        ] == [3] * 20
+        assert len(statements) == 1
+
+    def test_price(self, large_cart, statements):
+        """
+        Test pricing a cart with a compiled plan issues
+        no query, and a new plan only two
+
+        """
+
+        large_cart.total_marked_price
+        large_cart.price_breakdown(8, 100, 10)
+        large_cart.total_discount()
+        assert statements == []
+
+        large_cart.store.info.clear()
+        large_cart.price_breakdown(8, 100, 10)
+        assert len(statements) == 2
+
+    def test_items(self, large_cart, statements):
+        """
+        Test loading the items of a cart with their
+        products and offers in one query
+
+        """
+
+        items = large_cart.items
+        assert len(items) == 200
+        assert {item.product.discount_offer.percentage for item in items} == {50}
+        assert len(statements) == 1
+
+    def test_pick(self, large_cart, statements):
+        """
+        Test picking items loads the product, its offer
+        and the items in two queries
+
+        """
+
+        items = Product.pick(large_cart.store, "product_3", 5)
+        assert {item.product.discount_offer.percentage for item in items} == {50}
+        assert len(statements) == 2
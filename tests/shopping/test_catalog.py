@@ -0,0 +1,119 @@
+import pickle
+
+import pytest
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.catalog import CatalogSnapshot
+from shopping_cart.shopping.rules import add_promotion
+
+
+@pytest.fixture(name="cart")
+def make_cart(store):
+    """
+    Pytest fixture of a cart with a few products
+
+    """
+    cart = ShoppingCart(store=store)
+    cart.add_order({"A": 7, "B": 4, "C": 5})
+    return cart
+
+
+class TestCatalogSnapshot:
+    """
+    Test pricing carts with immutable catalog snapshots
+    """
+
+    def test_load(self, store, statements):
+        """
+        Test taking a snapshot of the store
+
+        """
+
+        add_promotion(store, "threshold", {"required_purchase_total": 100, "rate": 5})
+        statements.clear()
+
+        snapshot = CatalogSnapshot.load(store)
+
+        assert len(statements) == 2
+        assert len(snapshot) == 3
+        assert snapshot.version == m.catalog_version(store)
+        assert snapshot.is_current(store)
+
+        b = m.Product.with_name(store, "B")
+        product = snapshot.product(b.id)
+        assert product.as_tuple() == (b.id, "B", 199.99, 19999, 3, 50)
+        assert [kind for _, kind, *_ in snapshot.promotions] == ["threshold"]
+
+        b.unit_price = 100
+        store.commit()
+        assert not snapshot.is_current(store)
+
+    def test_immutable(self, store):
+        """
+        Test a snapshot cannot be changed
+
+        """
+
+        snapshot = CatalogSnapshot.load(store)
+        product = next(iter(snapshot._products.values()))
+
+        with pytest.raises(AttributeError):
+            snapshot.version = 0
+        with pytest.raises(AttributeError):
+            product.unit_price = 0
+        with pytest.raises(AttributeError):
+            product.discount = 0
+
+    @pytest.mark.parametrize(
+        "rates",
+        [
+            (8,),
+            (12.5, 500, 20),
+        ]
+    )
+    def test_price_without_store(self, store, cart, statements, rates):
+        """
+        Test pricing a cart with a snapshot prices as the
+        store without touching the database
+
+        """
+
+        add_promotion(store, "multi_buy", {"quantity": 3, "price": 50}, "A")
+        snapshot = CatalogSnapshot.load(store)
+        expected = cart.price_breakdown(*rates)
+
+        statements.clear()
+        assert cart.price_breakdown(*rates, catalog=snapshot) == expected
+        assert statements == []
+
+    def test_pickle(self, store, cart):
+        """
+        Test a pickled snapshot prices the same
+
+        """
+
+        snapshot = CatalogSnapshot.load(store)
+        snapshot.plan()
+
+        unpickled = pickle.loads(pickle.dumps(snapshot))
+
+        assert unpickled.version == snapshot.version
+        assert unpickled._plans == {}
+        assert vars(unpickled.price(cart.quantities, 8, 500, 20)) == vars(
+            snapshot.price(cart.quantities, 8, 500, 20)
+        )
+
+    def test_unknown_product(self, store):
+        """
+        Test pricing a product which is not in the snapshot
+
+        """
+
+        snapshot = CatalogSnapshot.load(store)
+
+        with pytest.raises(InstanceNotFound) as exc_info:
+            snapshot.price({1000: 1})
+
+        assert exc_info.match(f"Product 1000 is not in the catalog version {snapshot.version}.")
@@ -0,0 +1,139 @@
+import pytest
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.catalog import CatalogSnapshot
+from shopping_cart.shopping.catalog_file import (
+    FORMAT_VERSION, MappedCatalog, build_catalog_file, write_catalog_file
+)
+from shopping_cart.shopping.rules import add_promotion
+
+
+@pytest.fixture(name="catalog_path")
+def make_catalog_file(store, tmp_path):
+    """
+    Pytest fixture of a catalog file of the store, with
+    a promotion of a product and of the whole cart
+
+    """
+    add_promotion(store, "multi_buy", {"quantity": 3, "price": 50}, "A")
+    add_promotion(store, "threshold", {"required_purchase_total": 100, "rate": 5})
+
+    path = tmp_path / "catalog.bin"
+    build_catalog_file(store, path)
+    return path
+
+
+class TestMappedCatalog:
+    """
+    Test pricing carts with memory-mapped catalog files
+    """
+
+    def test_products(self, store, catalog_path):
+        """
+        Test the products read from the file are those of the store
+
+        """
+
+        snapshot = CatalogSnapshot.load(store)
+        with MappedCatalog(catalog_path) as catalog:
+            assert len(catalog) == len(snapshot)
+            assert catalog.version == snapshot.version
+            for product in m.Product.all(store):
+                assert product.id in catalog
+                assert catalog.product(product.id).as_tuple() \
+                    == snapshot.product(product.id).as_tuple()
+                assert catalog.product_id(product.name) == product.id
+
+            assert 1000 not in catalog
+            with pytest.raises(InstanceNotFound):
+                catalog.product(1000)
+            with pytest.raises(InstanceNotFound):
+                catalog.product_id("Z")
+
+    @pytest.mark.parametrize("in_cents", [False, True])
+    def test_price(self, store, catalog_path, in_cents):
+        """
+        Test a cart prices the same with the file as with the store
+
+        """
+
+        cart = ShoppingCart(store=store)
+        cart.add_order({"A": 7, "B": 4, "C": 2})
+
+        with MappedCatalog(catalog_path) as catalog:
+            assert catalog.price(cart.quantities, 12.5, 500, 20, in_cents).as_dict() \
+                == CatalogSnapshot.load(store).price(
+                    cart.quantities, 12.5, 500, 20, in_cents
+                ).as_dict()
+            assert cart.price_breakdown(8, 500, 20, catalog=catalog) \
+                == cart.price_breakdown(8, 500, 20)
+
+    def test_empty(self, session, tmp_path):
+        """
+        Test a catalog file of a store without products
+
+        """
+
+        build_catalog_file(session, tmp_path / "catalog.bin")
+
+        with MappedCatalog(tmp_path / "catalog.bin") as catalog:
+            assert len(catalog) == 0
+            assert catalog.price({}, 10).total_price == 0
+
+    def test_corrupted(self, catalog_path):
+        """
+        Test a file changed after it was written is rejected
+
+        """
+
+        data = bytearray(catalog_path.read_bytes())
+        data[-5] ^= 0xFF
+        catalog_path.write_bytes(bytes(data))
+
+        with pytest.raises(InvalidValue) as exc_info:
+            MappedCatalog(catalog_path)
+        assert exc_info.match("is corrupted.")
+
+        MappedCatalog(catalog_path, verify=False).close()
+
+    @pytest.mark.parametrize(
+        "change, message",
+        [
+            (lambda data: b"NOTACATL" + data[8:], "is not a catalog file."),
+            (lambda data: data[:8] + bytes([FORMAT_VERSION + 1]) + data[9:],
+             f"Catalog file format version {FORMAT_VERSION + 1} is not supported."),
+            (lambda data: data[:-1], "is corrupted."),
+        ]
+    )
+    def test_invalid(self, catalog_path, change, message):
+        """
+        Test opening files which are not valid catalog files
+
+        """
+
+        catalog_path.write_bytes(change(catalog_path.read_bytes()))
+
+        with pytest.raises(InvalidValue) as exc_info:
+            MappedCatalog(catalog_path)
+
+        assert exc_info.match(message)
+
+    def test_replace(self, store, catalog_path):
+        """
+        Test a catalog file rewritten in place leaves the
+        mapped catalog of the previous file intact
+
+        """
+
+        with MappedCatalog(catalog_path) as catalog:
+            b = m.Product.with_name(store, "B")
+            b.unit_price = 100
+            store.commit()
+            write_catalog_file(CatalogSnapshot.load(store), catalog_path)
+
+            assert catalog.product(b.id).unit_price == 199.99
+            with MappedCatalog(catalog_path) as rebuilt:
+                assert rebuilt.product(b.id).unit_price == 100
+                assert rebuilt.version > catalog.version
@@ -0,0 +1,149 @@
+import pytest
+
+from shopping_cart.data_model.product import Product
+from shopping_cart.exc import InstanceNotFound, InvalidValue
+from shopping_cart.shopping.manager import CartManager
+
+
+class FakeClock:
+    """
+    A clock which only moves when told to
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCartManager:
+    """
+    Test the registry of the live carts of a store
+    """
+
+    def test_create(self, store):
+        """
+        Test the carts get unique ids and are looked up by id
+
+        """
+
+        manager = CartManager(store)
+        carts = [manager.create() for _ in range(100)]
+
+        assert len({cart.cart_id for cart in carts}) == 100
+        assert len(manager) == 100
+        assert all(manager.get(cart.cart_id) is cart for cart in carts)
+
+        with pytest.raises(InstanceNotFound):
+            manager.get("unknown")
+
+    def test_idle(self, store):
+        """
+        Test a cart idle past the time to live is evicted and
+        its reserved items are returned to the store
+
+        """
+
+        clock = FakeClock()
+        manager = CartManager(store, idle_ttl=60, clock=clock)
+        idle = manager.create()
+        idle.add_product_items("C", 10)
+        active = manager.create()
+
+        clock.now = 30
+        manager.get(active.cart_id)
+
+        clock.now = 60
+        assert manager.evict_idle() == 1
+        assert idle.cart_id not in manager
+        assert active.cart_id in manager
+        assert len(Product.pick(store, "C", 10)) == 10
+
+        clock.now = 90
+        with pytest.raises(InstanceNotFound):
+            manager.get(active.cart_id)
+        assert manager.stats()["evictions"] == 2
+
+    def test_max_carts(self, store):
+        """
+        Test the least recently used cart is evicted for room
+
+        """
+
+        manager = CartManager(store, max_carts=2)
+        first, second = manager.create(), manager.create()
+        manager.get(first.cart_id)
+
+        third = manager.create()
+
+        assert second.cart_id not in manager
+        assert first.cart_id in manager and third.cart_id in manager
+
+    def test_memory_budget(self, store):
+        """
+        Test the carts are kept under the memory budget
+
+        """
+
+        empty_cart_size = CartManager(store).create().footprint()
+        manager = CartManager(store, memory_budget=5 * empty_cart_size)
+        for _ in range(20):
+            manager.create()
+
+        assert manager.memory_usage <= manager.memory_budget
+        assert len(manager) == 5
+        assert manager.evictions == 15
+
+    def test_soft_memory_budget(self, store):
+        """
+        Test a cart growing between lookups is measured again
+        when it is next looked up
+
+        """
+
+        manager = CartManager(store)
+        cart = manager.create()
+        empty_footprint = manager.memory_usage
+        assert empty_footprint == cart.footprint()
+
+        cart.add_order({"A": 1, "B": 1, "C": 1})
+        assert cart.footprint() > empty_footprint
+        assert manager.memory_usage == empty_footprint
+
+        manager.get(cart.cart_id)
+        assert manager.memory_usage == cart.footprint()
+
+    def test_keep_reservations(self, store):
+        """
+        Test an evicted cart can leave its reservations to expire
+
+        """
+
+        manager = CartManager(store, max_carts=1, release_on_evict=False)
+        cart = manager.create()
+        cart.add_product_items("C", 10)
+        manager.create()
+
+        assert cart.cart_id not in manager
+        assert len(cart.reservations) == 1
+
+    @pytest.mark.parametrize(
+        "bounds, message",
+        [
+            (dict(max_carts=0), "Maximum number of carts must be positive. 0 is given."),
+            (dict(idle_ttl=-1), "Idle time to live must be positive. -1 is given."),
+            (dict(memory_budget=0), "Memory budget must be positive. 0 is given."),
+        ]
+    )
+    def test_invalid(self, store, bounds, message):
+        """
+        Test making a manager with invalid bounds
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            CartManager(store, **bounds)
+
+        assert exc_info.match(message)
+
@@ -0,0 +1,175 @@
+import pytest
+
+from shopping_cart.exc import InvalidValue
+from shopping_cart.shopping.pricing import (
+    CENTS_PRICING, FLOAT_PRICING, get_pricing_mode, price, price_cents,
+    set_pricing_mode
+)
+
+
+class TestPrice:
+    """
+    Test the single pass pricing of aggregated cart lines
+    """
+
+    def test_no_lines(self):
+        """
+        Test pricing an empty cart
+
+        """
+
+        breakdown = price([], 10, 100, 10)
+        assert breakdown.total_marked_price == 0
+        assert breakdown.as_dict() == {
+            "total_discount": 0, "total_tax": 0, "total_price": 0
+        }
+
+    def test_product_discount(self):
+        """
+        Test pricing with product offers, no global discount
+
+        """
+
+        # 5 C's at 100 buy 1 get 1 free, 2 A's at 29.99
+        breakdown = price([(29.99, 2, None, None), (100, 5, 2, 100)], 8)
+
+        assert breakdown.total_marked_price == 559.98
+        assert breakdown.product_discount == 200
+        assert breakdown.global_discount == 0
+        assert breakdown.total_discount == 200
+        assert round(breakdown.total_price_before_tax, 2) == 359.98
+        assert breakdown.as_dict() == {
+            "total_discount": 200.0, "total_tax": 28.8, "total_price": 388.78
+        }
+
+    @pytest.mark.parametrize(
+        "required_purchase_total, global_discount",
+        [
+            (1000, 0),
+            (300, 35.998)
+        ]
+    )
+    def test_global_discount(self, required_purchase_total, global_discount):
+        """
+        Test the global discount applies on the total
+        after product discounts
+
+        """
+
+        breakdown = price(
+            [(29.99, 2, None, None), (100, 5, 2, 100)], 0, required_purchase_total, 10
+        )
+        assert breakdown.product_discount == 200
+        assert round(breakdown.global_discount, 6) == global_discount
+        assert breakdown.total_discount == round(200 + global_discount, 2)
+
+    def test_summation_order(self):
+        """
+        Test the marked price of a line is its unit price times its
+        quantity, which changed the results of the item by item sum
+        of the first versions on a half cent
+
+        """
+
+        breakdown = price([(9.05, 7, None, None)], 0, 10, 10)
+        assert breakdown.as_dict() == {
+            "total_discount": 6.34, "total_tax": 0, "total_price": 57.01
+        }
+        assert price_cents([(905, 7, None, None)], 0, 10, 10).total_discount == 634
+
+        # the item by item sum gave a discount of 6.33
+        total_marked_price = 0
+        for _ in range(7):
+            total_marked_price += 9.05
+        assert round(total_marked_price * 10 / 100, 2) == 6.33
+
+    @pytest.mark.parametrize(
+        "rates, expected_error_message",
+        [
+            ((-1, None, None), "Tax rate must be non-negative. -1 is given."),
+            (
+                (0, -5, 10),
+                "The required total cost of the purchase for global discount "
+                "must be positive. -5 is given instead."
+            ),
+            ((0, 100, 0), "Global discount rate must be between 0 and 100. 0 is given instead."),
+        ]
+    )
+    def test_invalid_rates(self, rates, expected_error_message):
+        """
+        Test pricing with invalid tax or global discount parameters
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            price([(1, 1, None, None)], *rates)
+
+        assert exc_info.match(expected_error_message)
+
+
+class TestPriceCents:
+    """
+    Test the pricing in integer cents
+    """
+
+    def test_product_discount(self):
+        """
+        Test pricing in cents with product offers
+
+        """
+
+        breakdown = price_cents([(2999, 2, None, None), (10000, 5, 2, 10000)], 8)
+
+        assert breakdown.total_marked_price == 55998
+        assert breakdown.product_discount == 20000
+        assert breakdown.total_price_before_tax == 35998
+        assert breakdown.as_dict() == {
+            "total_discount": 20000, "total_tax": 2880, "total_price": 38878
+        }
+        assert breakdown.in_units().as_dict() == price(
+            [(29.99, 2, None, None), (100, 5, 2, 100)], 8
+        ).as_dict()
+
+    def test_rounding_policy(self):
+        """
+        Test the total discount and the tax are rounded
+        half up, once
+
+        """
+
+        # 3 x 0.05 at 50% off every item, i.e. 7.5 cents off
+        breakdown = price_cents([(5, 3, 1, 5000)], 10)
+        assert breakdown.total_discount == 8
+        assert breakdown.total_price_before_tax == 7
+        assert breakdown.total_tax == 0
+
+        # a tax of 4.50 is kept, 4.55 is rounded up to 4.60
+        assert price_cents([(4500, 1, None, None)], 10).total_tax == 450
+        assert price_cents([(4550, 1, None, None)], 10).total_tax == 460
+
+    def test_order_independent(self):
+        """
+        Test the price in cents does not depend on the order of the lines
+
+        """
+
+        lines = [(1999, 3, 2, 3330), (1, 7, None, None), (12345, 2, 3, 1250)]
+        assert vars(price_cents(lines, 17.5, 100, 15)) == vars(
+            price_cents(lines[::-1], 17.5, 100, 15)
+        )
+
+    def test_pricing_mode(self, session):
+        """
+        Test selecting the pricing mode of a store
+
+        """
+
+        assert get_pricing_mode(session) == FLOAT_PRICING
+
+        set_pricing_mode(session, CENTS_PRICING)
+        assert get_pricing_mode(session) == CENTS_PRICING
+
+        with pytest.raises(InvalidValue) as exc_info:
+            set_pricing_mode(session, "decimal")
+
+        assert exc_info.match("Pricing mode must be one of float, cents. decimal is given.")
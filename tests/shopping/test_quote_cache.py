@@ -0,0 +1,239 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InvalidValue
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.catalog import CatalogSnapshot
+from shopping_cart.shopping.quote_cache import QuoteCache, quote_key
+from shopping_cart.store.operations import populate
+
+
+class FakeClock:
+    """
+    A clock which only moves when told to
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestQuoteKey:
+    """
+    Test the canonical key of a price quote
+    """
+
+    def test_canonical(self):
+        """
+        Test the key ignores the order of the products and
+        tells different carts and settings apart
+
+        """
+
+        key = quote_key({1: 2, 3: 5}, 8, None, None, 1)
+
+        assert quote_key({3: 5, 1: 2}, 8.0, None, None, 1) == key
+        assert quote_key({3: 5, 1: 2, 4: 0}, 8, None, None, 1) == key
+        assert quote_key({1: 2, 3: 4}, 8, None, None, 1) != key
+        assert quote_key({1: 2, 3: 5}, 8, 100, 10, 1) != key
+        assert quote_key({1: 2, 3: 5}, 8, None, None, 2) != key
+        assert quote_key({1: 2, 3: 5}, 8, None, None, 1, in_cents=True) != key
+
+
+class TestQuoteCache:
+    """
+    Test the bounded cache of price breakdowns
+    """
+
+    def test_lru(self):
+        """
+        Test the least recently used quote is evicted
+
+        """
+
+        cache = QuoteCache(max_size=2)
+        cache.put(b"a", 0, {"total_price": 1})
+        cache.put(b"b", 0, {"total_price": 2})
+        assert cache.get(b"a", 0) == {"total_price": 1}
+
+        cache.put(b"c", 0, {"total_price": 3})
+
+        assert cache.get(b"b", 0) is None
+        assert cache.get(b"a", 0) == {"total_price": 1}
+        assert len(cache) == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl(self):
+        """
+        Test a quote expires after its time to live
+
+        """
+
+        clock = FakeClock()
+        cache = QuoteCache(ttl=60, clock=clock)
+        cache.put(b"a", 0, {"total_price": 1})
+
+        clock.now = 59
+        assert cache.get(b"a", 0) is not None
+
+        clock.now = 60
+        assert cache.get(b"a", 0) is None
+        assert cache.expirations == 1
+        assert len(cache) == 0
+
+    def test_version(self):
+        """
+        Test a newer catalog version drops the older quotes, and
+        quotes of an older version are not cached
+
+        """
+
+        cache = QuoteCache()
+        cache.put(b"a", 1, {"total_price": 1})
+
+        assert cache.get(b"a", 2) is None
+        assert cache.invalidations == 1
+
+        cache.put(b"a", 1, {"total_price": 1})
+        assert len(cache) == 0
+
+    def test_copies(self):
+        """
+        Test changing a cached breakdown does not change the cache
+
+        """
+
+        cache = QuoteCache()
+        cache.put(b"a", 0, {"total_price": 1})
+        cache.get(b"a", 0)["total_price"] = 2
+
+        assert cache.get(b"a", 0) == {"total_price": 1}
+
+    @pytest.mark.parametrize(
+        "max_size, ttl, message",
+        [
+            (0, None, "Quote cache size must be positive. 0 is given."),
+            (10, -1, "Quote time to live must be positive. -1 is given."),
+        ]
+    )
+    def test_invalid(self, max_size, ttl, message):
+        """
+        Test making a cache with an invalid size or time to live
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            QuoteCache(max_size, ttl)
+
+        assert exc_info.match(message)
+
+
+class TestCachedCart:
+    """
+    Test pricing carts through a shared quote cache
+    """
+
+    def test_identical_carts(self, store):
+        """
+        Test carts with the same products share a quote
+
+        """
+
+        cache = QuoteCache()
+        first = ShoppingCart(store=store, cart_id="first", quote_cache=cache)
+        first.add_order({"A": 2, "C": 5})
+        second = ShoppingCart(store=store, cart_id="second", quote_cache=cache)
+        second.add_order({"C": 5, "A": 2})
+
+        breakdown = first.price_breakdown(12.5, 100, 10)
+
+        assert second.price_breakdown(12.5, 100, 10) == breakdown
+        assert second.price_breakdown(12.5, 100, 10) == second.price(12.5, 100, 10).as_dict()
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+        assert cache.hit_rate == pytest.approx(2 / 3)
+
+        second.add_order({"B": 1})
+        assert second.price_breakdown(12.5, 100, 10) != breakdown
+        assert cache.misses == 2
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda store: setattr(m.Product.with_name(store, "A"), "unit_price", 10),
+            lambda store: setattr(m.Product.with_name(store, "C").discount_offer, "percentage", 25),
+        ]
+    )
+    def test_invalidated(self, store, change):
+        """
+        Test a change of a price or an offer invalidates the quotes
+
+        """
+
+        cache = QuoteCache()
+        cart = ShoppingCart(store=store, quote_cache=cache)
+        cart.add_order({"A": 2, "C": 5})
+        before = cart.price_breakdown(8)
+
+        change(store)
+        store.commit()
+
+        after = cart.price_breakdown(8)
+        assert after != before
+        assert after == cart.price(8).as_dict()
+        assert cache.invalidations == 1
+        assert cache.hits == 0
+
+    def test_changed_by_other_session(self, tmp_path):
+        """
+        Test a price committed by another session invalidates the
+        quotes of a cart, from the next transaction of its session
+
+        """
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+        m.Base.metadata.create_all(engine)
+        make_session = sessionmaker(bind=engine, class_=m.StoreSession)
+        s1, s2 = make_session(), make_session()
+        populate(
+            {"products": [{"name": "A", "unit_price": 10, "number_in_store": 10}]},
+            s1,
+            bulk=True
+        )
+
+        cache = QuoteCache()
+        cart = ShoppingCart(store=s1, quote_cache=cache)
+        cart.add_product_items("A", 2)
+        assert cart.price_breakdown(0)["total_price"] == 20
+
+        m.Product.with_name(s2, "A").unit_price = 20
+        s2.commit()
+        s1.commit()
+
+        assert cart.price_breakdown(0)["total_price"] == 40
+        assert cache.invalidations == 1
+        assert cache.hits == 0
+
+        s1.close()
+        s2.close()
+        engine.dispose()
+
+    def test_snapshot(self, store):
+        """
+        Test quotes of a catalog snapshot are keyed by its version
+
+        """
+
+        cache = QuoteCache()
+        cart = ShoppingCart(store=store, quote_cache=cache)
+        cart.add_order({"A": 2, "B": 4})
+        snapshot = CatalogSnapshot.load(store)
+
+        breakdown = cart.price_breakdown(8, catalog=snapshot)
+
+        assert cart.price_breakdown(8) == breakdown
+        assert cache.hits == 1
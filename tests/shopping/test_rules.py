@@ -0,0 +1,323 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.pricing import CENTS_PRICING, price, set_pricing_mode
+from shopping_cart.shopping.rules import (
+    RULE_TYPES, ProductRule, Rule, add_promotion, compile_plan, make_rule, pricing_plan, rule_type
+)
+from shopping_cart.store.operations import populate
+
+
+class TestPricingPlan:
+    """
+    Test compiling the promotions of a store into a pricing plan
+    """
+
+    def test_compile(self, store):
+        """
+        Test only the products with promotions have rules
+
+        """
+
+        plan = compile_plan(store)
+
+        names = {product.name: product.id for product in m.Product.all(store)}
+        assert plan.products[names["A"]].rules == ()
+        assert len(plan.products[names["B"]].rules) == 1
+        assert plan.products[names["B"]].unit_price == 199.99
+        assert plan.cart_rules == []
+
+        assert compile_plan(store, in_cents=True).products[names["B"]].unit_price == 19999
+
+    @pytest.mark.parametrize(
+        "quantities, tax_rate",
+        [
+            ({"A": 2, "C": 5}, 8),
+            ({"A": 7, "B": 4, "C": 3}, 12.5),
+            ({"B": 1}, 0),
+        ]
+    )
+    def test_matches_price(self, store, quantities, tax_rate):
+        """
+        Test the plan of the discount offers prices exactly
+        as the single pass pricing engine
+
+        """
+
+        products = {product.name: product for product in m.Product.all(store)}
+        by_id = {products[name].id: quantity for name, quantity in quantities.items()}
+        lines = []
+        for product_id in sorted(by_id):
+            product = next(p for p in products.values() if p.id == product_id)
+            offer = product.discount_offer
+            lines.append(
+                (
+                    product.unit_price,
+                    by_id[product_id],
+                    offer and offer.required_quantity,
+                    offer and offer.percentage
+                )
+            )
+
+        add_promotion(store, "threshold", {"required_purchase_total": 300, "rate": 10})
+
+        assert vars(compile_plan(store).price(by_id, tax_rate)) == vars(
+            price(lines, tax_rate, 300, 10)
+        )
+
+    def test_cached(self, store):
+        """
+        Test the plan is compiled once, and again when a
+        price, an offer or a promotion changes
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+        plan = pricing_plan(store, product_ids=[a])
+        assert pricing_plan(store, product_ids=[a]) is plan
+
+        m.Product.with_name(store, "A").number_available = 3
+        store.commit()
+        assert pricing_plan(store, product_ids=[a]) is plan
+
+        m.Product.with_name(store, "A").unit_price = 10
+        store.commit()
+        changed_price = pricing_plan(store, product_ids=[a])
+        assert changed_price is not plan
+        assert changed_price.products[a].unit_price == 10
+
+        add_promotion(store, "multi_buy", {"quantity": 3, "price": 20}, "A")
+        assert pricing_plan(store) is not changed_price
+
+    def test_per_product(self, store):
+        """
+        Test the plan compiles the products as they are priced,
+        with the rules of the whole cart and no more products
+
+        """
+
+        add_promotion(store, "threshold", {"required_purchase_total": 100, "rate": 5})
+        add_promotion(store, "multi_buy", {"quantity": 3, "price": 20}, "A")
+        a, b, c = (m.Product.with_name(store, name).id for name in "ABC")
+
+        plan = pricing_plan(store, product_ids=[b])
+        assert set(plan.products) == {b}
+        assert len(plan.cart_rules) == 1
+
+        assert pricing_plan(store, product_ids=[a, c]) is plan
+        assert set(plan.products) == {a, b, c}
+        assert len(plan.products[a].rules) == 1
+
+        assert set(compile_plan(store, product_ids=[b]).products) == {b}
+        assert set(compile_plan(store).products) == {
+            product.id for product in m.Product.all(store)
+        }
+
+    def test_changed_by_other_session(self, tmp_path):
+        """
+        Test a plan is compiled again when another session
+        changes a price, from the next transaction on
+
+        """
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+        m.Base.metadata.create_all(engine)
+        make_session = sessionmaker(bind=engine, class_=m.StoreSession)
+        s1, s2 = make_session(), make_session()
+        populate(
+            {"products": [{"name": "A", "unit_price": 10, "number_in_store": 10}]},
+            s1,
+            bulk=True
+        )
+
+        cart = ShoppingCart(store=s1)
+        cart.add_product_items("A", 2)
+        assert cart.price().total_price == 20
+        plan = pricing_plan(s1)
+
+        m.Product.with_name(s2, "A").unit_price = 20
+        s2.commit()
+        s1.commit()
+
+        assert pricing_plan(s1) is not plan
+        assert pricing_plan(s1).version == m.catalog_version(s2)
+        assert cart.price().total_price == 40
+        assert ShoppingCart(store=s1).price().total_price == 0
+
+        cart.add_product_items("A", 1)
+        assert cart.total_marked_price == 60
+        assert cart.price().total_price == 60
+
+        s1.close()
+        s2.close()
+        engine.dispose()
+
+    def test_other_session(self, store):
+        """
+        Test a session which is not a store session keeps no plan,
+        as its changes are not tracked, and its plan is up to date
+
+        """
+
+        session = Session(bind=store.get_bind())
+        plan = pricing_plan(session)
+        assert pricing_plan(session) is not plan
+        assert "pricing_plans" not in session.info
+
+        m.Product.with_name(session, "A").unit_price = 10
+        session.flush()
+        a = m.Product.with_name(session, "A").id
+        assert pricing_plan(session, product_ids=[a]).products[a].unit_price == 10
+
+        session.rollback()
+        session.close()
+
+
+class TestPromotions:
+    """
+    Test adding promotions to a store and pricing carts with them
+    """
+
+    def test_multi_buy(self, store):
+        """
+        Test a "3 for 50" promotion on top of a discount offer
+
+        """
+
+        add_promotion(store, "multi_buy", {"quantity": 3, "price": 50}, "A")
+        cart = ShoppingCart(store=store)
+        cart.add_order({"A": 7, "C": 2})
+
+        # 7 A's at 29.99 with 2 x (89.97 - 50) off, 2 C's with 1 free
+        assert cart.total_discount() == round(2 * (3 * 29.99 - 50) + 100, 2)
+        assert cart.discounted_subtotal == pytest.approx(7 * 29.99 + 200 - 2 * 39.97 - 100)
+
+    def test_multi_buy_no_saving(self, store):
+        """
+        Test a multi-buy which costs more than the marked
+        price is never applied
+
+        """
+
+        add_promotion(store, "multi_buy", {"quantity": 2, "price": 100}, "A")
+        a = m.Product.with_name(store, "A").id
+        assert pricing_plan(store, product_ids=[a]).products[a].rules == ()
+
+    def test_threshold(self, store):
+        """
+        Test a global discount of the store applies without
+        being given to the pricing
+
+        """
+
+        add_promotion(store, "threshold", {"required_purchase_total": 500, "rate": 20})
+        cart = ShoppingCart(store=store)
+        cart.add_order({"C": 5, "B": 4})
+        with_promotion = cart.price_breakdown(12.5)
+
+        store.query(m.Promotion).delete()
+        store.commit()
+
+        assert cart.price_breakdown(12.5, 500, 20) == with_promotion
+        assert cart.price_breakdown(12.5) != with_promotion
+
+    def test_cents(self, store):
+        """
+        Test the promotions price the same in the cents pricing mode
+
+        """
+
+        add_promotion(store, "multi_buy", {"quantity": 3, "price": 50}, "A")
+        add_promotion(store, "threshold", {"required_purchase_total": 100, "rate": 12.5})
+        cart = ShoppingCart(store=store)
+        cart.add_order({"A": 7, "B": 4, "C": 2})
+
+        set_pricing_mode(store, CENTS_PRICING)
+        cents_cart = ShoppingCart(store=store, cart_id="cents")
+        cents_cart.quantities = cart.quantities
+
+        assert cents_cart.price_breakdown(8) == cart.price_breakdown(8)
+
+    @pytest.mark.parametrize(
+        "kind, parameters, product_name, message",
+        [
+            ("bogof", {}, "A", "Unknown promotion kind bogof. Registered kinds are"),
+            ("multi_buy", {"quantity": 3}, "A", "Invalid parameters"),
+            ("multi_buy", {"quantity": 0, "price": 1}, "A",
+             "Multi-buy quantity and price must be positive. 0 for 1 is given."),
+            ("percent_off", {"required_quantity": 2, "percentage": 0}, "A",
+             "Discount percentage must be between 0 and 100"),
+            ("multi_buy", {"quantity": 3, "price": 1}, None,
+             "A multi_buy promotion applies to a product, but no product is given."),
+            ("threshold", {"required_purchase_total": 10, "rate": 5}, "A",
+             "A threshold promotion applies to the whole cart, but product A is given."),
+            ("threshold", {"required_purchase_total": 10, "rate": 100}, None,
+             "Global discount rate must be between 0 and 100. 100 is given instead."),
+        ]
+    )
+    def test_invalid(self, store, kind, parameters, product_name, message):
+        """
+        Test adding invalid promotions
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            add_promotion(store, kind, parameters, product_name)
+
+        assert exc_info.match(message)
+        assert m.Promotion.count(store) == 0
+
+    def test_unknown_product(self, store):
+        """
+        Test adding a promotion of a product not in the store
+
+        """
+
+        with pytest.raises(InstanceNotFound):
+            add_promotion(store, "multi_buy", {"quantity": 3, "price": 1}, "Z")
+
+    def test_make_rule(self):
+        """
+        Test making a rule from the registry
+
+        """
+
+        rule = make_rule("percent_off", {"required_quantity": 3, "percentage": 50})
+        assert rule.kind == "percent_off"
+        assert rule.compile_line(10, False)(7) == 10
+        assert rule.compile_cart(False) is None
+
+    def test_abstract_rule(self):
+        """
+        Test a rule type must implement the compilation of its discount
+
+        """
+
+        with pytest.raises(TypeError):
+            Rule()
+
+        class Incomplete(ProductRule):
+            pass
+
+        with pytest.raises(TypeError) as exc_info:
+            rule_type("incomplete")(Incomplete)
+
+        assert exc_info.match("does not implement compile_line")
+        assert "incomplete" not in RULE_TYPES
+
+        class Unplaced(Rule):
+            def compile_line(self, unit_price, in_cents):
+                return None
+
+            def compile_cart(self, in_cents):
+                return None
+
+        with pytest.raises(TypeError) as exc_info:
+            rule_type("unplaced")(Unplaced)
+
+        assert exc_info.match("must derive from ProductRule or CartWideRule")
+        assert "unplaced" not in RULE_TYPES
@@ -0,0 +1,196 @@
+import json
+
+import pytest
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.serialization import (
+    FORMAT_VERSION, decode_cart, encode_cart, restore_cart
+)
+
+
+@pytest.fixture(name="cart")
+def make_cart(store, counted_product):
+    """
+    Pytest fixture of a cart with serial-tracked and
+    counted products
+
+    """
+    cart = ShoppingCart(store=store)
+    cart.add_order({"A": 7, "B": 4, "C": 5})
+    cart.add_product_items("D", 3)
+    return cart
+
+
+@pytest.fixture(name="counted_product")
+def add_counted_product(store):
+    """
+    Pytest fixture to add a product which is
+    not serial-tracked to the store
+
+    """
+    product = m.Product(
+        id=100,
+        name="D",
+        unit_price=100,
+        is_serial_tracked=False,
+        number_available=10
+    )
+    store.add(product)
+    store.commit()
+    return product
+
+
+class TestCartEncoding:
+    """
+    Test encoding carts into compact binary strings
+    """
+
+    def test_round_trip(self, cart):
+        """
+        Test decoding gives back the content of the cart
+
+        """
+
+        data = encode_cart(cart)
+        parked = decode_cart(data)
+
+        assert parked.cart_id == cart.cart_id
+        assert parked.catalog_version == m.catalog_version(cart.store)
+        assert parked.quantities == cart.quantities
+        assert parked.reserved == cart._reserved
+        assert parked.item_ids == []
+
+    def test_compact(self, cart):
+        """
+        Test the encoding is smaller than the same content in JSON
+
+        """
+
+        data = encode_cart(cart)
+        as_json = json.dumps(
+            [cart.cart_id, cart.quantities, cart._reserved]
+        ).encode()
+
+        assert len(data) < len(as_json)
+
+    @pytest.mark.parametrize(
+        "data, message",
+        [
+            (b"", "The data is not an encoded cart."),
+            (b"XX" + bytes(20), "The data is not an encoded cart."),
+            (b"SC", "The data is not an encoded cart."),
+            (b"SC" + bytes([FORMAT_VERSION + 1]) + bytes(20),
+             f"Cart encoding version {FORMAT_VERSION + 1} is not supported."),
+        ]
+    )
+    def test_invalid(self, data, message):
+        """
+        Test decoding data which is not an encoded cart
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            decode_cart(data)
+
+        assert exc_info.match(message)
+
+    def test_truncated(self, cart):
+        """
+        Test decoding a truncated cart
+
+        """
+
+        with pytest.raises(InvalidValue):
+            decode_cart(encode_cart(cart)[:-1])
+
+
+class TestRestoreCart:
+    """
+    Test rebuilding carts from their encoding
+    """
+
+    def test_restore(self, store, cart, statements):
+        """
+        Test a restored cart prices as the original with one
+        query of its products, besides the pricing mode of the
+        store read by any new cart
+
+        """
+
+        data = encode_cart(cart)
+        store.expire_all()
+        statements.clear()
+
+        restored = restore_cart(store, data)
+
+        assert len(statements) == 2
+        assert "FROM product" in statements[1]
+        assert restored.cart_id == cart.cart_id
+        assert restored.number_of_items == cart.number_of_items
+        assert restored.price_breakdown(12.5, 500, 20) == cart.price_breakdown(12.5, 500, 20)
+        assert {product.name: quantity for product, quantity in restored.product_list.items()} \
+            == {"A": 7, "B": 4, "C": 5, "D": 3}
+
+    def test_checkout(self, store, cart):
+        """
+        Test a restored cart checks out its reservations
+
+        """
+
+        restored = restore_cart(store, encode_cart(cart))
+        restored.checkout()
+
+        assert m.Reservation.count(store) == 0
+        assert m.Product.with_name(store, "D").number_available == 7
+
+    def test_unreserved_items(self, store):
+        """
+        Test the unreserved items of a cart are restored
+
+        """
+
+        items = m.Product.pick(store, "A", 2)
+        cart = ShoppingCart(store=store, items=items)
+
+        restored = restore_cart(store, encode_cart(cart))
+
+        assert restored.items == items
+        assert restored.quantities == cart.quantities
+
+    def test_removed_product(self, store, cart):
+        """
+        Test restoring a cart of a product no longer in the store
+
+        """
+
+        data = encode_cart(cart)
+        cart.empty()
+        store.delete(m.Product.with_name(store, "D"))
+        store.commit()
+
+        with pytest.raises(InstanceNotFound):
+            restore_cart(store, data)
+
+    def test_changed_catalog(self, store, cart):
+        """
+        Test a cart encoded before a price change is priced at the
+        new catalog version, or rejected if the same catalog is required
+
+        """
+
+        data = encode_cart(cart)
+        assert decode_cart(data).catalog_version == m.catalog_version(store)
+
+        m.Product.with_name(store, "A").unit_price = 10
+        store.commit()
+
+        restored = restore_cart(store, data)
+        assert restored.catalog_version == m.catalog_version(store)
+        assert restored.total_marked_price == cart.price().total_marked_price
+        assert restored.price_breakdown(8) == cart.price_breakdown(8)
+
+        with pytest.raises(InvalidValue) as exc_info:
+            restore_cart(store, data, same_catalog=True)
+        assert exc_info.match(f"but the store is at version {m.catalog_version(store)}.")
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue, OverDemand, ServiceBusy
+from shopping_cart.shopping.service import CartService
+from shopping_cart.store.operations import populate
+
+
+@pytest.fixture(name="session_factory")
+def make_session_factory(tmp_path):
+    """
+    Pytest fixture of a session factory of a file-backed
+    store shared between threads
+
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    m.Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=m.StoreSession)
+
+    session = factory()
+    populate(
+        {
+            "products": [
+                {
+                    "name": "A",
+                    "unit_price": 10,
+                    "number_in_store": 100,
+                    "promotion": {"required_quantity": 2, "percentage": 50}
+                },
+                {"name": "D", "unit_price": 2, "number_in_store": 100, "serial_tracked": False}
+            ]
+        },
+        session,
+        bulk=True
+    )
+    session.close()
+
+    yield factory
+    engine.dispose()
+
+
+class TestCartService:
+    """
+    Test the asyncio facade over the store and the carts
+    """
+
+    def test_cart(self, session_factory):
+        """
+        Test adding, removing, pricing and checking out a cart
+
+        """
+
+        async def scenario():
+            async with CartService(session_factory, workers=2) as service:
+                cart_id = await service.create_cart()
+                await service.add_order(cart_id, {"A": 3, "D": 4})
+                await service.remove_product_items(cart_id, "D", 1)
+
+                assert await service.product_list(cart_id) == {"A": 3, "D": 3}
+                breakdown = await service.price_breakdown(cart_id, 10)
+
+                await service.checkout(cart_id)
+                with pytest.raises(InstanceNotFound):
+                    await service.price_breakdown(cart_id, 10)
+
+                return breakdown
+
+        assert asyncio.run(scenario()) == {
+            "total_discount": 5, "total_tax": 3.1, "total_price": 34.1
+        }
+
+        session = session_factory()
+        assert m.Product.with_name(session, "D").number_available == 97
+        assert len(m.Product.pick(session, "A", 97)) == 97
+        session.close()
+
+    def test_concurrent(self, session_factory):
+        """
+        Test many carts reserving concurrently share out the stock
+
+        """
+
+        async def shop(service):
+            cart_id = await service.create_cart()
+            for _ in range(5):
+                await service.add_product_items(cart_id, "D", 1)
+                await service.add_product_items(cart_id, "A", 1)
+            return await service.price_breakdown(cart_id, 0)
+
+        async def scenario():
+            async with CartService(session_factory, workers=4, max_pending=3) as service:
+                return await asyncio.gather(*(shop(service) for _ in range(20)))
+
+        breakdowns = asyncio.run(scenario())
+
+        assert all(breakdown["total_price"] == 50 - 10 + 10 for breakdown in breakdowns)
+        session = session_factory()
+        assert m.Product.with_name(session, "D").number_available == 0
+        assert m.Reservation.count(session) == 200
+        session.close()
+
+    def test_errors(self, session_factory):
+        """
+        Test a failed request leaves the worker usable
+
+        """
+
+        async def scenario():
+            async with CartService(session_factory, workers=1) as service:
+                cart_id = await service.create_cart()
+                with pytest.raises(OverDemand):
+                    await service.add_product_items(cart_id, "D", 101)
+
+                await service.add_product_items(cart_id, "D", 1)
+                assert await service.product_list(cart_id) == {"D": 1}
+                assert len(await service.pick("A", 3)) == 3
+
+        asyncio.run(scenario())
+
+    def test_busy(self, session_factory):
+        """
+        Test a request waiting past the timeout for a slot
+
+        """
+
+        async def scenario():
+            async with CartService(
+                    session_factory, workers=1, max_pending=1, timeout=0.01
+            ) as service:
+                cart_id = await service.create_cart()
+                slow = asyncio.ensure_future(
+                    service._run(0, lambda: asyncio.run(asyncio.sleep(0.2)))
+                )
+                await asyncio.sleep(0.01)
+
+                with pytest.raises(ServiceBusy):
+                    await service.product_list(cart_id)
+
+                await slow
+
+        asyncio.run(scenario())
+
+    @pytest.mark.parametrize(
+        "workers, max_pending, message",
+        [
+            (0, None, "Number of workers must be positive. 0 is given."),
+            (1, 0, "Maximum number of pending requests must be positive. 0 is given."),
+        ]
+    )
+    def test_invalid(self, session_factory, workers, max_pending, message):
+        """
+        Test making a service with invalid bounds
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            CartService(session_factory, workers, max_pending)
+
+        assert exc_info.match(message)
@@ -0,0 +1,356 @@
+from datetime import datetime, timedelta
+import multiprocessing
+
+import pytest
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, InvalidValue, OverDemand, ReservationExpired
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.rules import add_promotion
+from shopping_cart.shopping.shared import HoldSweeper, SharedCart, SharedStore, available_stock
+
+
+# shared store of a worker process
+_shared = None
+
+
+def attach(shared):
+    """
+    Keep the shared store given to a worker process as it starts
+    """
+    global _shared
+    _shared = shared
+
+
+def add_units(repeat):
+    """
+    Add a unit of A to a cart of a worker process again and again,
+    returning the number of units added
+    """
+    cart = SharedCart(_shared)
+    added = 0
+    for _ in range(repeat):
+        try:
+            cart.add_product_items("A", 1)
+            added += 1
+        except OverDemand:
+            pass
+
+    cart.checkout()
+    return added
+
+
+@pytest.fixture(name="shared")
+def publish_store(store):
+    """
+    Pytest fixture of the mock store published in shared memory
+
+    """
+    with SharedStore.publish(store, stripes=2, context=multiprocessing.get_context("spawn")) \
+            as shared:
+        yield shared
+
+
+class TestSharedStore:
+    """
+    Test the catalog and the stock counters of a store in shared memory
+    """
+
+    def test_publish(self, store, shared):
+        """
+        Test the catalog and the stock are those of the store
+
+        """
+
+        assert shared.catalog.version == m.catalog_version(store)
+        for product in m.Product.all(store):
+            assert shared.catalog.product_id(product.name) == product.id
+            assert shared.available(product.id) == available_stock(store)[product.id]
+
+        assert [shared.available(m.Product.with_name(store, name).id) for name in "ABC"] \
+            == [30, 20, 10]
+
+        with pytest.raises(InvalidValue):
+            SharedStore.publish(store, stripes=0)
+        with pytest.raises(InvalidValue):
+            SharedStore.publish(store, stripes=4, capacity=3)
+
+    def test_reserve(self, store, shared):
+        """
+        Test units are reserved all or nothing and released
+
+        """
+
+        a, b = (m.Product.with_name(store, name).id for name in "AB")
+
+        holds = shared.reserve({a: 10, b: 5})
+        assert (shared.available(a), shared.available(b)) == (20, 15)
+
+        with pytest.raises(OverDemand) as exc_info:
+            shared.reserve({a: 1, b: 16})
+        assert exc_info.match("only 15 of B is available, but 16 is requested")
+        assert (shared.available(a), shared.available(b)) == (20, 15)
+
+        assert shared.release(holds[a], 4) == 4
+        assert shared.release(holds[a]) == 6
+        assert shared.release(holds[a]) == 0
+        assert shared.release(holds[b], 10) == 5
+        assert (shared.available(a), shared.available(b)) == (30, 20)
+
+        with pytest.raises(InstanceNotFound):
+            shared.reserve({1000: 1})
+
+    def test_confirm(self, store, shared):
+        """
+        Test held units are checked out all or nothing
+
+        """
+
+        a, b = (m.Product.with_name(store, name).id for name in "AB")
+
+        holds = shared.reserve({a: 10, b: 5})
+        shared.release(holds[b])
+        with pytest.raises(ReservationExpired):
+            shared.confirm(holds.values())
+        assert shared.release(holds[a]) == 10
+
+        holds = shared.reserve({a: 10, b: 5})
+        shared.confirm(holds.values())
+        assert shared.release(holds[a]) == 0
+        assert (shared.available(a), shared.available(b)) == (20, 15)
+
+    def test_expire(self, store, shared):
+        """
+        Test expired holds are returned to the stock, and the
+        id of a swept hold does not release the next hold in
+        its slot
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+        now = datetime.utcnow()
+
+        expiring = shared.reserve({a: 10}, ttl=timedelta(minutes=1), now=now)
+        kept = shared.reserve({a: 5}, ttl=timedelta(hours=1), now=now)
+        assert shared.release_expired(now + timedelta(seconds=30)) == 0
+        assert shared.release_expired(now + timedelta(minutes=2)) == 1
+        assert shared.available(a) == 25
+
+        with pytest.raises(ReservationExpired):
+            shared.confirm(expiring.values())
+        assert shared.release(expiring[a]) == 0
+        assert shared.available(a) == 25
+
+        shared.reserve({a: 5}, now=now)
+        assert shared.release(expiring[a]) == 0
+        assert shared.release(kept[a]) == 5
+        assert shared.available(a) == 25
+
+    def test_owner(self, store, shared):
+        """
+        Test the holds of an exited process are returned to the stock
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+
+        shared.reserve({a: 10}, owner=1)
+        shared.reserve({a: 5}, owner=2)
+        assert shared.release_owned(1) == 1
+        assert shared.available(a) == 25
+
+    def test_capacity(self, store):
+        """
+        Test no more holds than the capacity are taken, unless
+        expired holds make room
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+        now = datetime.utcnow()
+
+        with SharedStore.publish(store, stripes=1, capacity=2) as shared:
+            shared.reserve({a: 1}, ttl=timedelta(minutes=1), now=now)
+            shared.reserve({a: 1}, now=now)
+            with pytest.raises(OverDemand) as exc_info:
+                shared.reserve({a: 1}, now=now)
+            assert exc_info.match("No hold left for A")
+            assert shared.available(a) == 28
+
+            shared.reserve({a: 3}, now=now + timedelta(minutes=2))
+            assert shared.available(a) == 26
+
+    def test_sweeper(self, store, shared):
+        """
+        Test a sweeper thread releases expired holds
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+        shared.reserve({a: 10}, ttl=timedelta(0))
+
+        sweeper = HoldSweeper(shared, interval=0.01)
+        sweeper.start()
+        try:
+            for _ in range(500):
+                if shared.available(a) == 30:
+                    break
+                sweeper._stopped.wait(0.01)
+        finally:
+            sweeper.stop()
+
+        assert shared.available(a) == 30
+        assert sweeper.sweep() == 0
+
+    @pytest.mark.parametrize("quantity", [0, -5])
+    def test_invalid_quantity(self, store, shared, quantity):
+        """
+        Test non-positive quantities neither reserve nor release units
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+
+        with pytest.raises(InvalidValue) as exc_info:
+            shared.reserve({a: quantity})
+        assert exc_info.match("Quantity request must be positive.")
+
+        hold = shared.reserve({a: 1})[a]
+        with pytest.raises(InvalidValue) as exc_info:
+            shared.release(hold, quantity)
+        assert exc_info.match("Quantity request must be positive.")
+        shared.release(hold)
+
+        assert shared.available(a) == 30
+
+    def test_processes(self, store, shared):
+        """
+        Test worker processes share the stock, so no more units
+        are reserved than there are in store
+
+        """
+
+        with multiprocessing.get_context("spawn").Pool(
+                4, initializer=attach, initargs=(shared,)
+        ) as pool:
+            added = pool.map(add_units, [10] * 4)
+
+        assert sum(added) == 30
+        assert shared.available(m.Product.with_name(store, "A").id) == 0
+
+
+class TestSharedCart:
+    """
+    Test shopping carts on a shared store
+    """
+
+    @pytest.mark.parametrize("order", [{"A": 2}, {"A": 3, "B": 4, "C": 3}])
+    def test_price(self, store, order):
+        """
+        Test a shared cart prices as a cart of the store
+
+        """
+
+        add_promotion(store, "threshold", {"required_purchase_total": 100, "rate": 5})
+        cart = ShoppingCart(store=store)
+        cart.add_order(order)
+
+        with SharedStore.publish(store) as shared:
+            shared_cart = SharedCart(shared)
+            shared_cart.add_order(order)
+
+            assert shared_cart.quantities == cart.quantities
+            assert shared_cart.total_marked_price == cart.total_marked_price
+            assert shared_cart.discounted_subtotal == pytest.approx(cart.discounted_subtotal)
+            assert shared_cart.price_breakdown(12.5, 500, 20) == cart.price_breakdown(12.5, 500, 20)
+            assert {
+                product.name: quantity for product, quantity in shared_cart.product_list.items()
+            } == order
+
+    def test_reserve(self, store, shared):
+        """
+        Test the units of a cart are taken from and returned to
+        the shared stock
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+        cart = SharedCart(shared)
+
+        cart.add_product_items("A", 5)
+        cart.remove_product_items("A", 2)
+        assert cart.quantities == {a: 3}
+        assert shared.available(a) == 27
+
+        cart.empty()
+        assert cart.quantities == {}
+        assert shared.available(a) == 30
+
+        cart.add_order({"A": 4})
+        cart.checkout()
+        assert cart.number_of_items == 0
+        assert shared.available(a) == 26
+
+    def test_expired_checkout(self, store, shared):
+        """
+        Test a cart whose holds have expired is not checked out
+
+        """
+
+        a = m.Product.with_name(store, "A").id
+        cart = SharedCart(shared, reservation_ttl=timedelta(0))
+        cart.add_order({"A": 2, "B": 1})
+        cart.add_product_items("A", 3)
+
+        assert shared.release_expired(datetime.utcnow() + timedelta(seconds=1)) == 3
+        with pytest.raises(ReservationExpired):
+            cart.checkout()
+        assert cart.quantities[a] == 5
+        assert shared.available(a) == 30
+
+    @pytest.mark.parametrize(
+        "order, exception",
+        [
+            ({"A": 31}, OverDemand),
+            ({"A": 1, "Z": 1}, InstanceNotFound),
+            ({"A": 0}, InvalidValue),
+        ]
+    )
+    def test_invalid_order(self, store, shared, order, exception):
+        """
+        Test an invalid order adds nothing to the cart
+
+        """
+
+        cart = SharedCart(shared)
+        with pytest.raises(exception):
+            cart.add_order(order)
+
+        assert cart.quantities == {}
+        assert shared.available(m.Product.with_name(store, "A").id) == 30
+
+        with pytest.raises(InvalidValue):
+            cart.remove_product_items("A", 1)
+
+    def test_holds(self, store, shared):
+        """
+        Test a shared cart keeps the holds of its units rather than
+        the items and reservations of a store database
+
+        """
+
+        a, c = (m.Product.with_name(store, name).id for name in "AC")
+        cart = SharedCart(shared)
+        cart.add_order({"A": 3, "C": 2})
+        cart.add_product_items("A", 1)
+
+        holds = cart.holds
+        assert {product_id: sum(held.values()) for product_id, held in holds.items()} \
+            == {a: 4, c: 2}
+        assert len(holds[a]) == 2
+        assert not hasattr(cart, "items")
+        assert not hasattr(cart, "reservations")
+
+        cart.remove_product_items("A", 2)
+        assert list(cart.holds[a].values()) == [2]
+        assert cart.footprint() > 0
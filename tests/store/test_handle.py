@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from shopping_cart import data_model as m
+from shopping_cart.data_model.migration import migrate
+from shopping_cart.make_store import make_new_store
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.store.handle import StoreHandle, is_in_memory
+from shopping_cart.store.operations import populate
+
+_PRODUCTS = {
+    "products": [
+        {"name": "A", "unit_price": 10, "number_in_store": 200},
+        {"name": "D", "unit_price": 2, "number_in_store": 200, "serial_tracked": False}
+    ]
+}
+
+
+@pytest.fixture(name="handle", params=["memory", "file"])
+def make_handle(request, tmp_path):
+    """
+    Pytest fixture of a handle of an in-memory and
+    of a file-backed store
+
+    """
+    url = "sqlite://" if request.param == "memory" else f"sqlite:///{tmp_path / 'store.db'}"
+    handle = StoreHandle(url)
+    migrate(handle.engine)
+    populate(_PRODUCTS, handle.session(), bulk=True)
+    yield handle
+    handle.dispose()
+
+
+def _in_thread(function):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(function).result()
+
+
+def _config(tmp_path):
+    path = tmp_path / "store.yaml"
+    path.write_text(
+        "products:\n"
+        "  - name: A\n    unit_price: 10\n    number_in_store: 5\n"
+        "  - name: B\n    unit_price: 20\n    number_in_store: 5\n"
+    )
+    return path
+
+
+class TestStoreHandle:
+    """
+    Test sharing a store between threads through a handle
+    """
+
+    @pytest.mark.parametrize(
+        "url, in_memory",
+        [
+            ("sqlite://", True),
+            ("sqlite:///:memory:", True),
+            ("sqlite:///store.db", False),
+            ("postgresql://localhost/store", False),
+        ]
+    )
+    def test_is_in_memory(self, url, in_memory):
+        """
+        Test telling in-memory databases apart
+
+        """
+
+        assert is_in_memory(url) is in_memory
+
+    def test_pool(self, tmp_path):
+        """
+        Test an in-memory store has a single shared connection
+        and a file-backed one a pool of connections
+
+        """
+
+        assert isinstance(StoreHandle().engine.pool, StaticPool)
+        assert isinstance(StoreHandle(f"sqlite:///{tmp_path / 'store.db'}").engine.pool, QueuePool)
+
+    def test_session_per_thread(self, handle):
+        """
+        Test each thread has its own session of the same store
+
+        """
+
+        session = handle.session()
+        other = _in_thread(handle.session)
+
+        assert other is not session
+        assert _in_thread(lambda: m.Product.count(handle.session())) == 2
+
+    def test_carts_across_threads(self, handle):
+        """
+        Test carts of a handle are served by many threads at once,
+        and a cart by different threads in turn
+
+        """
+
+        def shop(_):
+            cart = ShoppingCart(store=handle)
+            for _ in range(5):
+                cart.add_product_items("A", 1)
+                cart.add_product_items("D", 2)
+            return cart
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            carts = list(executor.map(shop, range(16)))
+
+        assert all(cart.total_price(0) == 70 for cart in carts)
+        assert {product.name: quantity for product, quantity in carts[0].product_list.items()} \
+            == {"A": 5, "D": 10}
+        assert m.Product.with_name(handle.session(), "D").number_available == 200 - 16 * 10
+
+        _in_thread(lambda: carts[0].remove_product_items("D", 4))
+        assert _in_thread(lambda: carts[0].price_breakdown(0))["total_price"] == 62
+
+        for cart in carts:
+            cart.checkout()
+        assert m.Reservation.count(handle.session()) == 0
+
+    def test_failed_operation(self, handle):
+        """
+        Test a failed operation rolls back the borrowed session
+
+        """
+
+        with pytest.raises(ZeroDivisionError):
+            with handle.borrow() as session:
+                session.add(m.StoreSetting(key="key", value="value"))
+                session.flush()
+                1 / 0
+
+        assert m.StoreSetting.get(handle.session(), "key") is None
+
+    def test_transactions_across_threads(self, handle):
+        """
+        Test a thread neither commits nor rolls back what another
+        thread leaves uncommitted, although the sessions of an
+        in-memory store share its connection
+
+        """
+
+        def leave_uncommitted():
+            with handle.borrow() as session:
+                session.add(m.StoreSetting(key="uncommitted", value="1"))
+                session.flush()
+
+        def commit():
+            with handle.borrow() as session:
+                session.add(m.StoreSetting(key="committed", value="1"))
+                session.commit()
+
+        def roll_back():
+            with handle.borrow() as session:
+                session.add(m.StoreSetting(key="rolled_back", value="1"))
+                session.flush()
+                session.rollback()
+
+        _in_thread(leave_uncommitted)
+        _in_thread(commit)
+        _in_thread(leave_uncommitted)
+        _in_thread(roll_back)
+
+        with handle.borrow() as session:
+            assert m.StoreSetting.get(session, "uncommitted") is None
+            assert m.StoreSetting.get(session, "committed") == "1"
+            assert m.StoreSetting.get(session, "rolled_back") is None
+
+
+class TestMakeNewStore:
+    """
+    Test making a store shared between threads
+    """
+
+    def test_as_handle(self, tmp_path):
+        """
+        Test making a file-backed store as a handle
+
+        """
+
+        handle = make_new_store(
+            _config(tmp_path), url=f"sqlite:///{tmp_path / 'store.db'}", as_handle=True
+        )
+
+        assert isinstance(handle, StoreHandle)
+        assert _in_thread(lambda: m.Product.count(handle.session())) == 2
+        handle.dispose()
+
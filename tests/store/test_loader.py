@@ -0,0 +1,78 @@
+import io
+from pathlib import Path
+
+import pytest
+import yaml
+
+from shopping_cart.exc import InvalidValue
+from shopping_cart.store.loader import iter_products
+
+directory = Path(__file__).parent.parent
+
+
+class TestIterProducts:
+    """
+    Test the streaming store products configuration parser
+    """
+
+    def test_same_as_safe_load(self):
+        """
+        Test the streamed products are the same as the
+        fully loaded configuration
+
+        """
+
+        with open(directory / "mock_data/store.yaml") as f:
+            expected_products = yaml.safe_load(f)["products"]
+
+        with open(directory / "mock_data/store.yaml") as f:
+            products = iter_products(f)
+            assert next(products) == expected_products[0]
+            assert list(products) == expected_products[1:]
+
+    def test_skip_other_keys(self):
+        """
+        Test top-level keys other than products are skipped
+
+        """
+
+        config = (
+            "name: store\n"
+            "settings: {currency: GBP, tags: [a, b]}\n"
+            "products:\n"
+            "  - {name: A, unit_price: 1.5, number_in_store: 2, on_sale: yes}\n"
+            "owner: someone\n"
+        )
+
+        assert list(iter_products(config)) == [
+            {"name": "A", "unit_price": 1.5, "number_in_store": 2, "on_sale": True}
+        ]
+
+    def test_no_products(self):
+        """
+        Test a configuration without products
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            list(iter_products(io.StringIO("name: store\n")))
+
+        expected_error_message = "No products found in the store products configuration."
+        assert exc_info.match(expected_error_message)
+
+    def test_alias(self):
+        """
+        Test a configuration using YAML aliases
+
+        """
+
+        config = (
+            "products:\n"
+            "  - &a {name: A, unit_price: 1, number_in_store: 1}\n"
+            "  - *a\n"
+        )
+
+        with pytest.raises(InvalidValue) as exc_info:
+            list(iter_products(config))
+
+        assert exc_info.match("Unsupported YAML node AliasEvent")
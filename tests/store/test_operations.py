@@ -1,6 +1,15 @@
+from pathlib import Path
+
+import pytest
+import yaml
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
 from shopping_cart import data_model as m
+from shopping_cart.exc import InvalidValue
+from shopping_cart.store.operations import IdAllocator, populate, populate_products
 
-from sqlalchemy.orm import Session
+directory = Path(__file__).parent.parent
 
 
 class TestPopulate:
@@ -47,3 +56,203 @@ class TestPopulate:
 
         # Test items
         assert m.Item.count(store) == 60
+
+    def test_bulk_populate_same_rows(
+            self,
+            session: Session
+    ):
+        """
+        Test the bulk populate mode writes the same rows
+        as the ORM populate mode
+
+        Parameters
+        ----------
+        session
+            an empty store session
+
+        """
+
+        with open(directory / "mock_data/store.yaml") as f:
+            product_dict = yaml.safe_load(f)
+
+        def _rows(bulk, chunk_size):
+            engine = create_engine('sqlite://')
+            m.Base.metadata.create_all(engine)
+            store = sessionmaker(bind=engine, class_=m.StoreSession)()
+            populate(product_dict, store, bulk=bulk, chunk_size=chunk_size)
+
+            rows = {
+                table.name: sorted(
+                    tuple(row) for row in store.execute(table.select())
+                )
+                for table in m.Base.metadata.sorted_tables
+            }
+            store.close()
+            return rows
+
+        expected_rows = _rows(bulk=False, chunk_size=1)
+        assert len(expected_rows["item"]) == 60
+
+        # chunks smaller than, equal to and larger than the stock of a product
+        for chunk_size in (7, 10, 1000):
+            assert _rows(bulk=True, chunk_size=chunk_size) == expected_rows
+
+    def test_bulk_populate_invalid_chunk_size(
+            self,
+            session: Session
+    ):
+        """
+        Test bulk populate with a non-positive chunk size
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            populate({"products": []}, session, bulk=True, chunk_size=0)
+
+        expected_error_message = "Chunk size must be positive. 0 is given."
+        assert exc_info.match(expected_error_message)
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_populate_products_batches(
+            self,
+            session: Session,
+            bulk: bool
+    ):
+        """
+        Test populating products lazily in committed batches
+
+        """
+
+        with open(directory / "mock_data/store.yaml") as f:
+            products = yaml.safe_load(f)["products"]
+
+        reports = []
+        populate_products(
+            iter(products),
+            session,
+            bulk=bulk,
+            batch_size=2,
+            progress=lambda *report: reports.append(report)
+        )
+
+        assert reports == [(2, 50), (3, 60)]
+        assert [product.name for product in m.Product.all(session)] == ['A', 'B', 'C']
+        assert m.DiscountOffer.count(session) == 2
+        assert m.Item.count(session) == 60
+
+    def test_populate_products_invalid_batch_size(
+            self,
+            session: Session
+    ):
+        """
+        Test populating products with a non-positive batch size
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            populate_products([], session, batch_size=0)
+
+        expected_error_message = "Batch size must be positive. 0 is given."
+        assert exc_info.match(expected_error_message)
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_populate_counted_products(
+            self,
+            session: Session,
+            bulk: bool
+    ):
+        """
+        Test populating products which are not serial-tracked
+
+        """
+
+        populate(
+            {
+                "products": [
+                    {"name": "A", "unit_price": 1, "number_in_store": 3},
+                    {"name": "B", "unit_price": 2, "number_in_store": 500, "serial_tracked": False},
+                ]
+            },
+            session,
+            bulk=bulk
+        )
+
+        product_A = m.Product.with_name(session, 'A')
+        assert product_A.is_serial_tracked is True
+        assert len(product_A.items) == 3
+        assert product_A.number_available == 0
+
+        product_B = m.Product.with_name(session, 'B')
+        assert product_B.is_serial_tracked is False
+        assert product_B.items == []
+        assert product_B.number_available == 500
+        assert product_B.number_reserved == 0
+
+        assert m.Item.count(session) == 3
+
+
+class TestIdAllocator:
+    """
+    Test allocating the ids of the rows of a store
+    """
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_per_store(self, bulk: bool):
+        """
+        Test stores populated one after the other get the same ids
+
+        """
+
+        with open(directory / "mock_data/store.yaml") as f:
+            product_dict = yaml.safe_load(f)
+
+        def _ids():
+            engine = create_engine('sqlite://')
+            m.Base.metadata.create_all(engine)
+            store = sessionmaker(bind=engine, class_=m.StoreSession)()
+            populate(product_dict, store, bulk=bulk)
+
+            ids = (
+                [product.id for product in m.Product.all(store)],
+                sorted(offer.id for offer in m.DiscountOffer.all(store)),
+                sorted(item.id for item in m.Item.all(store))
+            )
+            store.close()
+            return ids
+
+        assert _ids() == _ids() == ([1, 2, 3], [1, 2], list(range(1, 61)))
+
+    def test_for_store(self, store: Session):
+        """
+        Test products added to a populated store follow its largest ids
+
+        """
+
+        populate(
+            {"products": [{"name": "D", "unit_price": 1, "number_in_store": 2}]},
+            store,
+            bulk=True
+        )
+
+        product_D = m.Product.with_name(store, "D")
+        assert product_D.id == 4
+        assert sorted(item.id for item in product_D.items) == [61, 62]
+
+        ids = IdAllocator.for_store(store)
+        assert (next(ids.product_ids), next(ids.offer_ids), next(ids.item_ids)) == (5, 3, 63)
+
+    def test_given(self, session: Session):
+        """
+        Test populating with a given allocator
+
+        """
+
+        populate(
+            {"products": [{"name": "A", "unit_price": 1, "number_in_store": 2}]},
+            session,
+            ids=IdAllocator(product_id=100, item_id=1000)
+        )
+
+        product_A = m.Product.with_name(session, "A")
+        assert product_A.id == 100
+        assert sorted(item.id for item in product_A.items) == [1000, 1001]
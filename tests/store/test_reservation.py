@@ -0,0 +1,442 @@
+from datetime import datetime, timedelta
+import random
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import (
+    InstanceNotFound, InvalidValue, OverDemand, ReservationExpired
+)
+from shopping_cart.store import reservation as reservation_module
+from shopping_cart.store.operations import populate
+from shopping_cart.store.reservation import (
+    ReservationSweeper, confirm, release, release_expired, reserve, reserve_order
+)
+
+
+def _available_ids(session: Session, name: str):
+    return [
+        item_id for item_id, in session.query(
+            m.Item.id
+        ).join(
+            m.Product
+        ).filter(
+            m.Product.name == name,
+            m.Item.is_available
+        ).order_by(
+            m.Item.id
+        )
+    ]
+
+
+@pytest.fixture(name="counted_store")
+def make_counted_store(session):
+    """
+    Pytest fixture of a store with a product which is
+    not serial-tracked
+
+    """
+    populate(
+        {
+            "products": [
+                {"name": "D", "unit_price": 10, "number_in_store": 5, "serial_tracked": False}
+            ]
+        },
+        session
+    )
+
+    return session
+
+
+@pytest.fixture(name="session_factory")
+def make_session_factory(tmp_path):
+    """
+    Pytest fixture of a session factory of a file-backed
+    store shared between threads
+
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    m.Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=m.StoreSession)
+
+    session = factory()
+    populate(
+        {
+            "products": [
+                {"name": "A", "unit_price": 1, "number_in_store": 100},
+                {"name": "D", "unit_price": 1, "number_in_store": 100, "serial_tracked": False}
+            ]
+        },
+        session,
+        bulk=True
+    )
+    session.close()
+
+    yield factory
+    engine.dispose()
+
+
+class TestReserve:
+    """
+    Test reserving units of a product
+    """
+
+    def test_reserve_items(self, store):
+        """
+        Test reserving items of a serial-tracked product
+
+        """
+
+        first_id = _available_ids(store, 'C')[0]
+        now = datetime(2021, 1, 1)
+
+        reservation = reserve(store, 'C', 3, "cart", timedelta(minutes=5), now=now)
+        assert reservation.cart_id == "cart"
+        assert reservation.quantity == 3
+        assert reservation.expires_at == datetime(2021, 1, 1, 0, 5)
+        assert reservation.product.name == 'C'
+        assert [item.id for item in reservation.items] == [first_id, first_id + 1, first_id + 2]
+        assert all(not item.is_available for item in reservation.items)
+
+        # the reserved items are no longer available
+        other = reserve(store, 'C', 2, "other")
+        assert [item.id for item in other.items] == [first_id + 3, first_id + 4]
+        assert len(_available_ids(store, 'C')) == 5
+
+    def test_reserve_random_items(self, store):
+        """
+        Test reserving random items of a serial-tracked product
+
+        """
+
+        reservation = reserve(store, 'A', 4, "cart", is_random=True)
+        assert len(reservation.items) == 4
+        assert len(_available_ids(store, 'A')) == 26
+
+        product_id = m.Product.with_name(store, 'A').id
+        expected = m.Item.sample_available_ids(store, product_id, 3, rng=random.Random(7))
+        reservation = reserve(store, 'A', 3, "other", is_random=True, rng=random.Random(7))
+        assert sorted(item.id for item in reservation.items) == sorted(expected)
+
+    def test_reserve_units(self, counted_store):
+        """
+        Test reserving units of a product which is not serial-tracked
+
+        """
+
+        reservation = reserve(counted_store, 'D', 3, "cart")
+        assert reservation.items == []
+
+        product = m.Product.with_name(counted_store, 'D')
+        assert product.number_available == 2
+        assert product.number_reserved == 3
+
+    @pytest.mark.parametrize("name, available", [('C', 10), ('D', 5)])
+    def test_over_demand(self, store, counted_store, name, available):
+        """
+        Test nothing is reserved if more units than
+        available are requested
+
+        """
+
+        with pytest.raises(OverDemand) as exc_info:
+            reserve(store, name, available + 1, "cart")
+
+        expected_error_message = (
+            f"Excess demand request. Only {available} is available, "
+            f"but {available + 1} is requested."
+        )
+        assert exc_info.match(expected_error_message)
+
+        assert m.Reservation.count(store) == 0
+        assert m.Product.with_name(store, name).number_reserved == 0
+        assert len(_available_ids(store, 'C')) == 10
+
+    def test_invalid_quantity(self, store):
+        """
+        Test reserving a non-positive quantity
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            reserve(store, 'C', 0, "cart")
+
+        assert exc_info.match("Quantity request must be positive.")
+
+    def test_concurrent_reserve(self, session_factory):
+        """
+        Test concurrent reservations from different sessions
+        never claim the same items
+
+        """
+
+        reserved = []
+        errors = []
+
+        def _reserve(name):
+            session = session_factory()
+            try:
+                for _ in range(5):
+                    reservation = reserve(session, name, 2, threading.current_thread().name)
+                    reserved.append((name, [item.id for item in reservation.items]))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+        threads = [
+            threading.Thread(target=_reserve, args=(name,))
+            for name in ('A', 'D') * 5
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+
+        item_ids = [item_id for name, ids in reserved if name == 'A' for item_id in ids]
+        assert len(item_ids) == len(set(item_ids)) == 50
+
+        session = session_factory()
+        product = m.Product.with_name(session, 'D')
+        assert (product.number_available, product.number_reserved) == (50, 50)
+        session.close()
+
+
+class TestReserveOrder:
+    """
+    Test reserving the units of several products at once
+    """
+
+    def test_reserve_order(self, store, counted_store):
+        """
+        Test reserving an order
+
+        """
+
+        first_ids = {name: _available_ids(store, name)[0] for name in 'ABC'}
+
+        reservations = reserve_order(store, {'C': 2, 'D': 3, 'A': 1}, "cart")
+        assert [
+            (reservation.product.name, reservation.quantity)
+            for reservation in reservations
+        ] == [('C', 2), ('D', 3), ('A', 1)]
+        assert [item.id for item in reservations[0].items] == [
+            first_ids['C'], first_ids['C'] + 1
+        ]
+        assert reservations[1].items == []
+        assert [item.id for item in reservations[2].items] == [first_ids['A']]
+
+        assert len(_available_ids(store, 'C')) == 8
+        assert m.Product.with_name(store, 'D').number_available == 2
+
+    def test_fixed_number_of_queries(self, store, counted_store, statements):
+        """
+        Test the number of statements only grows by the INSERT
+        of the reservation of each product in the order
+
+        """
+
+        reserve_order(store, {'C': 1}, "cart")
+        assert [statement.split()[0] for statement in statements] == [
+            "SELECT", "SELECT", "INSERT", "UPDATE", "SELECT", "SELECT"
+        ]
+
+        statements.clear()
+        reserve_order(store, {'C': 1, 'B': 1, 'A': 2, 'D': 1}, "cart")
+        assert [statement.split()[0] for statement in statements] == [
+            "SELECT", "SELECT", "INSERT", "INSERT", "INSERT", "INSERT",
+            "UPDATE", "UPDATE", "SELECT", "SELECT"
+        ]
+
+    def test_random_order(self, store, counted_store):
+        """
+        Test reserving an order with randomly picked items
+
+        """
+
+        reservations = reserve_order(store, {'C': 4, 'D': 1, 'A': 3}, "cart", is_random=True)
+
+        assert [len(reservation.items) for reservation in reservations] == [4, 0, 3]
+        assert all(
+            item.product.name == reservation.product.name and not item.is_available
+            for reservation in reservations
+            for item in reservation.items
+        )
+        assert len(_available_ids(store, 'C')) == 6
+
+    def test_claimed_one_by_one(self, store, counted_store, monkeypatch):
+        """
+        Test the units are claimed product by product when the
+        batched claims fall short
+
+        """
+
+        first_ids = {name: _available_ids(store, name)[0] for name in 'AC'}
+
+        def _claim_short(session, claims, is_random, rng=None):
+            claim_all(session, claims, is_random, rng)
+            return False
+
+        claim_all = reservation_module._claim_all
+        monkeypatch.setattr(reservation_module, "_claim_all", _claim_short)
+        reservations = reserve_order(store, {'C': 2, 'D': 3, 'A': 1}, "cart")
+
+        assert m.Reservation.count(store) == 3
+        assert [item.id for item in reservations[0].items] == [
+            first_ids['C'], first_ids['C'] + 1
+        ]
+        assert [item.id for item in reservations[2].items] == [first_ids['A']]
+        assert len(_available_ids(store, 'C')) == 8
+        assert m.Product.with_name(store, 'D').number_available == 2
+
+    def test_over_demand(self, store, counted_store):
+        """
+        Test nothing is reserved if any product is short of stock
+
+        """
+
+        with pytest.raises(OverDemand) as exc_info:
+            reserve_order(store, {'A': 5, 'C': 11, 'D': 6, 'B': 20}, "cart")
+
+        expected_error_message = (
+            "Excess demand request. only 10 of C is available, but 11 is requested; "
+            "only 5 of D is available, but 6 is requested."
+        )
+        assert exc_info.match(expected_error_message)
+
+        assert m.Reservation.count(store) == 0
+        assert len(_available_ids(store, 'A')) == 30
+
+    def test_not_found(self, store):
+        """
+        Test reserving an order with unknown products
+
+        """
+
+        with pytest.raises(InstanceNotFound) as exc_info:
+            reserve_order(store, {'A': 1, 'X': 1, 'Y': 2}, "cart")
+
+        assert exc_info.match("Product X, Y not found.")
+        assert m.Reservation.count(store) == 0
+
+
+class TestRelease:
+    """
+    Test releasing and confirming reserved units
+    """
+
+    def test_release_items(self, store):
+        """
+        Test releasing reserved items, partly then fully
+
+        """
+
+        reservation = reserve(store, 'C', 4, "cart")
+        reserved_ids = [item.id for item in reservation.items]
+
+        assert release(store, reservation, 1) == 1
+        assert reservation.quantity == 3
+        assert [item.id for item in reservation.items] == reserved_ids[:3]
+        assert len(_available_ids(store, 'C')) == 7
+
+        assert release(store, reservation) == 3
+        assert m.Reservation.count(store) == 0
+        assert len(_available_ids(store, 'C')) == 10
+
+        # releasing again does nothing
+        assert release(store, reservation) == 0
+
+    def test_release_units(self, counted_store):
+        """
+        Test releasing reserved units of a product
+        which is not serial-tracked
+
+        """
+
+        reservation = reserve(counted_store, 'D', 4, "cart")
+
+        assert release(counted_store, reservation, 3) == 3
+        product = m.Product.with_name(counted_store, 'D')
+        assert (product.number_available, product.number_reserved) == (4, 1)
+
+    @pytest.mark.parametrize("name", ['C', 'D'])
+    def test_confirm(self, store, counted_store, name):
+        """
+        Test checking out reserved units
+
+        """
+
+        reservation = reserve(store, name, 2, "cart")
+        confirm(store, reservation)
+
+        assert m.Reservation.count(store) == 0
+        product = m.Product.with_name(store, name)
+        assert product.number_reserved == 0
+        if name == 'C':
+            assert len(_available_ids(store, 'C')) == 8
+            assert m.Item.count(store) == 60
+        else:
+            assert product.number_available == 3
+
+    def test_release_expired(self, store, counted_store):
+        """
+        Test releasing expired reservations in bulk
+
+        """
+
+        now = datetime(2021, 1, 1)
+        expired = [
+            reserve(store, 'C', 3, "cart", timedelta(minutes=1), now=now),
+            reserve(store, 'D', 2, "cart", timedelta(minutes=1), now=now),
+            reserve(store, 'D', 1, "cart", timedelta(minutes=2), now=now)
+        ]
+        active = reserve(store, 'C', 1, "cart", timedelta(minutes=10), now=now)
+
+        assert release_expired(store, now + timedelta(minutes=5)) == 3
+
+        assert m.Reservation.all(store) == [active]
+        assert len(_available_ids(store, 'C')) == 9
+        product = m.Product.with_name(store, 'D')
+        assert (product.number_available, product.number_reserved) == (5, 0)
+
+        with pytest.raises(ReservationExpired):
+            confirm(store, expired[0])
+
+
+class TestReservationSweeper:
+    """
+    Test the background sweeper of expired reservations
+    """
+
+    def test_sweep(self, session_factory):
+        """
+        Test the sweeper releases expired reservations
+        in the background
+
+        """
+
+        session = session_factory()
+        reserve(session, 'A', 3, "cart", timedelta(seconds=-1))
+        reserve(session, 'D', 3, "cart", timedelta(seconds=-1))
+        reserve(session, 'A', 1, "cart")
+
+        sweeper = ReservationSweeper(session_factory, interval=0.01)
+        sweeper.start()
+        try:
+            for _ in range(500):
+                if m.Reservation.count(session) == 1:
+                    break
+                session.commit()
+                threading.Event().wait(0.01)
+        finally:
+            sweeper.stop()
+
+        assert m.Reservation.count(session) == 1
+        assert len(_available_ids(session, 'A')) == 99
+        assert m.Product.with_name(session, 'D').number_available == 100
+        session.close()
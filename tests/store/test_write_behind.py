@@ -0,0 +1,219 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InstanceNotFound, ReservationExpired
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.serialization import load_cart
+from shopping_cart.store.operations import populate
+from shopping_cart.store.reservation import release_expired
+from shopping_cart.store.write_behind import CartWriter
+
+
+def _lines(session):
+    return {
+        (line.cart_id, line.product.name): line.quantity
+        for line in m.CartLine.all(session)
+    }
+
+
+@pytest.fixture(name="session_factory")
+def make_session_factory(tmp_path):
+    """
+    Pytest fixture of a session factory of a file-backed
+    store shared between threads
+
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    m.Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=m.StoreSession)
+
+    session = factory()
+    populate(
+        {
+            "products": [
+                {"name": "A", "unit_price": 1, "number_in_store": 100},
+                {"name": "D", "unit_price": 2, "number_in_store": 100, "serial_tracked": False}
+            ]
+        },
+        session,
+        bulk=True
+    )
+    session.close()
+
+    yield factory
+    engine.dispose()
+
+
+class TestCartWriter:
+    """
+    Test persisting shopping carts behind the carts in memory
+    """
+
+    def test_coalesce(self, session_factory):
+        """
+        Test the changes of the carts are written in one
+        flush of a fixed number of statements
+
+        """
+
+        store = session_factory()
+        writer = CartWriter(session_factory)
+        first = ShoppingCart(store=store, cart_id="first", writer=writer)
+        second = ShoppingCart(store=store, cart_id="second", writer=writer)
+        for _ in range(5):
+            first.add_product_items("A", 1)
+        second.add_order({"A": 2, "D": 3})
+
+        assert writer.pending == 2
+        assert m.Cart.count(store) == 0
+
+        assert writer.flush() == 2
+        assert _lines(store) == {
+            ("first", "A"): 5, ("second", "A"): 2, ("second", "D"): 3
+        }
+
+        first.remove_product_items("A", 2)
+        second.empty()
+        writer.flush()
+
+        assert _lines(store) == {("first", "A"): 3}
+        assert [cart.id for cart in m.Cart.all(store)] == ["first"]
+        assert writer.flushes == 2
+        assert writer.writes == 4
+        store.close()
+
+    def test_threshold(self, session_factory):
+        """
+        Test reaching the number of pending carts flushes them
+
+        """
+
+        store = session_factory()
+        writer = CartWriter(session_factory, max_pending=3)
+        for i in range(3):
+            ShoppingCart(store=store, cart_id=f"cart_{i}", writer=writer).add_product_items("D", 1)
+
+        assert writer.pending == 0
+        assert m.Cart.count(store) == 3
+        store.close()
+
+    def test_background(self, session_factory):
+        """
+        Test the writer flushes on its interval, and the pending
+        carts once more when it stops
+
+        """
+
+        store = session_factory()
+        writer = CartWriter(session_factory, interval=0.01)
+        writer.start()
+        try:
+            cart = ShoppingCart(store=store, cart_id="cart", writer=writer)
+            cart.add_product_items("D", 4)
+            for _ in range(500):
+                if writer.pending == 0 and writer.flushes:
+                    break
+                threading.Event().wait(0.01)
+
+            assert writer.flushes >= 1
+            cart.add_product_items("A", 1)
+        finally:
+            writer.stop()
+
+        store.commit()
+        assert _lines(store) == {("cart", "D"): 4, ("cart", "A"): 1}
+        store.close()
+
+    def test_failed_flush(self, session_factory):
+        """
+        Test the carts of a failed flush are pending again
+
+        """
+
+        store = session_factory()
+        writer = CartWriter(session_factory)
+        writer.record("cart", {1000: 1})
+        store.execute("DROP TABLE cart_line")
+        store.commit()
+
+        with pytest.raises(Exception):
+            writer.flush()
+
+        assert writer.pending == 1
+        store.close()
+
+
+class TestLoadCart:
+    """
+    Test rebuilding persisted carts
+    """
+
+    def test_load(self, session_factory):
+        """
+        Test a persisted cart prices as the original and
+        checks out its reservations
+
+        """
+
+        store = session_factory()
+        writer = CartWriter(session_factory)
+        cart = ShoppingCart(store=store, cart_id="cart", writer=writer)
+        cart.add_order({"A": 3, "D": 4})
+        writer.flush()
+
+        restarted = session_factory()
+        loaded = load_cart(restarted, "cart")
+
+        assert loaded.quantities == cart.quantities
+        assert loaded.price_breakdown(12.5) == cart.price_breakdown(12.5)
+
+        loaded.checkout()
+        assert m.Reservation.count(restarted) == 0
+        store.close()
+        restarted.close()
+
+    def test_released(self, session_factory):
+        """
+        Test a cart whose reservations were swept is rejected, or
+        reserved again and checked out with the store stock
+
+        """
+
+        store = session_factory()
+        writer = CartWriter(session_factory)
+        cart = ShoppingCart(store=store, cart_id="cart", writer=writer)
+        cart.add_order({"A": 3, "D": 5})
+        writer.flush()
+
+        release_expired(store, now=datetime.utcnow() + timedelta(days=1))
+        assert m.Reservation.count(store) == 0
+
+        restarted = session_factory()
+        with pytest.raises(ReservationExpired) as exc_info:
+            load_cart(restarted, "cart")
+        assert exc_info.match("The reservations of A, D in cart cart have already been released.")
+
+        loaded = load_cart(restarted, "cart", reserve_released=True)
+        assert loaded.quantities == cart.quantities
+        loaded.checkout()
+
+        assert m.Product.with_name(restarted, "D").number_available == 95
+        assert m.Item.count(restarted) - restarted.query(m.Item).filter(
+            m.Item.is_available
+        ).count() == 3
+        store.close()
+        restarted.close()
+
+    def test_not_found(self, session_factory):
+        """
+        Test loading a cart which is not persisted
+
+        """
+
+        with pytest.raises(InstanceNotFound):
+            load_cart(session_factory(), "cart")
@@ -0,0 +1,256 @@
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+from shopping_cart import data_model as m
+from shopping_cart.exc import InvalidValue
+from shopping_cart.make_store import (
+    catalog_checksum, make_catalog_file, make_new_store, make_stores, open_store
+)
+from shopping_cart.shopping.cart import ShoppingCart
+from shopping_cart.shopping.catalog_file import MappedCatalog
+from shopping_cart.shopping.pricing import CENTS_PRICING, get_pricing_mode
+
+stores = Path(__file__).parent.parent / "files/stores"
+
+
+@pytest.fixture(name="config")
+def make_config(tmp_path):
+    """
+    Pytest fixture of a copy of a product configuration file
+
+    """
+    path = tmp_path / "store.yaml"
+    path.write_text((stores / "store_1.yaml").read_text())
+    return path
+
+
+class TestOpenStore:
+    """
+    Test opening file-backed stores
+    """
+
+    def test_reopen(self, tmp_path, config, caplog):
+        """
+        Test a store is populated once, and opened again as it is
+
+        """
+
+        path = tmp_path / "store.db"
+        with open_store(path, config) as handle:
+            products = {product.name: product.id for product in m.Product.all(handle.session())}
+            cart = ShoppingCart(store=handle)
+            cart.add_product_items("Dove Soap", 2)
+
+        with caplog.at_level(logging.INFO, logger="shopping_cart.make_store"):
+            with open_store(path, config) as handle:
+                store = handle.session()
+                assert {product.name: product.id for product in m.Product.all(store)} == products
+                assert m.Reservation.count(store) == 1
+
+        assert f"Store {path} is up to date" in caplog.text
+
+    def test_changed(self, tmp_path, config):
+        """
+        Test a store is populated again when the configuration
+        or the pricing mode changes
+
+        """
+
+        path = tmp_path / "store.db"
+        open_store(path, config).dispose()
+
+        config.write_text((stores / "store_2.yaml").read_text())
+        with open_store(path, config, pricing_mode=CENTS_PRICING) as handle:
+            store = handle.session()
+            names = {product.name for product in m.Product.all(store)}
+            with open(stores / "store_2.yaml") as f:
+                assert names == {product["name"] for product in yaml.safe_load(f)["products"]}
+            assert get_pricing_mode(store) == CENTS_PRICING
+
+    def test_checksum(self, config):
+        """
+        Test the checksum covers the configuration and the pricing mode
+
+        """
+
+        checksum = catalog_checksum(config)
+
+        assert catalog_checksum(config) == checksum
+        assert catalog_checksum(config, CENTS_PRICING) != checksum
+
+    def test_pragmas(self, tmp_path, config):
+        """
+        Test the connections are tuned for serving from the file
+
+        """
+
+        with open_store(tmp_path / "store.db", config) as handle:
+            with handle.engine.connect() as connection:
+                assert connection.execute("PRAGMA journal_mode").scalar() == "wal"
+                assert connection.execute("PRAGMA synchronous").scalar() == 1
+                assert connection.execute("PRAGMA cache_size").scalar() == -64_000
+
+    def test_reader_processes(self, tmp_path, config):
+        """
+        Test other processes serve from the store while it is open
+
+        """
+
+        path = tmp_path / "store.db"
+        with open_store(path, config) as handle:
+            cart = ShoppingCart(store=handle)
+            cart.add_product_items("Dove Soap", 1)
+
+            script = (
+                "from shopping_cart import data_model as m\n"
+                "from shopping_cart.make_store import open_store\n"
+                f"handle = open_store({str(path)!r}, {str(config)!r})\n"
+                "print(m.Product.count(handle.session()), m.Reservation.count(handle.session()))\n"
+            )
+            readers = [
+                subprocess.run(
+                    [sys.executable, "-c", script],
+                    cwd=Path(__file__).parent.parent,
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
+                for _ in range(2)
+            ]
+
+        assert [reader.stdout.split() for reader in readers] == [["2", "1"], ["2", "1"]]
+
+    def test_concurrent_open(self, tmp_path, config):
+        """
+        Test processes opening a new store at once populate it once
+
+        """
+
+        path = tmp_path / "store.db"
+        script = (
+            "import logging, sys\n"
+            "logging.basicConfig(level=logging.INFO, stream=sys.stdout, format='%(message)s')\n"
+            "from shopping_cart.make_store import open_store\n"
+            f"open_store({str(path)!r}, {str(config)!r}).dispose()\n"
+        )
+        openers = [
+            subprocess.Popen(
+                [sys.executable, "-c", script],
+                cwd=Path(__file__).parent.parent,
+                stdout=subprocess.PIPE,
+                text=True
+            )
+            for _ in range(4)
+        ]
+        outputs = [opener.communicate()[0] for opener in openers]
+
+        assert [opener.returncode for opener in openers] == [0] * 4
+        assert sum("Populating store" in output for output in outputs) == 1
+        with open_store(path, config) as handle:
+            store = handle.session()
+            assert m.Product.count(store) == 2
+            with open(config) as f:
+                assert m.Item.count(store) == sum(
+                    product["number_in_store"] for product in yaml.safe_load(f)["products"]
+                )
+
+    def test_changed_carts(self, tmp_path, config, caplog):
+        """
+        Test populating a store again logs the carts and
+        reservations it deletes
+
+        """
+
+        path = tmp_path / "store.db"
+        with open_store(path, config) as handle:
+            ShoppingCart(store=handle).add_product_items("Dove Soap", 2)
+
+        config.write_text((stores / "store_2.yaml").read_text())
+        with caplog.at_level(logging.WARNING, logger="shopping_cart.make_store"):
+            with open_store(path, config) as handle:
+                assert m.Reservation.count(handle.session()) == 0
+
+        assert "Deleting 0 carts and 1 reservations" in caplog.text
+
+
+
+class TestMakeCatalogFile:
+    """
+    Test compiling product configuration files into catalog files
+    """
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_prices(self, tmp_path, config, stream):
+        """
+        Test a compiled catalog prices orders as a store made from
+        the same configuration
+
+        """
+
+        path = tmp_path / "catalog.bin"
+        make_catalog_file(config, path, stream=stream)
+
+        store = make_new_store(config)
+        order = {product.name: 4 for product in m.Product.all(store)}
+        cart = ShoppingCart(store=store)
+        cart.add_order(order)
+
+        with MappedCatalog(path) as catalog:
+            assert len(catalog) == len(order)
+            for product in m.Product.all(store):
+                assert catalog.product_id(product.name) == product.id
+
+            assert cart.price_breakdown(12.5, catalog=catalog) == cart.price_breakdown(12.5)
+
+
+class TestMakeStores:
+    """
+    Test opening several file-backed stores at once
+    """
+
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_make_stores(self, tmp_path, processes):
+        """
+        Test each store is populated into its own file with ids of
+        its own, and opened again as it is
+
+        """
+
+        configs = sorted(stores.glob("*.yaml"))
+        builds = make_stores(configs, tmp_path, processes=processes)
+
+        assert [build.path for build in builds] \
+            == [tmp_path / f"{config.stem}.db" for config in configs]
+        for config, build in zip(configs, builds):
+            assert build.product_config_path == config
+            assert (build.number_of_products, build.number_of_items) == (2, 200)
+            assert build.seconds > 0
+
+            with open_store(build.path, config) as handle:
+                store = handle.session()
+                assert [product.id for product in m.Product.all(store)] == [1, 2]
+                assert m.Product.with_name(store, "Axe Deo").unit_price \
+                    == yaml.safe_load(config.read_text())["products"][1]["unit_price"]
+
+        assert [build.path for build in make_stores(configs, tmp_path, processes=processes)] \
+            == [build.path for build in builds]
+
+    def test_invalid(self, tmp_path, config):
+        """
+        Test making stores with no processes or with
+        configurations of the same name
+
+        """
+
+        with pytest.raises(InvalidValue) as exc_info:
+            make_stores([config], tmp_path, processes=0)
+        assert exc_info.match("Number of processes must be positive. 0 is given.")
+
+        with pytest.raises(InvalidValue) as exc_info:
+            make_stores([config, stores / "store.yaml"], tmp_path)
+        assert exc_info.match("store.yaml is given twice.")